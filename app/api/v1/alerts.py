@@ -0,0 +1,114 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import get_user_id
+from app.core import db_manager
+from app.core.exceptions import (
+    AlertRuleNotFoundException,
+    AlertRuleNotFoundHTTPException,
+    DeviceNotFoundException,
+    DeviceNotFoundHTTPException,
+    NotAuthorizedException,
+    NotAuthorizedHTTPException,
+)
+from app.schemas.alert import AlertRuleCreate, AlertRuleUpdate
+from app.services import get_alerts_service
+from app.services.alerts_service import AlertsService
+
+router = APIRouter(prefix="/alerts", tags=["alerts"])
+
+
+@router.post("/rules", status_code=201)
+async def add_rule(
+    rule_create: AlertRuleCreate,
+    user_id: int = Depends(get_user_id),
+    alerts_service: AlertsService = Depends(get_alerts_service),
+    session: AsyncSession = Depends(db_manager.session_getter),
+):
+    try:
+        data = await alerts_service.add_rule(
+            user_id=user_id, rule_create=rule_create, session=session
+        )
+        return {
+            "status": "success",
+            "message": "Alert rule added successfully",
+            "data": data,
+        }
+    except DeviceNotFoundException:
+        raise DeviceNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
+
+
+@router.get("/rules")
+async def get_rules(
+    user_id: int = Depends(get_user_id),
+    alerts_service: AlertsService = Depends(get_alerts_service),
+    session: AsyncSession = Depends(db_manager.session_getter),
+):
+    data = await alerts_service.get_rules(user_id=user_id, session=session)
+    return {
+        "status": "success",
+        "data": data,
+    }
+
+
+@router.get("/rules/{rule_id}")
+async def get_rule(
+    rule_id: int,
+    user_id: int = Depends(get_user_id),
+    alerts_service: AlertsService = Depends(get_alerts_service),
+    session: AsyncSession = Depends(db_manager.session_getter),
+):
+    try:
+        data = await alerts_service.get_rule(
+            user_id=user_id, rule_id=rule_id, session=session
+        )
+        return {
+            "status": "success",
+            "data": data,
+        }
+    except AlertRuleNotFoundException:
+        raise AlertRuleNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
+
+
+@router.patch("/rules/{rule_id}")
+async def update_rule(
+    rule_id: int,
+    rule_update: AlertRuleUpdate,
+    user_id: int = Depends(get_user_id),
+    alerts_service: AlertsService = Depends(get_alerts_service),
+    session: AsyncSession = Depends(db_manager.session_getter),
+):
+    try:
+        data = await alerts_service.update_rule(
+            user_id=user_id, rule_id=rule_id, rule_update=rule_update, session=session
+        )
+        return {
+            "status": "success",
+            "message": "Alert rule updated successfully",
+            "data": data,
+        }
+    except AlertRuleNotFoundException:
+        raise AlertRuleNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
+
+
+@router.delete("/rules/{rule_id}", status_code=204)
+async def delete_rule(
+    rule_id: int,
+    user_id: int = Depends(get_user_id),
+    alerts_service: AlertsService = Depends(get_alerts_service),
+    session: AsyncSession = Depends(db_manager.session_getter),
+):
+    try:
+        await alerts_service.delete_rule(
+            user_id=user_id, rule_id=rule_id, session=session
+        )
+    except AlertRuleNotFoundException:
+        raise AlertRuleNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
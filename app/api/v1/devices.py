@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import get_user_id
@@ -10,6 +12,8 @@ from app.core.exceptions import (
     DeviceAlreadyExistsHTTPException,
     DeviceNotFoundException,
     DeviceNotFoundHTTPException,
+    InvalidPeriodException,
+    InvalidPeriodHTTPException,
     NotAuthorizedException,
     NotAuthorizedHTTPException,
 )
@@ -74,6 +78,20 @@ async def delete_device(
         raise NotAuthorizedHTTPException
 
 
+@router.get("/overview")
+async def get_overview(
+    top: int = Query(default=5, ge=1, le=50),
+    user_id: int = Depends(get_user_id),
+    devices_service: DevicesService = Depends(get_devices_service),
+    session: AsyncSession = Depends(db_manager.session_getter),
+):
+    data = await devices_service.get_overview(user_id=user_id, top=top, session=session)
+    return {
+        "status": "success",
+        "data": data,
+    }
+
+
 @router.get("/{device_id:int}")
 async def get_device(
     device_id: int,
@@ -93,6 +111,35 @@ async def get_device(
         raise DeviceNotFoundHTTPException
 
 
+@router.get("/{device_id:int}/uptime")
+async def get_uptime(
+    device_id: int,
+    start: datetime | None = Query(default=None, alias="from"),
+    end: datetime | None = Query(default=None, alias="to"),
+    user_id: int = Depends(get_user_id),
+    devices_service: DevicesService = Depends(get_devices_service),
+    session: AsyncSession = Depends(db_manager.session_getter),
+):
+    try:
+        data = await devices_service.get_uptime(
+            user_id=user_id,
+            device_id=device_id,
+            session=session,
+            start=start,
+            end=end,
+        )
+        return {
+            "status": "success",
+            "data": data,
+        }
+    except InvalidPeriodException:
+        raise InvalidPeriodHTTPException
+    except DeviceNotFoundException:
+        raise DeviceNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
+
+
 @router.get("/")
 async def get_devices(
     user_id: int = Depends(get_user_id),
@@ -1,10 +1,33 @@
-from fastapi import APIRouter, Depends, WebSocket
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import get_user_id
 from app.core import db_manager
-from app.core.exceptions import DeviceNotFoundException, DeviceNotFoundHTTPException
-from app.schemas.telemetry import TelemetryPagination
+from app.core.exceptions import (
+    DeviceNotFoundException,
+    DeviceNotFoundHTTPException,
+    NotAuthorizedException,
+    NotAuthorizedHTTPException,
+    InvalidTokenException,
+    InvalidTokenHTTPException,
+    InvalidTelemetryException,
+    InvalidTelemetryHTTPException,
+    InvalidAggregationException,
+    InvalidAggregationHTTPException,
+    InvalidCursorException,
+    InvalidCursorHTTPException,
+    InvalidFieldsException,
+    InvalidFieldsHTTPException,
+    InvalidPeriodException,
+    InvalidPeriodHTTPException,
+    ExportUnavailableException,
+    ExportUnavailableHTTPException,
+)
+from app.schemas.telemetry import AckMode, TelemetryPagination, MAX_AGGREGATE_BUCKETS
+from app.schemas.telemetry_export import ExportFormat
 from app.services import get_telemetry_service
 from app.services.telemetry_service import TelemetryService
 
@@ -15,27 +38,178 @@ router = APIRouter(prefix="/telemetry", tags=["telemetry"])
 async def ws_device(
     token: str,
     ws: WebSocket,
+    ack: AckMode = AckMode.BUFFERED,
+    telemetry_service: TelemetryService = Depends(get_telemetry_service),
+):
+    await telemetry_service.open_ws(ws=ws, token=token, ack_mode=ack)
+
+
+@router.post("/bulk")
+async def bulk_upload(
+    token: str,
+    request: Request,
+    telemetry_service: TelemetryService = Depends(get_telemetry_service),
+):
+    content_type = request.headers.get("content-type", "")
+    try:
+        data = await telemetry_service.bulk_upload(
+            token=token,
+            chunks=request.stream(),
+            ndjson="ndjson" in content_type or "jsonl" in content_type,
+        )
+        return {
+            "status": "success",
+            "message": "Telemetry uploaded successfully",
+            "data": data,
+        }
+    except InvalidTokenException:
+        raise InvalidTokenHTTPException
+    except InvalidTelemetryException:
+        raise InvalidTelemetryHTTPException
+
+
+@router.get("/live")
+async def get_live_telemetry(
+    device_id: int | None = None,
+    user_id: int = Depends(get_user_id),
+    telemetry_service: TelemetryService = Depends(get_telemetry_service),
+):
+    try:
+        stream = await telemetry_service.get_live_stream(
+            user_id=user_id, device_id=device_id
+        )
+    except DeviceNotFoundException:
+        raise DeviceNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
+
+    return StreamingResponse(
+        content=stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{device_id}/aggregate")
+async def get_telemetry_aggregate(
+    device_id: int,
+    start: datetime = Query(alias="from"),
+    end: datetime | None = Query(default=None, alias="to"),
+    bucket: str = "1h",
+    metrics: str | None = Query(default=None, examples=["cpu.pct,memory.pct"]),
+    p95: bool = False,
+    user_id: int = Depends(get_user_id),
     session: AsyncSession = Depends(db_manager.session_getter),
     telemetry_service: TelemetryService = Depends(get_telemetry_service),
 ):
-    await telemetry_service.open_ws(ws=ws, token=token, session=session)
+    try:
+        data = await telemetry_service.get_aggregate(
+            user_id=user_id,
+            device_id=device_id,
+            start=start,
+            end=end,
+            bucket=bucket,
+            metrics=metrics,
+            p95=p95,
+            session=session,
+        )
+        return {
+            "status": "success",
+            "data": data,
+        }
+    except InvalidAggregationException:
+        raise InvalidAggregationHTTPException
+    except DeviceNotFoundException:
+        raise DeviceNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
+
+
+@router.get("/{device_id}/export")
+async def export_telemetry(
+    device_id: int,
+    format: ExportFormat = ExportFormat.CSV,
+    start: datetime | None = Query(default=None, alias="from"),
+    end: datetime | None = Query(default=None, alias="to"),
+    user_id: int = Depends(get_user_id),
+    telemetry_service: TelemetryService = Depends(get_telemetry_service),
+):
+    try:
+        writer, stream = await telemetry_service.export(
+            user_id=user_id,
+            device_id=device_id,
+            format=format,
+            start=start,
+            end=end,
+        )
+    except ExportUnavailableException:
+        raise ExportUnavailableHTTPException
+    except DeviceNotFoundException:
+        raise DeviceNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
+
+    filename = f"telemetry_{device_id}.{writer.extension}"
+    return StreamingResponse(
+        content=stream,
+        media_type=writer.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Accel-Buffering": "no",
+        },
+    )
 
 
 @router.get("/{device_id}")
 async def get_telemetry(
     device_id: int,
+    start: datetime | None = Query(default=None, alias="from"),
+    end: datetime | None = Query(default=None, alias="to"),
+    fields: str | None = Query(default=None, examples=["ts,cpu.pct,memory.pct"]),
+    # ряды для графика вместо страницы строк: не больше max_points точек на метрику
+    max_points: int | None = Query(default=None, ge=3, le=MAX_AGGREGATE_BUCKETS),
     pagination: TelemetryPagination = Depends(),
     user_id: int = Depends(get_user_id),
     session: AsyncSession = Depends(db_manager.session_getter),
     telemetry_service: TelemetryService = Depends(get_telemetry_service),
 ):
     try:
-        data = await telemetry_service.get_telemetry(
-            device_id=device_id, user_id=user_id, pagination=pagination, session=session
+        if max_points is not None:
+            series = await telemetry_service.get_series(
+                device_id=device_id,
+                user_id=user_id,
+                max_points=max_points,
+                start=start,
+                end=end,
+                fields=fields,
+                session=session,
+            )
+            return {
+                "status": "success",
+                "data": series,
+            }
+
+        data, next_cursor = await telemetry_service.get_telemetry(
+            device_id=device_id,
+            user_id=user_id,
+            pagination=pagination,
+            start=start,
+            end=end,
+            fields=fields,
+            session=session,
         )
         return {
             "status": "success",
             "data": data,
+            "next_cursor": next_cursor,
         }
+    except InvalidCursorException:
+        raise InvalidCursorHTTPException
+    except InvalidFieldsException:
+        raise InvalidFieldsHTTPException
+    except InvalidPeriodException:
+        raise InvalidPeriodHTTPException
     except DeviceNotFoundException:
         raise DeviceNotFoundHTTPException
+    except NotAuthorizedException:
+        raise NotAuthorizedHTTPException
@@ -2,6 +2,7 @@ __all__ = (
     "settings",
     "broker",
     "emails_publisher",
+    "alerts_publisher",
     "S3Client",
     "db_manager",
     "email_backend",
@@ -10,7 +11,7 @@ __all__ = (
 )
 
 from .config import settings
-from .fs_broker import broker, emails_publisher
+from .fs_broker import broker, emails_publisher, alerts_publisher
 from .s3_client import S3Client
 from .db_manager import db_manager
 from .smtp_email import email_backend
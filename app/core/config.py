@@ -2,7 +2,7 @@ import logging
 from pathlib import Path
 from typing import Literal
 
-from pydantic import BaseModel, PostgresDsn, RedisDsn, AmqpDsn
+from pydantic import BaseModel, PostgresDsn, RedisDsn, AmqpDsn, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 LOG_DEFAULT_FORMAT = (
@@ -55,6 +55,64 @@ class DatabaseConfig(BaseModel):
     )
 
 
+class TelemetryConfig(BaseModel):
+    buffer_max_size: int = 1000  # сколько строк телеметрии копить до записи в бд
+    buffer_max_age: float = 1.0  # максимальное время (сек) жизни строки в буфере
+    presence_flush_interval: float = 5.0  # как часто (сек) писать last_seen_at/status
+    presence_ttl: int = 60  # через сколько (сек) без кадров устройство offline
+    token_cache_size: int = 10000  # размер локального LRU token -> устройство
+    token_cache_local_ttl: int = 60  # TTL (сек) записи в локальном LRU
+    token_cache_ttl: int = 24 * 60 * 60  # TTL (сек) записи в Redis
+    live_queue_size: int = 100  # очередь одного подписчика live-телеметрии
+    live_publish_queue_size: int = 10000  # очередь публикации live-телеметрии в Redis
+    ack_window: int = 32  # через сколько кадров отправлять кумулятивный ack
+    ack_interval: float = 0.5  # максимальная задержка (сек) ack при тишине
+    bulk_batch_size: int = 5000  # размер пачки вставки при загрузке истории
+    partition_days: int = 1  # ширина секции таблицы (1 - по дням, 7 - по неделям)
+    partitions_ahead: int = 3  # сколько будущих секций создавать заранее
+    retention_days: int = 30  # сколько дней хранить телеметрию
+    partition_check_interval: float = 3600.0  # как часто (сек) обслуживать секции
+    rollup_interval: float = 10.0  # как часто (сек) пересчитывать агрегаты 1m/1h/1d
+    rollup_batch_size: int = 10000  # сколько минутных корзин пересчитывать за проход
+    rollup_minute_retention_days: int = 90  # дней хранить 1m агрегаты (1h/1d - всегда)
+    latest_flush_interval: float = 1.0  # как часто (сек) писать последние в Redis
+    latest_local_ttl: float = 2.0  # TTL (сек) последнего образца в локальном зеркале
+    latest_cache_size: int = 10000  # размер локального зеркала последних образцов
+    latest_ttl: int = 7 * 24 * 60 * 60  # TTL (сек) последнего образца в Redis
+    export_chunk_size: int = 5000  # сколько строк читать из курсора за раз при выгрузке
+    export_row_group_size: int = 100_000  # размер группы строк parquet
+    derived_ewma_half_life: float = 300.0  # период полураспада (сек) сглаживания EWMA
+    derived_trend_window: float = 6 * 60 * 60  # окно (сек) регрессии для трендов
+    derived_trend_buckets: int = 12  # на сколько корзин делится окно тренда
+    derived_flush_interval: float = 30.0  # как часто (сек) сохранять состояние в Redis
+    derived_cache_size: int = 10000  # сколько состояний устройств держать в памяти
+    derived_ttl: int = 7 * 24 * 60 * 60  # TTL (сек) состояния в Redis
+
+    @model_validator(mode="after")
+    def check_rollup_retention(self) -> "TelemetryConfig":
+        # часовые корзины пересчитываются из минутных: опоздавшая строка из начала
+        # окна хранения не должна пересчитать час по уже удаленным минутам,
+        # а корзина этой строки начинается раньше самой строки
+        if self.rollup_minute_retention_days <= self.retention_days:
+            raise ValueError(
+                "rollup_minute_retention_days must be greater than retention_days"
+            )
+        return self
+
+
+class AlertsConfig(BaseModel):
+    rules_refresh_interval: float = 60.0  # как часто (сек) перечитывать правила
+    publish_queue_size: int = 10000  # очередь событий алертов в брокер
+    state_flush_interval: float = 1.0  # как часто (сек) сверять состояние с Redis
+    state_ttl: int = 7 * 24 * 60 * 60  # сколько (сек) живет состояние без образцов
+    digest_interval: float = 300.0  # окно (сек), события правила в котором идут сводкой
+    webhook_timeout: float = 10.0  # таймаут (сек) одного запроса к webhook
+    webhook_max_connections: int = 100  # размер пула соединений к webhook
+    delivery_attempts: int = 5  # попыток доставки webhook до отказа
+    delivery_backoff: float = 1.0  # первая пауза (сек) между попытками, дальше x2
+    delivery_max_backoff: float = 60.0  # предел паузы (сек) между попытками
+
+
 class SMTPConfig(BaseModel):
     host: str
     port: int
@@ -99,6 +157,8 @@ class Settings(BaseSettings):
     db: DatabaseConfig
     s3: S3Config
     jwt: JWTConfig
+    telemetry: TelemetryConfig = TelemetryConfig()
+    alerts: AlertsConfig = AlertsConfig()
 
 
 settings = Settings()
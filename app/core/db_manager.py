@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from app.core.config import settings
+from app.core.migrations import MIGRATIONS, MIGRATIONS_LOCK_ID
 from app.models import Base
 
 
@@ -36,7 +37,12 @@ class DatabaseManager:
 
     async def init_database(self):
         async with self.engine.begin() as connection:
+            await connection.exec_driver_sql(
+                f"SELECT pg_advisory_xact_lock({MIGRATIONS_LOCK_ID})"
+            )
             await connection.run_sync(Base.metadata.create_all)
+            for migration in MIGRATIONS:
+                await connection.exec_driver_sql(migration)
 
     async def dispose(
         self,
@@ -202,3 +202,74 @@ class EmptyFileException(NabronirovalException):
 class EmptyFileExceptionHTTPException(NabronirovalHTTPException):
     status_code = 400
     detail = "Empty file"
+
+
+class InvalidTelemetryException(NabronirovalException):
+    detail = "Invalid telemetry"
+
+
+class InvalidTelemetryHTTPException(NabronirovalHTTPException):
+    status_code = 400
+    detail = "Invalid telemetry"
+
+
+class TelemetryRejectedException(NabronirovalException):
+    detail = "Telemetry rejected"
+
+
+class TelemetryDroppedException(NabronirovalException):
+    detail = "Telemetry buffer overflow"
+
+
+class InvalidAggregationException(NabronirovalException):
+    detail = "Invalid aggregation query"
+
+
+class InvalidAggregationHTTPException(NabronirovalHTTPException):
+    status_code = 400
+    detail = "Invalid aggregation query"
+
+
+class InvalidCursorException(NabronirovalException):
+    detail = "Invalid cursor"
+
+
+class InvalidCursorHTTPException(NabronirovalHTTPException):
+    status_code = 400
+    detail = "Invalid cursor"
+
+
+class InvalidFieldsException(NabronirovalException):
+    detail = "Invalid fields"
+
+
+class InvalidFieldsHTTPException(NabronirovalHTTPException):
+    status_code = 400
+    detail = "Invalid fields"
+
+
+class ExportUnavailableException(NabronirovalException):
+    detail = "Export format is not available"
+
+
+class ExportUnavailableHTTPException(NabronirovalHTTPException):
+    status_code = 400
+    detail = "Export format is not available"
+
+
+class AlertRuleNotFoundException(NabronirovalException):
+    detail = "Alert rule not found"
+
+
+class AlertRuleNotFoundHTTPException(NabronirovalHTTPException):
+    status_code = 404
+    detail = "Alert rule not found"
+
+
+class InvalidPeriodException(NabronirovalException):
+    detail = "Invalid period"
+
+
+class InvalidPeriodHTTPException(NabronirovalHTTPException):
+    status_code = 400
+    detail = "Invalid period"
@@ -7,3 +7,4 @@ broker = RabbitBroker(
 )
 
 emails_publisher = broker.publisher(queue="emails")
+alerts_publisher = broker.publisher(queue="alerts")
@@ -0,0 +1,161 @@
+# create_all создает только отсутствующие таблицы и не меняет уже существующие,
+# поэтому изменения схемы для старых баз догоняются здесь идемпотентным SQL.
+# Выполняется при старте приложения в одной транзакции с create_all.
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.models.telemetry import Telemetry, TELEMETRY_METRICS, TELEMETRY_SECTIONS
+
+# ключ pg_advisory_xact_lock, чтобы воркеры не мешали друг другу
+MIGRATIONS_LOCK_ID = 7_345_001
+
+
+def _typed_telemetry() -> str:
+    """Переносит метрики из JSON-секций в числовые колонки, остальное - в extra"""
+    table = Telemetry.__table__
+    dialect = postgresql.dialect()
+
+    columns = [*TELEMETRY_METRICS.values(), "extra"]
+    add_columns = ", ".join(
+        f"ADD COLUMN IF NOT EXISTS {column} {table.c[column].type.compile(dialect)}"
+        for column in columns
+    )
+
+    assignments = []
+    known: dict[str, list[str]] = {section: [] for section in TELEMETRY_SECTIONS}
+    for name, column in TELEMETRY_METRICS.items():
+        section, field = name.split(".", 1)
+        known[section].append(f"'{field}'")
+        column_type = table.c[column].type.compile(dialect)
+        # нечисловой мусор в старых строках не должен ронять миграцию
+        assignments.append(
+            f"{column} = CASE "
+            f"WHEN jsonb_typeof({section}::jsonb -> '{field}') = 'number' "
+            f"THEN ({section}::jsonb ->> '{field}')::numeric::{column_type} END"
+        )
+
+    extra = ", ".join(
+        f"'{section}', NULLIF({section}::jsonb - ARRAY[{', '.join(fields)}], '{{}}')"
+        for section, fields in known.items()
+    )
+    assignments.append(
+        f"extra = NULLIF(jsonb_strip_nulls(jsonb_build_object({extra})), '{{}}')"
+    )
+
+    drop_columns = ", ".join(f"DROP COLUMN {section}" for section in TELEMETRY_SECTIONS)
+
+    return f"""
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+                AND table_name = 'telemetry' AND column_name = 'cpu'
+        ) THEN
+            ALTER TABLE telemetry ALTER COLUMN id TYPE BIGINT;
+            ALTER SEQUENCE IF EXISTS telemetry_id_seq AS BIGINT;
+
+            ALTER TABLE telemetry {add_columns};
+
+            UPDATE telemetry SET {", ".join(assignments)};
+
+            ALTER TABLE telemetry {drop_columns};
+        END IF;
+    END $$
+    """
+
+
+def _partitioned_telemetry() -> str:
+    """Превращает старую таблицу телеметрии в первую секцию секционированной.
+    Данные не копируются: вся история до конца текущих суток становится одной
+    секцией telemetry_legacy, которую потом удалит ретеншн"""
+    table = Telemetry.__table__
+    dialect = postgresql.dialect()
+
+    create_table = str(CreateTable(table).compile(dialect=dialect)).strip()
+    create_indexes = ";\n".join(
+        str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes
+    )
+
+    return f"""
+    DO $$
+    DECLARE
+        legacy_end timestamptz;
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM pg_class
+            WHERE relname = 'telemetry' AND relkind = 'r'
+                AND relnamespace = current_schema()::regnamespace
+        ) THEN
+            ALTER TABLE telemetry RENAME TO telemetry_legacy;
+            ALTER TABLE telemetry_legacy
+                RENAME CONSTRAINT telemetry_pkey TO telemetry_legacy_pkey;
+            ALTER TABLE telemetry_legacy RENAME CONSTRAINT uq_telemetry_device_id_ts
+                TO uq_telemetry_legacy_device_id_ts;
+            ALTER INDEX IF EXISTS ix_telemetry_ts RENAME TO ix_telemetry_legacy_ts;
+            ALTER SEQUENCE IF EXISTS telemetry_id_seq RENAME TO telemetry_legacy_id_seq;
+
+            {create_table};
+            {create_indexes};
+
+            PERFORM setval(
+                pg_get_serial_sequence('telemetry', 'id'),
+                (SELECT coalesce(max(id), 0) + 1 FROM telemetry_legacy),
+                false
+            );
+
+            SELECT (
+                    date_trunc('day', greatest(max(ts), now()) AT TIME ZONE 'UTC')
+                        AT TIME ZONE 'UTC'
+                ) + interval '1 day'
+                INTO legacy_end
+                FROM telemetry_legacy;
+            EXECUTE format(
+                'ALTER TABLE telemetry ATTACH PARTITION telemetry_legacy '
+                'FOR VALUES FROM (MINVALUE) TO (%L)',
+                legacy_end
+            );
+        END IF;
+    END $$
+    """
+
+
+MIGRATIONS: list[str] = [
+    # Естественный ключ телеметрии (device_id, ts): сначала убираем дубли
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conname = 'uq_telemetry_device_id_ts'
+        ) THEN
+            DELETE FROM telemetry a
+            USING telemetry b
+            WHERE a.device_id = b.device_id AND a.ts = b.ts AND a.id > b.id;
+
+            ALTER TABLE telemetry
+                ADD CONSTRAINT uq_telemetry_device_id_ts UNIQUE (device_id, ts);
+        END IF;
+    END $$
+    """,
+    # Типизированные колонки метрик вместо JSON-секций
+    _typed_telemetry(),
+    # Секционирование телеметрии по ts
+    _partitioned_telemetry(),
+    # Индекс для keyset-пагинации телеметрии
+    """
+    CREATE INDEX IF NOT EXISTS ix_telemetry_device_id_ts_id
+        ON telemetry (device_id, ts, id)
+    """,
+    # Каналы уведомлений правил алертов
+    """
+    ALTER TABLE alert_rules
+        ADD COLUMN IF NOT EXISTS notify_email BOOLEAN NOT NULL DEFAULT true,
+        ADD COLUMN IF NOT EXISTS webhook_url VARCHAR(512)
+    """,
+    # Время отметки корзины в очереди пересчета агрегатов
+    """
+    ALTER TABLE telemetry_rollup_queue
+        ADD COLUMN IF NOT EXISTS queued_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    """,
+]
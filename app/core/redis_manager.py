@@ -2,6 +2,8 @@ import json
 
 from pydantic import RedisDsn
 from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.commands.core import AsyncScript
 
 from app.core.config import settings
 
@@ -26,7 +28,7 @@ class RedisStorage:
         )
 
     async def hget(self, key: str, attr: str):
-        await self.client.hget(
+        return await self.client.hget(
             name=f"{self.namespace}:{key}",
             key=attr,
         )
@@ -37,6 +39,57 @@ class RedisStorage:
         )
         return data
 
+    async def hgetall_many(self, keys: list[str]) -> list[dict]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(name=f"{self.namespace}:{key}")
+            return await pipe.execute()
+
+    def register_script(self, script: str) -> AsyncScript:
+        return self.client.register_script(script)
+
+    async def run_script_many(
+        self, script: AsyncScript, calls: list[tuple[list[str], list]]
+    ) -> list:
+        """Один и тот же Lua-скрипт для пачки ключей за один проход по сети"""
+        async with self.client.pipeline(transaction=False) as pipe:
+            for keys, args in calls:
+                await script(
+                    keys=[f"{self.namespace}:{key}" for key in keys],
+                    args=args,
+                    client=pipe,
+                )
+            return await pipe.execute()
+
+    async def zrevrange_many(
+        self, keys: list[str], count: int
+    ) -> list[list[tuple[str, float]]]:
+        """Первые count элементов нескольких sorted set по убыванию за один проход"""
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.zrevrange(
+                    name=f"{self.namespace}:{key}",
+                    start=0,
+                    end=count - 1,
+                    withscores=True,
+                )
+            return await pipe.execute()
+
+    async def scard(self, key: str) -> int:
+        return await self.client.scard(f"{self.namespace}:{key}")
+
+    async def zrangebyscore(
+        self, key: str, max: float, count: int
+    ) -> list[tuple[str, float]]:
+        return await self.client.zrangebyscore(
+            name=f"{self.namespace}:{key}",
+            min="-inf",
+            max=max,
+            start=0,
+            num=count,
+            withscores=True,
+        )
+
     async def set(self, key: str, value: any, expire: int | None = None):
         await self.client.set(
             name=f"{self.namespace}:{key}",
@@ -55,6 +108,12 @@ class RedisStorage:
         )
         return json.loads(data) if data else None
 
+    async def get_many(self, keys: list[str]) -> list:
+        data = await self.client.mget(
+            [f"{self.namespace}:{key}" for key in keys],
+        )
+        return [json.loads(value) if value else None for value in data]
+
     async def delete(self, key: str):
         await self.client.delete(
             f"{self.namespace}:{key}",
@@ -65,6 +124,32 @@ class RedisStorage:
             f"{self.namespace}:{key}",
         )
 
+    def channel_name(self, channel: str) -> str:
+        return f"{self.namespace}:{channel}"
+
+    async def publish(self, channel: str, message: any):
+        await self.client.publish(
+            channel=self.channel_name(channel),
+            message=json.dumps(message),
+        )
+
+    async def publish_many(self, messages: list[tuple[str, any]]):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for channel, message in messages:
+                pipe.publish(
+                    channel=self.channel_name(channel),
+                    message=json.dumps(message),
+                )
+            await pipe.execute()
+
+    def pubsub(self) -> PubSub:
+        return self.client.pubsub(ignore_subscribe_messages=True)
+
+    async def subscribe(self, *channels: str) -> PubSub:
+        pubsub = self.pubsub()
+        await pubsub.subscribe(*(self.channel_name(channel) for channel in channels))
+        return pubsub
+
 
 sessions_storage = RedisStorage(namespace="sessions", url=settings.redis.url, db=0)
 cache_storage = RedisStorage(namespace="cache", url=settings.redis.url, db=1)
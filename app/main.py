@@ -8,6 +8,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api import api_router
 from app.core import settings, broker
 from app.core.db_manager import db_manager
+from app.services import (
+    telemetry_buffer,
+    presence_tracker,
+    device_events,
+    telemetry_hub,
+    telemetry_partitions,
+    telemetry_rollups,
+    latest_telemetry,
+    derived_metrics,
+    alert_engine,
+)
 
 
 logging.basicConfig(
@@ -22,9 +33,27 @@ async def lifespan(app: FastAPI):
 
     await db_manager.init_database()  # Создание таблиц в бд
     await broker.start()  # Запуск брокера
+    await telemetry_partitions.start()  # Секции таблицы телеметрии и ретеншн
+    await telemetry_buffer.start()  # Фоновая запись телеметрии пачками
+    await presence_tracker.start()  # Присутствие в Redis и запись last_seen_at/status
+    await latest_telemetry.start()  # Последние образцы устройств в Redis
+    await derived_metrics.start()  # Периодическое сохранение производных метрик
+    await telemetry_rollups.start()  # Агрегаты телеметрии 1m/1h/1d
+    await device_events.start()  # Подписка на события привязки устройств
+    await alert_engine.start()  # Правила алертов и публикация событий в брокер
+    await telemetry_hub.start()  # Раздача live-телеметрии между воркерами
 
     yield
 
+    await telemetry_hub.stop()
+    await telemetry_rollups.stop()
+    await device_events.stop()
+    await alert_engine.stop()  # Дописываем события алертов до остановки брокера
+    await telemetry_buffer.stop()  # Дописываем остатки буфера в бд
+    await presence_tracker.stop()
+    await latest_telemetry.stop()  # Дописываем последние образцы в Redis
+    await derived_metrics.stop()  # Сохраняем состояние производных метрик
+    await telemetry_partitions.stop()
     await broker.stop()  # Остановка брокера
     await db_manager.dispose()  # Остановка бд
 
@@ -3,11 +3,25 @@ __all__ = (
     "User",
     "Device",
     "Telemetry",
+    "TelemetryRollupQueue",
+    "TelemetryRollup1m",
+    "TelemetryRollup1h",
+    "TelemetryRollup1d",
     "File",
+    "AlertRule",
+    "DeviceConnectivity",
 )
 
 from .base import Base
 from .device import Device
 from .user import User
 from .telemetry import Telemetry
+from .telemetry_rollup import (
+    TelemetryRollupQueue,
+    TelemetryRollup1m,
+    TelemetryRollup1h,
+    TelemetryRollup1d,
+)
 from .file import File
+from .alert_rule import AlertRule
+from .device_connectivity import DeviceConnectivity
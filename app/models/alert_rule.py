@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import Boolean, DateTime, Double, ForeignKey, Integer, String
+from sqlalchemy.orm import mapped_column, Mapped
+
+from app.models import Base
+
+
+class AlertRule(Base):
+    """Порог по метрике: "cpu.pct > 90 for 2m" для устройства или всех устройств владельца"""
+
+    __tablename__ = "alert_rules"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
+    # None - правило на все устройства владельца
+    device_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("devices.id", ondelete="CASCADE"), nullable=True
+    )
+    name: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    # "секция.поле" из TELEMETRY_METRICS
+    metric: Mapped[str] = mapped_column(String(64))
+    operator: Mapped[str] = mapped_column(String(2))
+    threshold: Mapped[float] = mapped_column(Double)
+    duration_sec: Mapped[int] = mapped_column(Integer, default=0)
+    enabled: Mapped[bool] = mapped_column(Boolean, default=True)
+    # куда доставлять события: письмо владельцу и/или POST на webhook
+    notify_email: Mapped[bool] = mapped_column(Boolean, default=True)
+    webhook_url: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
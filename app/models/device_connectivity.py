@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index
+from sqlalchemy.orm import mapped_column, Mapped
+
+from app.models import Base
+
+
+class DeviceConnectivity(Base):
+    """Сессия связи устройства: одна строка на сессию, пишется при ее завершении.
+    Текущая открытая сессия живет в Redis, см. PresenceTracker"""
+
+    __tablename__ = "device_connectivity"
+    __table_args__ = (
+        Index(
+            "ix_device_connectivity_device_id_online_from", "device_id", "online_from"
+        ),
+    )
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    device_id: Mapped[int] = mapped_column(ForeignKey("devices.id", ondelete="CASCADE"))
+    online_from: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    online_to: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -2,12 +2,15 @@ from datetime import datetime, timezone
 from typing import Optional, TYPE_CHECKING
 
 from sqlalchemy import (
+    BigInteger,
     DateTime,
     Integer,
     ForeignKey,
-    Float,
-    JSON,
+    Index,
+    REAL,
+    UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
 from app.models import Base
@@ -16,18 +19,74 @@ if TYPE_CHECKING:
     from .device import Device
 
 
+# Известные метрики агента: "секция.поле" в кадре телеметрии -> колонка таблицы
+TELEMETRY_METRICS: dict[str, str] = {
+    "cpu.pct": "cpu_pct",
+    "cpu.freq_mhz": "cpu_freq_mhz",
+    "cpu.temperature_c": "cpu_temperature_c",
+    "memory.total_mb": "memory_total_mb",
+    "memory.used_mb": "memory_used_mb",
+    "memory.pct": "memory_pct",
+    "disk.total_mb": "disk_total_mb",
+    "disk.used_mb": "disk_used_mb",
+    "disk.free_mb": "disk_free_mb",
+    "disk.used_pct": "disk_used_pct",
+    "sensors.fan_rpm": "fan_rpm",
+    "network.bytes_sent_total": "net_bytes_sent_total",
+    "network.bytes_recv_total": "net_bytes_recv_total",
+    "network.down_mbps": "net_down_mbps",
+    "network.up_mbps": "net_up_mbps",
+}
+
+TELEMETRY_SECTIONS: tuple[str, ...] = ("cpu", "memory", "disk", "sensors", "network")
+
+
 class Telemetry(Base):
     __tablename__ = "telemetry"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    __table_args__ = (
+        # естественный ключ: повторная отправка кадра не создает дубль
+        UniqueConstraint("device_id", "ts", name="uq_telemetry_device_id_ts"),
+        # постраничное чтение по ключу (ts, id) в пределах устройства
+        Index("ix_telemetry_device_id_ts_id", "device_id", "ts", "id"),
+        # секции по времени создает и удаляет TelemetryPartitions
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     device_id: Mapped[int] = mapped_column(ForeignKey("devices.id", ondelete="CASCADE"))
+    # ключ секционирования обязан входить в первичный ключ
     ts: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), index=True, default=lambda: datetime.now(timezone.utc)
+        DateTime(timezone=True),
+        primary_key=True,
+        index=True,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+    cpu_pct: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+    cpu_freq_mhz: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+    cpu_temperature_c: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+
+    memory_total_mb: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+    memory_used_mb: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+    memory_pct: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+
+    disk_total_mb: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+    disk_used_mb: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+    disk_free_mb: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+    disk_used_pct: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+
+    fan_rpm: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    net_bytes_sent_total: Mapped[Optional[int]] = mapped_column(
+        BigInteger, nullable=True
+    )
+    net_bytes_recv_total: Mapped[Optional[int]] = mapped_column(
+        BigInteger, nullable=True
     )
-    cpu: Mapped[dict] = mapped_column(JSON, default=dict)
-    memory: Mapped[dict] = mapped_column(JSON, default=dict)
-    disk: Mapped[dict] = mapped_column(JSON, default=dict)
-    sensors: Mapped[dict] = mapped_column(JSON, default=dict)
-    network: Mapped[dict] = mapped_column(JSON, default=dict)
+    net_down_mbps: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+    net_up_mbps: Mapped[Optional[float]] = mapped_column(REAL, nullable=True)
+
+    # неизвестные поля секций (точка монтирования, доп. датчики): {"секция": {...}}
+    extra: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
 
     # Relationships
     device: Mapped["Device"] = relationship("Device", back_populates="telemetry")
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import DateTime, Double, ForeignKey, Integer, func
+from sqlalchemy.orm import mapped_column, Mapped
+
+from app.models import Base
+from app.models.telemetry import Telemetry, TELEMETRY_METRICS
+
+
+class TelemetryRollupQueue(Base):
+    """Минутные корзины, в которые пришли новые строки и которые нужно пересчитать.
+    Пишется в одной транзакции с сырой телеметрией, поэтому не теряется при падении"""
+
+    __tablename__ = "telemetry_rollup_queue"
+    device_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    # когда корзину последний раз отметили; обновление держит блокировку строки
+    # до коммита пачки телеметрии
+    queued_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
+class TelemetryRollupMixin:
+    """Агрегаты по корзине: для каждой метрики min/max/sum/count (avg = sum / count)"""
+
+    device_id: Mapped[int] = mapped_column(
+        ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    samples: Mapped[int] = mapped_column(Integer)
+
+
+# колонки метрик одинаковые во всех уровнях, поэтому собираем их по списку метрик
+for _column in TELEMETRY_METRICS.values():
+    _type = Telemetry.__table__.c[_column].type
+    setattr(TelemetryRollupMixin, f"{_column}_min", mapped_column(_type, nullable=True))
+    setattr(TelemetryRollupMixin, f"{_column}_max", mapped_column(_type, nullable=True))
+    setattr(
+        TelemetryRollupMixin, f"{_column}_sum", mapped_column(Double, nullable=True)
+    )
+    setattr(TelemetryRollupMixin, f"{_column}_count", mapped_column(Integer, default=0))
+del _column, _type
+
+
+class TelemetryRollup1m(TelemetryRollupMixin, Base):
+    __tablename__ = "telemetry_1m"
+
+
+class TelemetryRollup1h(TelemetryRollupMixin, Base):
+    __tablename__ = "telemetry_1h"
+
+
+class TelemetryRollup1d(TelemetryRollupMixin, Base):
+    __tablename__ = "telemetry_1d"
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def bucket_start(ts: datetime, size: timedelta) -> datetime:
+    """Начало корзины размера size (в UTC), в которую попадает ts"""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return EPOCH + (ts - EPOCH) // size * size
+
+
+# уровни от мелкого к крупному: (модель, размер корзины)
+ROLLUP_TIERS: tuple[tuple[type[TelemetryRollupMixin], timedelta], ...] = (
+    (TelemetryRollup1m, timedelta(minutes=1)),
+    (TelemetryRollup1h, timedelta(hours=1)),
+    (TelemetryRollup1d, timedelta(days=1)),
+)
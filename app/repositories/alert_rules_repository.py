@@ -0,0 +1,16 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import AlertRule
+from app.repositories.base_repository import BaseRepository
+from app.schemas.alert import AlertRuleResponse
+
+
+class AlertRulesRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(AlertRule, AlertRuleResponse)
+
+    async def get_enabled(self, session: AsyncSession) -> list[AlertRuleResponse]:
+        stmt = select(self.model).where(self.model.enabled.is_(True))
+        result = await session.execute(stmt)
+        return [self.schema.model_validate(rule) for rule in result.scalars()]
@@ -1,7 +1,7 @@
 import logging
 
 from pydantic import BaseModel
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, delete, update, insert
 from sqlalchemy.exc import NoResultFound, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -56,6 +56,13 @@ class BaseRepository:
             await session.rollback()
             raise ObjectAlreadyExistsException
 
+    async def add_many(self, schemas: list[BaseModel], session: AsyncSession):
+        if not schemas:
+            return
+        stmt = insert(self.model)
+        await session.execute(stmt, [schema.model_dump() for schema in schemas])
+        await session.commit()
+
     async def patch(self, session: AsyncSession, column: str, value: any, **kwargs):
         stmt = update(self.model).filter_by(**kwargs).values({column: value})
         await session.execute(stmt)
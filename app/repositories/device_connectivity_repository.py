@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, column, exists, insert, select, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Device, DeviceConnectivity
+from app.repositories.base_repository import BaseRepository
+from app.schemas.device import DeviceInterval
+
+
+class DeviceConnectivityRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(DeviceConnectivity, DeviceInterval)
+
+    async def add_many(self, schemas: list[DeviceInterval], session: AsyncSession):
+        """Сессии удаленных устройств пропускаются: delete_device не закрывает сокет,
+        и сессия может закончиться уже после удаления"""
+        if not schemas:
+            return
+
+        rows = values(
+            column("device_id", Integer),
+            column("online_from", DateTime(timezone=True)),
+            column("online_to", DateTime(timezone=True)),
+            name="v",
+        ).data(
+            [
+                (schema.device_id, schema.online_from, schema.online_to)
+                for schema in schemas
+            ]
+        )
+        query = select(rows.c.device_id, rows.c.online_from, rows.c.online_to).where(
+            exists().where(Device.id == rows.c.device_id)
+        )
+        stmt = insert(self.model).from_select(
+            ["device_id", "online_from", "online_to"], query
+        )
+        await session.execute(stmt)
+        await session.commit()
+
+    async def get_intervals(
+        self, session: AsyncSession, device_id: int, start: datetime, end: datetime
+    ) -> list[DeviceInterval]:
+        """Сессии, пересекающие [start, end), по возрастанию начала"""
+        stmt = (
+            select(self.model)
+            .where(
+                self.model.device_id == device_id,
+                self.model.online_from < end,
+                self.model.online_to > start,
+            )
+            .order_by(self.model.online_from)
+        )
+        result = await session.execute(stmt)
+        return [self.schema.model_validate(row) for row in result.scalars()]
@@ -1,4 +1,6 @@
-from sqlalchemy import select, desc
+from typing import Any
+
+from sqlalchemy import select, desc, func, update, values, column, Integer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import Device
@@ -28,3 +30,43 @@ class DevicesRepository(BaseRepository):
         result = result.scalars().all()
 
         return [self.schema.model_validate(instance) for instance in result]
+
+    async def count(self, session: AsyncSession, owner_id: int) -> int:
+        stmt = (
+            select(func.count())
+            .select_from(self.model)
+            .where(self.model.owner_id == owner_id)
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one()
+
+    async def get_names(self, session: AsyncSession, ids: list[int]) -> dict[int, str]:
+        if not ids:
+            return {}
+
+        stmt = select(self.model.id, self.model.name).where(self.model.id.in_(ids))
+        result = await session.execute(stmt)
+        return dict(result.tuples().all())
+
+    async def patch_many(
+        self, session: AsyncSession, column_name: str, data: dict[int, Any]
+    ):
+        """UPDATE ... FROM (VALUES ...) для пачки устройств за один запрос"""
+        if not data:
+            return
+
+        target = getattr(self.model, column_name)
+        rows = values(
+            column("id", Integer),
+            column("value", target.type),
+            name="v",
+        ).data(list(data.items()))
+
+        stmt = (
+            update(self.model)
+            .where(self.model.id == rows.c.id)
+            .values({column_name: rows.c.value})
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(stmt)
+        await session.commit()
@@ -1,21 +1,98 @@
+import re
+from datetime import datetime
+from typing import Any, AsyncIterator, Sequence
+
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, asc, desc
+from sqlalchemy import Select, select, asc, desc, text, func, tuple_
 
-from app.models import Telemetry
+from app.models import Telemetry, TelemetryRollupQueue
+from app.models.telemetry import TELEMETRY_METRICS
+from app.models.telemetry_rollup import ROLLUP_TIERS, EPOCH, bucket_start
 from app.repositories.base_repository import BaseRepository
-from app.schemas.telemetry import TelemetryResponse, TelemetryPagination, TelemetryOrder
+from app.schemas.telemetry import (
+    TelemetryResponse,
+    TelemetryPagination,
+    TelemetryOrder,
+    TelemetryUpload,
+    TelemetryPartition,
+    TelemetryAggregateQuery,
+    TelemetryAggregateBucket,
+    decode_cursor,
+)
+from app.schemas.telemetry_export import EXPORT_COLUMNS
+
+_PARTITION_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def _parse_bound(value: str) -> datetime | None:
+    if value == "MINVALUE":
+        return None
+    return datetime.fromisoformat(value.strip("'"))
 
 
 class TelemetryRepository(BaseRepository):
     def __init__(self):
         super().__init__(Telemetry, TelemetryResponse)
 
-    async def get_filtered(
-        self, session: AsyncSession, pagination: TelemetryPagination, **kwargs
-    ) -> list[TelemetryResponse]:
+    async def add_many(self, schemas: list[TelemetryUpload], session: AsyncSession):
+        """Пачка вставок, повторы по (device_id, ts) молча пропускаются"""
+        if not schemas:
+            return
+        stmt = insert(self.model).on_conflict_do_nothing(
+            index_elements=["device_id", "ts"]
+        )
+        await session.execute(stmt, [schema.to_row() for schema in schemas])
+
+        # в той же транзакции отмечаем минутные корзины для пересчета агрегатов;
+        # сортируем, чтобы параллельные пачки не ловили deadlock на очереди
+        minute = ROLLUP_TIERS[0][1]
+        buckets = sorted(
+            {(schema.device_id, bucket_start(schema.ts, minute)) for schema in schemas}
+        )
+        # уже отмеченную корзину обновляем, а не пропускаем: блокировка строки
+        # до коммита не даст пересчету забрать ее раньше, чем он увидит эти строки
+        await session.execute(
+            insert(TelemetryRollupQueue).on_conflict_do_update(
+                index_elements=["device_id", "bucket"],
+                set_={"queued_at": func.now()},
+            ),
+            [
+                {"device_id": device_id, "bucket": bucket}
+                for device_id, bucket in buckets
+            ],
+        )
+        await session.commit()
+
+    def filtered_query(
+        self,
+        pagination: TelemetryPagination,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        **kwargs,
+    ) -> Select:
+        """Страница по ключу (ts, id): индекс (device_id, ts, id) отдает строки
+        сразу в нужном порядке, поэтому цена страницы не зависит от ее номера"""
         stmt = select(self.model).filter_by(**kwargs)
-        if pagination.order == TelemetryOrder.OLD:
+        if start is not None:
+            stmt = stmt.where(self.model.ts >= start)
+        if end is not None:
+            stmt = stmt.where(self.model.ts < end)
 
+        key = tuple_(self.model.ts, self.model.id)
+        newest_first = pagination.order == TelemetryOrder.OLD
+
+        if pagination.cursor is not None:
+            ts, id = decode_cursor(pagination.cursor)
+            # отдельное условие на ts отсекает лишние секции таблицы
+            if newest_first:
+                stmt = stmt.where(self.model.ts <= ts, key < tuple_(ts, id))
+            else:
+                stmt = stmt.where(self.model.ts >= ts, key > tuple_(ts, id))
+        elif pagination.offset:
+            stmt = stmt.offset(pagination.offset)
+
+        if newest_first:
             stmt = stmt.order_by(
                 desc(self.model.ts),
                 desc(self.model.id),
@@ -27,12 +104,191 @@ class TelemetryRepository(BaseRepository):
                 asc(self.model.id),
             )
 
-        if pagination.offset:
-            stmt = stmt.offset(pagination.offset)
         if pagination.limit:
             stmt = stmt.limit(pagination.limit)
+        return stmt
+
+    async def get_filtered(
+        self,
+        session: AsyncSession,
+        pagination: TelemetryPagination,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        **kwargs,
+    ) -> list[TelemetryResponse]:
+        stmt = self.filtered_query(
+            pagination=pagination, start=start, end=end, **kwargs
+        )
 
         result = await session.execute(stmt)
         result = result.scalars().all()
 
         return [self.schema.model_validate(instance) for instance in result]
+
+    async def get_projected(
+        self,
+        session: AsyncSession,
+        pagination: TelemetryPagination,
+        fields: list[tuple[str, str | None]],
+        start: datetime | None = None,
+        end: datetime | None = None,
+        **kwargs,
+    ) -> list[dict]:
+        """Та же страница, но читаются только нужные колонки и пути в extra,
+        а строки собираются в словари без TelemetryResponse"""
+        columns, paths = [], []
+
+        def add(expression, section: str, field: str | None):
+            columns.append(expression.label(f"f{len(columns)}"))
+            paths.append((section, field))
+
+        for section, field in fields:
+            if field is None:
+                # секция целиком: известные метрики + неизвестные поля из extra
+                add(self.model.extra[section], section, None)
+                for name, column in TELEMETRY_METRICS.items():
+                    if name.startswith(f"{section}."):
+                        add(getattr(self.model, column), section, name.split(".")[1])
+            elif f"{section}.{field}" in TELEMETRY_METRICS:
+                column = TELEMETRY_METRICS[f"{section}.{field}"]
+                add(getattr(self.model, column), section, field)
+            else:
+                add(self.model.extra[section][field], section, field)
+
+        stmt = self.filtered_query(
+            pagination=pagination, start=start, end=end, **kwargs
+        ).with_only_columns(self.model.id, self.model.ts, *columns)
+
+        result = await session.execute(stmt)
+
+        items = []
+        for row in result.all():
+            item = {"id": row[0], "ts": row[1]}
+            for (section, field), value in zip(paths, row[2:]):
+                values = item.setdefault(section, {})
+                if field is not None:
+                    values[field] = value
+                elif value:
+                    values.update(value)
+            items.append(item)
+        return items
+
+    async def stream_rows(
+        self,
+        session: AsyncSession,
+        device_id: int,
+        chunk_size: int,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> AsyncIterator[Sequence[Sequence[Any]]]:
+        """Строки устройства пачками по chunk_size через серверный курсор,
+        колонки в порядке EXPORT_COLUMNS, без ORM-объектов"""
+        stmt = select(*(getattr(self.model, name) for name in EXPORT_COLUMNS)).where(
+            self.model.device_id == device_id
+        )
+        if start is not None:
+            stmt = stmt.where(self.model.ts >= start)
+        if end is not None:
+            stmt = stmt.where(self.model.ts < end)
+        stmt = stmt.order_by(asc(self.model.ts), asc(self.model.id))
+
+        result = await session.stream(stmt.execution_options(yield_per=chunk_size))
+        async for rows in result.tuples().partitions():
+            yield rows
+
+    async def get_series(
+        self,
+        session: AsyncSession,
+        device_id: int,
+        metrics: list[str],
+        start: datetime,
+        end: datetime,
+    ) -> Sequence[Sequence[Any]]:
+        """Строки (ts, значения metrics...) за период по возрастанию ts"""
+        columns = [getattr(self.model, TELEMETRY_METRICS[name]) for name in metrics]
+        stmt = (
+            select(self.model.ts, *columns)
+            .where(
+                self.model.device_id == device_id,
+                self.model.ts >= start,
+                self.model.ts < end,
+            )
+            .order_by(asc(self.model.ts))
+        )
+        result = await session.execute(stmt)
+        return result.tuples().all()
+
+    async def get_aggregate(
+        self, session: AsyncSession, device_id: int, query: TelemetryAggregateQuery
+    ) -> list[TelemetryAggregateBucket]:
+        """Агрегаты по корзинам прямо по сырым строкам, с p95"""
+        bucket = func.date_bin(query.bucket, self.model.ts, EPOCH)
+        columns = [bucket.label("bucket"), func.count().label("samples")]
+        for name in query.metrics:
+            column = TELEMETRY_METRICS[name]
+            metric = getattr(self.model, column)
+            columns += [
+                func.min(metric).label(f"{column}_min"),
+                func.max(metric).label(f"{column}_max"),
+                func.avg(metric).label(f"{column}_avg"),
+                func.percentile_cont(0.95).within_group(metric).label(f"{column}_p95"),
+                func.count(metric).label(f"{column}_count"),
+            ]
+
+        stmt = (
+            select(*columns)
+            .where(
+                self.model.device_id == device_id,
+                self.model.ts >= query.start,
+                self.model.ts < query.end,
+            )
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+        result = await session.execute(stmt)
+        return [
+            TelemetryAggregateBucket.from_row(row, metrics=query.metrics)
+            for row in result.mappings()
+        ]
+
+    async def get_partitions(self, session: AsyncSession) -> list[TelemetryPartition]:
+        # границы секций берем из каталога, в ISO и UTC, чтобы их можно было разобрать
+        await session.execute(text("SET LOCAL TimeZone = 'UTC'"))
+        await session.execute(text("SET LOCAL DateStyle = 'ISO'"))
+        result = await session.execute(
+            text(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+                "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:parent AS regclass)"
+            ),
+            {"parent": self.model.__tablename__},
+        )
+
+        partitions = []
+        for name, bound in result.all():
+            match = _PARTITION_BOUND.search(bound)
+            if match is None:  # DEFAULT-секция
+                continue
+            partitions.append(
+                TelemetryPartition(
+                    name=name,
+                    start=_parse_bound(match.group(1)),
+                    end=_parse_bound(match.group(2)),
+                )
+            )
+        return sorted(partitions, key=lambda p: p.end)
+
+    async def create_partition(
+        self, session: AsyncSession, name: str, start: datetime, end: datetime
+    ):
+        await session.execute(
+            text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" '
+                f"PARTITION OF {self.model.__tablename__} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+
+    async def drop_partition(self, session: AsyncSession, name: str):
+        # удаление секции целиком вместо DELETE: без раздувания таблицы и вакуума
+        await session.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
@@ -0,0 +1,211 @@
+from datetime import datetime, timedelta
+from typing import Any, Sequence
+
+from sqlalchemy import (
+    ColumnElement,
+    DateTime,
+    Integer,
+    and_,
+    column,
+    delete,
+    func,
+    or_,
+    select,
+    tuple_,
+    union_all,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Telemetry, TelemetryRollupQueue
+from app.models.telemetry import TELEMETRY_METRICS
+from app.models.telemetry_rollup import EPOCH, TelemetryRollupMixin, bucket_start
+from app.schemas.telemetry import TelemetryAggregateBucket, TelemetryAggregateQuery
+
+
+def _aggregates(source) -> dict[str, ColumnElement]:
+    """Агрегаты корзины: из сырых строк или из корзин более мелкого уровня"""
+    if source is Telemetry:
+        aggregates = {"samples": func.count()}
+        for name in TELEMETRY_METRICS.values():
+            metric = getattr(Telemetry, name)
+            aggregates[f"{name}_min"] = func.min(metric)
+            aggregates[f"{name}_max"] = func.max(metric)
+            aggregates[f"{name}_sum"] = func.sum(metric)
+            aggregates[f"{name}_count"] = func.count(metric)
+        return aggregates
+
+    aggregates = {"samples": func.sum(source.samples)}
+    for name in TELEMETRY_METRICS.values():
+        aggregates[f"{name}_min"] = func.min(getattr(source, f"{name}_min"))
+        aggregates[f"{name}_max"] = func.max(getattr(source, f"{name}_max"))
+        aggregates[f"{name}_sum"] = func.sum(getattr(source, f"{name}_sum"))
+        aggregates[f"{name}_count"] = func.sum(getattr(source, f"{name}_count"))
+    return aggregates
+
+
+class TelemetryRollupsRepository:
+    async def take_queued(
+        self, session: AsyncSession, limit: int
+    ) -> list[tuple[int, datetime]]:
+        """Забирает из очереди пачку корзин на пересчет. Корзины, которые сейчас
+        отмечает незакоммиченная пачка телеметрии, заблокированы и пропускаются
+        до следующего прохода - иначе пересчет не увидел бы ее строк"""
+        queue = TelemetryRollupQueue
+        picked = (
+            select(queue.device_id, queue.bucket)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            delete(queue)
+            .where(tuple_(queue.device_id, queue.bucket).in_(picked))
+            .returning(queue.device_id, queue.bucket)
+        )
+        result = await session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    async def refresh(
+        self,
+        session: AsyncSession,
+        target: type[TelemetryRollupMixin],
+        source,
+        size: timedelta,
+        keys: list[tuple[int, datetime]],
+    ):
+        """Пересчитывает корзины keys уровня target целиком по source (upsert)"""
+        if not keys:
+            return
+
+        buckets = values(
+            column("device_id", Integer),
+            column("bucket", DateTime(timezone=True)),
+            name="buckets",
+        ).data(keys)
+        source_ts = source.ts if source is Telemetry else source.bucket
+        aggregates = _aggregates(source)
+
+        query = (
+            select(buckets.c.device_id, buckets.c.bucket, *aggregates.values())
+            .join_from(
+                buckets,
+                source,
+                and_(
+                    source.device_id == buckets.c.device_id,
+                    source_ts >= buckets.c.bucket,
+                    source_ts < buckets.c.bucket + size,
+                ),
+            )
+            .group_by(buckets.c.device_id, buckets.c.bucket)
+        )
+        stmt = insert(target).from_select(["device_id", "bucket", *aggregates], query)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["device_id", "bucket"],
+            set_={name: stmt.excluded[name] for name in aggregates},
+        )
+        await session.execute(stmt)
+
+    async def get_aggregate(
+        self,
+        session: AsyncSession,
+        model: type[TelemetryRollupMixin],
+        size: timedelta,
+        device_id: int,
+        query: TelemetryAggregateQuery,
+    ) -> list[TelemetryAggregateBucket]:
+        """Агрегаты по корзинам, собранные из корзин уровня model (без p95).
+        Размер корзины запроса должен быть кратен size. Корзины уровня, которые
+        период захватывает лишь частично, считаются по сырым строкам"""
+        # целые корзины уровня внутри [start, end)
+        first = bucket_start(query.start, size)
+        if first < query.start:
+            first += size
+        last = bucket_start(query.end, size)
+        if last < first:  # период внутри одной корзины уровня
+            first = last = query.end
+
+        names = ["samples"]
+        for name in query.metrics:
+            column = TELEMETRY_METRICS[name]
+            names += [f"{column}_{part}" for part in ("min", "max", "sum", "count")]
+
+        rolled = select(model.bucket, *(getattr(model, name) for name in names)).where(
+            model.device_id == device_id,
+            model.bucket >= first,
+            model.bucket < last,
+        )
+        raw = _aggregates(Telemetry)
+        raw_bucket = func.date_bin(size, Telemetry.ts, EPOCH)
+        edges = (
+            select(
+                raw_bucket.label("bucket"), *(raw[name].label(name) for name in names)
+            )
+            .where(
+                Telemetry.device_id == device_id,
+                or_(
+                    and_(Telemetry.ts >= query.start, Telemetry.ts < first),
+                    and_(Telemetry.ts >= last, Telemetry.ts < query.end),
+                ),
+            )
+            .group_by(raw_bucket)
+        )
+        source = union_all(rolled, edges).subquery("source")
+
+        bucket = func.date_bin(query.bucket, source.c.bucket, EPOCH)
+        columns = [bucket.label("bucket"), func.sum(source.c.samples).label("samples")]
+        for name in query.metrics:
+            column = TELEMETRY_METRICS[name]
+            total = func.sum(source.c[f"{column}_sum"])
+            count = func.sum(source.c[f"{column}_count"])
+            columns += [
+                func.min(source.c[f"{column}_min"]).label(f"{column}_min"),
+                func.max(source.c[f"{column}_max"]).label(f"{column}_max"),
+                (total / func.nullif(count, 0)).label(f"{column}_avg"),
+                count.label(f"{column}_count"),
+            ]
+
+        stmt = select(*columns).group_by(bucket).order_by(bucket)
+        result = await session.execute(stmt)
+        return [
+            TelemetryAggregateBucket.from_row(row, metrics=query.metrics)
+            for row in result.mappings()
+        ]
+
+    async def get_series(
+        self,
+        session: AsyncSession,
+        model: type[TelemetryRollupMixin],
+        device_id: int,
+        metrics: list[str],
+        start: datetime,
+        end: datetime,
+    ) -> Sequence[Sequence[Any]]:
+        """Корзины уровня model: (bucket, min и max каждой из metrics...)"""
+        columns = []
+        for name in metrics:
+            column = TELEMETRY_METRICS[name]
+            columns += [
+                getattr(model, f"{column}_min"),
+                getattr(model, f"{column}_max"),
+            ]
+
+        stmt = (
+            select(model.bucket, *columns)
+            .where(
+                model.device_id == device_id,
+                model.bucket >= start,
+                model.bucket < end,
+            )
+            .order_by(model.bucket)
+        )
+        result = await session.execute(stmt)
+        return result.tuples().all()
+
+    async def delete_before(
+        self,
+        session: AsyncSession,
+        model: type[TelemetryRollupMixin],
+        before: datetime,
+    ):
+        await session.execute(delete(model).where(model.bucket < before))
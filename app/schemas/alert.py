@@ -0,0 +1,135 @@
+import operator
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl, field_validator
+
+from app.models.telemetry import TELEMETRY_METRICS
+from app.schemas.telemetry import parse_duration
+
+
+class AlertOperator(str, Enum):
+    GT = ">"
+    GE = ">="
+    LT = "<"
+    LE = "<="
+
+
+ALERT_OPERATORS: dict[AlertOperator, Callable[[float, float], bool]] = {
+    AlertOperator.GT: operator.gt,
+    AlertOperator.GE: operator.ge,
+    AlertOperator.LT: operator.lt,
+    AlertOperator.LE: operator.le,
+}
+
+
+class AlertRuleBase(BaseModel):
+    name: Optional[str] = Field(default=None, max_length=64)
+    operator: AlertOperator
+    threshold: float
+    # сколько условие должно держаться до срабатывания: "2m"; 0 - сразу
+    duration: timedelta = timedelta(0)
+    enabled: bool = True
+    notify_email: bool = True
+    webhook_url: Optional[HttpUrl] = None
+
+    @field_validator("duration", mode="before")
+    @classmethod
+    def duration_from_str(cls, value: Any) -> Any:
+        return parse_duration(value)
+
+    @field_validator("duration")
+    @classmethod
+    def check_duration(cls, value: timedelta | None) -> timedelta | None:
+        if value is not None and value < timedelta(0):
+            raise ValueError("duration must not be negative")
+        return value
+
+
+class AlertRuleCreate(AlertRuleBase):
+    device_id: Optional[int] = None  # None - все устройства владельца
+    metric: str = Field(examples=["cpu.pct"])
+
+    @field_validator("metric")
+    @classmethod
+    def check_metric(cls, value: str) -> str:
+        if value not in TELEMETRY_METRICS:
+            raise ValueError(f"Unknown metric: {value}")
+        return value
+
+
+class AlertRuleUpdate(AlertRuleBase):
+    name: Optional[str] = Field(default=None, max_length=64)
+    operator: Optional[AlertOperator] = None
+    threshold: Optional[float] = None
+    duration: Optional[timedelta] = None
+    enabled: Optional[bool] = None
+    notify_email: Optional[bool] = None
+
+
+class AlertRuleDB(BaseModel):
+    owner_id: int
+    device_id: Optional[int]
+    name: Optional[str]
+    metric: str
+    operator: str
+    threshold: float
+    duration_sec: int
+    enabled: bool
+    notify_email: bool
+    webhook_url: Optional[str]
+
+
+class AlertRuleDBUpdate(BaseModel):
+    name: Optional[str] = None
+    operator: Optional[str] = None
+    threshold: Optional[float] = None
+    duration_sec: Optional[int] = None
+    enabled: Optional[bool] = None
+    notify_email: Optional[bool] = None
+    webhook_url: Optional[str] = None
+
+
+class AlertRuleResponse(BaseModel):
+    id: int
+    owner_id: int
+    device_id: Optional[int]
+    name: Optional[str]
+    metric: str
+    operator: AlertOperator
+    threshold: float
+    duration_sec: int
+    enabled: bool
+    notify_email: bool
+    webhook_url: Optional[str]
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @property
+    def expression(self) -> str:
+        rule = f"{self.metric} {self.operator.value} {self.threshold:g}"
+        return f"{rule} for {self.duration_sec}s" if self.duration_sec else rule
+
+
+class AlertState(str, Enum):
+    FIRED = "fired"
+    RESOLVED = "resolved"
+
+
+class AlertEvent(BaseModel):
+    """Сообщение очереди alerts: переход правила в firing и обратно для устройства"""
+
+    state: AlertState
+    rule_id: int
+    owner_id: int
+    device_id: int
+    rule_name: Optional[str]
+    expression: str  # "cpu.pct > 90 for 120s"
+    metric: str
+    value: float  # значение образца, на котором сменилось состояние
+    since: datetime  # начало нарушения
+    ts: datetime  # время образца
+    notify_email: bool = True
+    webhook_url: Optional[str] = None
@@ -3,6 +3,8 @@ from typing import Optional
 
 from pydantic import BaseModel, Field, ConfigDict
 
+from app.schemas.telemetry import TelemetryDerived, TelemetryLatest
+
 class DeviceBase(BaseModel):
     name: str = Field(min_length=1, max_length=16, examples=["ipc-01"])
 
@@ -13,6 +15,12 @@ class DeviceDB(DeviceBase):
     token: str
     owner_id: int
 
+class DeviceIdentity(BaseModel):
+    id: int
+    owner_id: int
+
+    model_config = ConfigDict(from_attributes=True)
+
 class DeviceResponse(DeviceBase):
     id: int
     token: str
@@ -20,5 +28,42 @@ class DeviceResponse(DeviceBase):
     created_at: datetime
     owner_id: int
     last_seen_at: Optional[datetime]
+    latest: Optional[TelemetryLatest] = None  # текущие метрики из кэша, не из бд
+    derived: Optional[TelemetryDerived] = None  # EWMA, тренды, скорости счетчиков
+
+    model_config = ConfigDict(from_attributes=True)
+
+class DeviceRank(BaseModel):
+    id: int
+    name: str
+    value: float
+
+class DevicesOverview(BaseModel):
+    total: int
+    online: int
+    offline: int
+    averages: dict[str, Optional[float]]  # "cpu.pct" -> среднее по устройствам на связи
+    top: dict[str, list[DeviceRank]]  # "cpu.pct" -> устройства по убыванию значения
+
+class DeviceInterval(BaseModel):
+    """Сессия связи: устройство было online в [online_from, online_to)"""
+
+    device_id: int
+    online_from: datetime
+    online_to: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class DeviceOutage(BaseModel):
+    start: datetime
+    end: datetime
+    duration_sec: float
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+class DeviceUptime(BaseModel):
+    device_id: int
+    start: datetime
+    end: datetime
+    online_sec: float
+    availability: float  # доля периода (после привязки, до сейчас) online
+    online: bool  # открыта ли сессия сейчас
+    outages: list[DeviceOutage]
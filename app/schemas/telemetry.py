@@ -1,7 +1,39 @@
-from datetime import datetime
+import base64
+import json
+import re
+from datetime import datetime, timedelta, timezone
 from enum import Enum
+from typing import Any, Mapping, Optional
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import (
+    BaseModel,
+    Field,
+    ConfigDict,
+    ValidationInfo,
+    field_validator,
+    model_validator,
+)
+from sqlalchemy import BigInteger, Integer
+
+from app.models.telemetry import Telemetry, TELEMETRY_METRICS, TELEMETRY_SECTIONS
+
+
+def _metric_type(column_name: str) -> tuple[type, float]:
+    """Тип python и предел по модулю для значения колонки метрики"""
+    column_type = Telemetry.__table__.c[column_name].type
+    if isinstance(column_type, BigInteger):
+        return int, 2**63
+    if isinstance(column_type, Integer):
+        return int, 2**31
+    return float, 3.4e38  # REAL
+
+
+_METRIC_TYPES = {
+    name: _metric_type(column) for name, column in TELEMETRY_METRICS.items()
+}
+_METRIC_FIELDS = [
+    (*name.split(".", 1), column) for name, column in TELEMETRY_METRICS.items()
+]
 
 
 class TelemetryBase(BaseModel):
@@ -14,7 +46,42 @@ class TelemetryBase(BaseModel):
     network: dict
 
 class TelemetryUpload(TelemetryBase):
-    pass
+    @field_validator(*TELEMETRY_SECTIONS)
+    @classmethod
+    def coerce_metrics(cls, values: dict, info: ValidationInfo) -> dict:
+        # известные метрики пишутся в числовые колонки, поэтому проверяем их сразу
+        coerced = dict(values)
+        for field, value in values.items():
+            metric = _METRIC_TYPES.get(f"{info.field_name}.{field}")
+            if metric is None or value is None:
+                continue
+
+            python_type, limit = metric
+            if (
+                isinstance(value, bool)
+                or not isinstance(value, (int, float))
+                or not -limit < value < limit
+            ):
+                raise ValueError(f"{info.field_name}.{field} must be a number")
+            coerced[field] = python_type(value)
+        return coerced
+
+    def to_row(self) -> dict:
+        """Раскладывает секции по колонкам таблицы, остальное уходит в extra"""
+        row: dict[str, Any] = dict.fromkeys(TELEMETRY_METRICS.values())
+        row["device_id"] = self.device_id
+        row["ts"] = self.ts
+
+        extra: dict[str, dict] = {}
+        for section in TELEMETRY_SECTIONS:
+            for field, value in getattr(self, section).items():
+                column = TELEMETRY_METRICS.get(f"{section}.{field}")
+                if column is not None:
+                    row[column] = value
+                else:
+                    extra.setdefault(section, {})[field] = value
+        row["extra"] = extra or None
+        return row
 
 
 class TelemetryResponse(TelemetryBase):
@@ -22,11 +89,219 @@ class TelemetryResponse(TelemetryBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+    @model_validator(mode="before")
+    @classmethod
+    def from_columns(cls, data: Any) -> Any:
+        # в бд метрики лежат в отдельных колонках, наружу отдаем прежние секции
+        if isinstance(data, dict):
+            return data
+
+        extra = data.extra or {}
+        sections = {
+            section: dict(extra.get(section) or {}) for section in TELEMETRY_SECTIONS
+        }
+        for section, field, column in _METRIC_FIELDS:
+            sections[section][field] = getattr(data, column)
+
+        return {"id": data.id, "device_id": data.device_id, "ts": data.ts, **sections}
+
+class TelemetryLatest(BaseModel):
+    """Последний принятый образец устройства"""
+
+    ts: datetime
+    cpu: dict = {}
+    memory: dict = {}
+    disk: dict = {}
+    sensors: dict = {}
+    network: dict = {}
+
+
+class TelemetryDerived(BaseModel):
+    """Производные метрики, посчитанные на лету по всем образцам устройства"""
+
+    ts: datetime  # время последнего учтенного образца
+    cpu_pct_ewma: Optional[float] = None
+    memory_pct_ewma: Optional[float] = None
+    memory_pct_per_hour: Optional[float] = None  # наклон регрессии за окно
+    disk_used_pct_per_hour: Optional[float] = None
+    disk_full_in_hours: Optional[float] = None  # None - диск не заполняется
+    net_sent_bytes_per_sec: Optional[float] = None  # из приращений счетчиков
+    net_recv_bytes_per_sec: Optional[float] = None
+
+
+class TelemetryPartition(BaseModel):
+    name: str
+    start: datetime | None  # None - секция без нижней границы (MINVALUE)
+    end: datetime
+
+
+class AckMode(str, Enum):
+    RECEIPT = "receipt"  # сразу после разбора кадра, до записи в буфер
+    BUFFERED = "buffered"  # после попадания в буфер записи
+    DURABLE = "durable"  # после коммита в бд
+
 class TelemetryOrder(str, Enum):
     OLD = "old"
     NEW = "new"
 
+def encode_cursor(ts: datetime, id: int) -> str:
+    """Непрозрачный курсор страницы: ключ (ts, id) последней отданной строки"""
+    raw = json.dumps([ts.isoformat(), id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_fields(value: str) -> list[tuple[str, str | None]]:
+    """fields=ts,cpu.pct,disk -> [("cpu", "pct"), ("disk", None)].
+    None - секция целиком; id и ts отдаются всегда"""
+    fields = []
+    for name in value.split(","):
+        name = name.strip()
+        if not name or name in ("id", "ts"):
+            continue
+
+        section, _, field = name.partition(".")
+        if section not in TELEMETRY_SECTIONS or "." in field:
+            raise ValueError(f"Unknown field: {name}")
+        fields.append((section, field or None))
+    return list(dict.fromkeys(fields))
+
+
+def fields_metrics(fields: list[tuple[str, str | None]]) -> list[str]:
+    """Известные метрики из разобранного fields: секция - все ее метрики.
+    Ряды строятся только по числовым колонкам, поля из extra не подходят"""
+    if not fields:
+        return list(TELEMETRY_METRICS)
+
+    metrics = []
+    for section, field in fields:
+        if field is None:
+            metrics += [
+                name for name in TELEMETRY_METRICS if name.startswith(f"{section}.")
+            ]
+        elif f"{section}.{field}" in TELEMETRY_METRICS:
+            metrics.append(f"{section}.{field}")
+        else:
+            raise ValueError(f"Not a metric: {section}.{field}")
+    return list(dict.fromkeys(metrics))
+
+
 class TelemetryPagination(BaseModel):
     limit: int = Field(gt=0, default=20)
-    offset: int = Field(ge=0, default=0)
+    offset: int = Field(ge=0, default=0)  # устарело: глубокие страницы медленные, см. cursor
+    cursor: str | None = None  # next_cursor из предыдущей страницы
     order: TelemetryOrder = TelemetryOrder.OLD
+
+
+MAX_AGGREGATE_BUCKETS = 10000  # больше точек график все равно не нарисует
+
+_DURATION = re.compile(r"^(\d+)([smhdw])$")
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_duration(value: Any) -> Any:
+    """"30s", "5m", "1h", "1d", "1w" -> timedelta; остальное отдается как есть"""
+    if isinstance(value, str):
+        match = _DURATION.match(value.strip())
+        if match is None:
+            raise ValueError("duration must look like 30s, 5m, 1h, 1d or 1w")
+        return timedelta(seconds=int(match[1]) * _DURATION_UNITS[match[2]])
+    return value
+
+
+class TelemetryAggregateQuery(BaseModel):
+    start: datetime
+    end: datetime
+    bucket: timedelta  # "30s", "5m", "1h", "1d", "1w"
+    metrics: list[str]  # "cpu.pct", "memory.pct", ...; пусто - все метрики
+
+    @field_validator("start", "end")
+    @classmethod
+    def assume_utc(cls, value: datetime) -> datetime:
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+    @field_validator("bucket", mode="before")
+    @classmethod
+    def parse_bucket(cls, value: Any) -> Any:
+        return parse_duration(value)
+
+    @field_validator("metrics", mode="before")
+    @classmethod
+    def split_metrics(cls, value: Any) -> Any:
+        if value is None:
+            return list(TELEMETRY_METRICS)
+        if isinstance(value, str):
+            value = [name.strip() for name in value.split(",") if name.strip()]
+        return value or list(TELEMETRY_METRICS)
+
+    @field_validator("metrics")
+    @classmethod
+    def check_metrics(cls, value: list[str]) -> list[str]:
+        unknown = [name for name in value if name not in TELEMETRY_METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+        return list(dict.fromkeys(value))
+
+    @model_validator(mode="after")
+    def check_range(self) -> "TelemetryAggregateQuery":
+        if self.bucket < timedelta(seconds=1):
+            raise ValueError("bucket must be at least 1s")
+        if self.start >= self.end:
+            raise ValueError("from must be earlier than to")
+        if (self.end - self.start) / self.bucket > MAX_AGGREGATE_BUCKETS:
+            raise ValueError(f"Too many buckets, max {MAX_AGGREGATE_BUCKETS}")
+        return self
+
+
+class MetricAggregate(BaseModel):
+    min: float | None
+    max: float | None
+    avg: float | None
+    p95: float | None = None  # только по сырым данным, в агрегатах его нет
+    count: int
+
+
+class TelemetryAggregateBucket(BaseModel):
+    bucket: datetime
+    samples: int
+    metrics: dict[str, MetricAggregate]
+
+    @classmethod
+    def from_row(cls, row: Mapping, metrics: list[str]) -> "TelemetryAggregateBucket":
+        """Строка запроса агрегации: колонки <колонка метрики>_min/_max/_avg/_p95/_count"""
+        aggregates = {}
+        for name in metrics:
+            column = TELEMETRY_METRICS[name]
+            aggregates[name] = MetricAggregate(
+                min=row[f"{column}_min"],
+                max=row[f"{column}_max"],
+                avg=row[f"{column}_avg"],
+                p95=row.get(f"{column}_p95"),
+                count=row[f"{column}_count"],
+            )
+        return cls(bucket=row["bucket"], samples=row["samples"], metrics=aggregates)
+
+
+class TelemetryAggregate(BaseModel):
+    device_id: int
+    source: str  # telemetry (сырые строки), telemetry_1m, telemetry_1h, telemetry_1d
+    buckets: list[TelemetryAggregateBucket]
+
+
+class MetricSeries(BaseModel):
+    ts: list[datetime]
+    values: list[float]
+
+
+class TelemetrySeries(BaseModel):
+    device_id: int
+    source: str  # telemetry (LTTB по сырым строкам) или telemetry_1m/1h/1d (min/max)
+    series: dict[str, MetricSeries]  # "cpu.pct" -> не больше max_points точек
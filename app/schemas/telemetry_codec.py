@@ -0,0 +1,179 @@
+import codecs
+import json
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator
+
+try:
+    import msgpack
+except ImportError:  # без msgpack агентам доступен только json
+    msgpack = None
+
+JSON_PROTOCOL = "ims.json.v1"
+MSGPACK_PROTOCOL = "ims.msgpack.v1"
+
+TELEMETRY_FRAME = 0
+
+MAX_PENDING_CHARS = 1024 * 1024  # один образец телеметрии не может быть больше
+
+# Фиксированная схема кадра телеметрии: имена полей не передаются,
+# кадр - это [TELEMETRY_FRAME, ts, cpu, memory, disk, sensors, network, seq],
+# где ts - unix time, каждая секция - список значений в порядке ниже (или None),
+# seq - необязательный номер кадра для оконных подтверждений. Поля секции вне
+# схемы идут словарем последним элементом ее списка, как и в json они попадут в extra
+TELEMETRY_SCHEMA: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("cpu", ("pct", "freq_mhz", "temperature_c")),
+    ("memory", ("total_mb", "used_mb", "pct")),
+    ("disk", ("mount", "total_mb", "used_mb", "free_mb", "used_pct")),
+    ("sensors", ("fan_rpm",)),
+    ("network", ("bytes_sent_total", "bytes_recv_total", "down_mbps", "up_mbps")),
+)
+
+
+def pack_telemetry(payload: dict, seq: int | None = None) -> list:
+    ts = payload["ts"]
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if isinstance(ts, datetime):
+        ts = ts.timestamp()
+
+    frame = [TELEMETRY_FRAME, ts]
+    for section, fields in TELEMETRY_SCHEMA:
+        values = payload.get(section)
+        if values is None:
+            frame.append(None)
+            continue
+
+        packed = [values.get(field) for field in fields]
+        unknown = {k: v for k, v in values.items() if k not in fields}
+        if unknown:
+            packed.append(unknown)
+        frame.append(packed)
+    if seq is not None:
+        frame.append(seq)
+    return frame
+
+
+def unpack_telemetry(frame: list) -> dict:
+    payload = {"ts": frame[1]}
+    for (section, fields), values in zip(TELEMETRY_SCHEMA, frame[2:]):
+        if values is None:
+            payload[section] = None
+            continue
+
+        payload[section] = dict(zip(fields, values))
+        if len(values) > len(fields) and isinstance(values[-1], dict):
+            payload[section].update(values[-1])
+
+    message = {"type": "telemetry", "payload": payload}
+    if len(frame) > len(TELEMETRY_SCHEMA) + 2:
+        message["seq"] = frame[len(TELEMETRY_SCHEMA) + 2]
+    return message
+
+
+class JsonCodec:
+    binary = False
+
+    @staticmethod
+    def encode(message: dict) -> str:
+        return json.dumps(message)
+
+    @staticmethod
+    def decode(data: str | bytes) -> dict:
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    binary = True
+
+    @staticmethod
+    def encode(message: dict) -> bytes:
+        return msgpack.packb(message)
+
+    @staticmethod
+    def decode(data: bytes) -> dict:
+        frame = msgpack.unpackb(data)
+        if isinstance(frame, list) and frame and frame[0] == TELEMETRY_FRAME:
+            return unpack_telemetry(frame)
+        return frame
+
+
+TelemetryCodec = JsonCodec | MsgpackCodec
+
+
+def negotiate_codec(subprotocols: list[str]) -> tuple[TelemetryCodec, str | None]:
+    """Выбирает формат по Sec-WebSocket-Protocol агента, json - формат по умолчанию"""
+    if MSGPACK_PROTOCOL in subprotocols and msgpack is not None:
+        return MsgpackCodec(), MSGPACK_PROTOCOL
+    if JSON_PROTOCOL in subprotocols:
+        return JsonCodec(), JSON_PROTOCOL
+    return JsonCodec(), None
+
+
+async def iter_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[dict]:
+    """Разбирает поток NDJSON построчно, не дожидаясь конца тела запроса"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+        if len(pending) > MAX_PENDING_CHARS:
+            raise ValueError("NDJSON line is too long")
+
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield json.loads(pending)
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[dict]:
+    """Разбирает поток JSON-массива объектов по одному объекту"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = json.JSONDecoder()
+    pending = ""
+    # open - ждем "[", first - объект или "]", item - объект, next - "," или "]"
+    state = "open"
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        pos = 0
+        while state != "closed":
+            while pos < len(pending) and pending[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(pending):
+                break
+
+            char = pending[pos]
+            if state == "open":
+                if char != "[":
+                    raise ValueError("Expected JSON array")
+                state, pos = "first", pos + 1
+            elif state == "next":
+                # между объектами ровно одна запятая
+                if char == ",":
+                    state, pos = "item", pos + 1
+                elif char == "]":
+                    state, pos = "closed", pos + 1
+                else:
+                    raise ValueError("Expected ',' or ']'")
+            elif state == "first" and char == "]":
+                state, pos = "closed", pos + 1
+            elif char != "{":
+                raise ValueError("Expected JSON object")
+            else:
+                try:
+                    item, pos = parser.raw_decode(pending, pos)
+                except json.JSONDecodeError:
+                    # объект пришел не целиком - ждем следующий кусок
+                    break
+                state = "next"
+                yield item
+
+        pending = pending[pos:]
+        if len(pending) > MAX_PENDING_CHARS:
+            raise ValueError("JSON object is too long")
+
+    if state != "closed" or pending.strip():
+        raise ValueError("Unterminated JSON array")
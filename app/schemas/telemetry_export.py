@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+from enum import Enum
+from typing import Any, Sequence
+
+from sqlalchemy import BigInteger, Integer
+
+from app.models.telemetry import Telemetry, TELEMETRY_METRICS, TELEMETRY_SECTIONS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # без pyarrow выгрузка доступна только в csv и ndjson
+    pyarrow = None
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+
+# Порядок колонок выгрузки: строка из бд - кортеж в этом же порядке
+EXPORT_COLUMNS: tuple[str, ...] = (
+    "id",
+    "device_id",
+    "ts",
+    *TELEMETRY_METRICS.values(),
+    "extra",
+)
+# Заголовки плоских форматов: метрики под именами "секция.поле", как в API
+EXPORT_HEADER: tuple[str, ...] = ("id", "device_id", "ts", *TELEMETRY_METRICS, "extra")
+
+_EXTRA = len(EXPORT_COLUMNS) - 1
+_METRIC_FIELDS = [
+    (*name.split(".", 1), i) for i, name in enumerate(TELEMETRY_METRICS, start=3)
+]
+
+
+class ExportWriter:
+    """Кодирует пачки строк телеметрии в байты выгрузки по мере чтения из бд"""
+
+    media_type = "application/octet-stream"
+    extension = "bin"
+
+    def open(self) -> bytes:
+        return b""
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        raise NotImplementedError
+
+    def close(self) -> bytes:
+        return b""
+
+
+class CsvWriter(ExportWriter):
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def open(self) -> bytes:
+        self._writer.writerow(EXPORT_HEADER)
+        return self._drain()
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        for row in rows:
+            row = list(row)
+            row[2] = row[2].isoformat()
+            if row[_EXTRA] is not None:
+                row[_EXTRA] = json.dumps(row[_EXTRA], separators=(",", ":"))
+            self._writer.writerow(row)
+        return self._drain()
+
+
+class NdjsonWriter(ExportWriter):
+    """Образцы в том же виде, что принимает POST /telemetry/bulk"""
+
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        lines = []
+        for row in rows:
+            extra = row[_EXTRA] or {}
+            sample = {"id": row[0], "device_id": row[1], "ts": row[2].isoformat()}
+            for section in TELEMETRY_SECTIONS:
+                sample[section] = dict(extra.get(section) or {})
+            for section, field, i in _METRIC_FIELDS:
+                sample[section][field] = row[i]
+            lines.append(json.dumps(sample, separators=(",", ":")))
+        lines.append("")
+        return "\n".join(lines).encode()
+
+
+class _Sink(io.RawIOBase):
+    """Файл для pyarrow, который копит записанное до следующего drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _parquet_type(column: str):
+    column_type = Telemetry.__table__.c[column].type
+    if isinstance(column_type, BigInteger):
+        return pyarrow.int64()
+    if isinstance(column_type, Integer):
+        return pyarrow.int32()
+    return pyarrow.float32()  # REAL
+
+
+class ParquetWriter(ExportWriter):
+    """Parquet по группам строк: в памяти не больше одной группы"""
+
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self, row_group_size: int):
+        self.row_group_size = row_group_size
+        self._schema = pyarrow.schema(
+            [
+                ("id", pyarrow.int64()),
+                ("device_id", pyarrow.int32()),
+                ("ts", pyarrow.timestamp("us", tz="UTC")),
+                *(
+                    (name, _parquet_type(column))
+                    for name, column in TELEMETRY_METRICS.items()
+                ),
+                ("extra", pyarrow.string()),  # json, как в csv
+            ]
+        )
+        self._sink = _Sink()
+        self._writer = pyarrow.parquet.ParquetWriter(
+            self._sink, self._schema, compression="zstd"
+        )
+        self._rows: list[Sequence[Any]] = []
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+
+        columns = [list(column) for column in zip(*self._rows)]
+        columns[_EXTRA] = [
+            None if value is None else json.dumps(value, separators=(",", ":"))
+            for value in columns[_EXTRA]
+        ]
+        self._writer.write_table(
+            pyarrow.Table.from_arrays(columns, schema=self._schema),
+            row_group_size=self.row_group_size,
+        )
+        self._rows = []
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        self._rows.extend(rows)
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._flush()
+        self._writer.close()
+        return self._sink.drain()
+
+
+def make_writer(format: ExportFormat, row_group_size: int) -> ExportWriter:
+    if format == ExportFormat.CSV:
+        return CsvWriter()
+    if format == ExportFormat.NDJSON:
+        return NdjsonWriter()
+    if pyarrow is None:
+        raise ValueError("Parquet export requires pyarrow")
+    return ParquetWriter(row_group_size=row_group_size)
@@ -1,13 +1,37 @@
-from app.core import S3Client, cache_storage, sessions_storage, emails_publisher
+from app.core import (
+    S3Client,
+    cache_storage,
+    sessions_storage,
+    emails_publisher,
+    alerts_publisher,
+    db_manager,
+    settings,
+)
+from app.repositories.alert_rules_repository import AlertRulesRepository
 from app.repositories.files_repository import FilesRepository
+from app.repositories.device_connectivity_repository import (
+    DeviceConnectivityRepository,
+)
 from app.repositories.devices_repository import DevicesRepository
 from app.repositories.telemetry_repository import TelemetryRepository
+from app.repositories.telemetry_rollups_repository import TelemetryRollupsRepository
 from app.repositories.users_repository import UsersRepository
+from app.services.alert_engine import AlertEngine
+from app.services.alerts_service import AlertsService
 from app.services.auth_service import AuthService
 from app.services.cookie_service import CookieService
+from app.services.device_events import DeviceEvents
+from app.services.device_token_cache import DeviceTokenCache
+from app.services.derived_metrics import DerivedMetrics
 from app.services.devices_service import DevicesService
 from app.services.emails_service import EmailsService
 from app.services.files_service import FilesService
+from app.services.latest_telemetry import LatestTelemetry
+from app.services.presence_tracker import PresenceTracker
+from app.services.telemetry_buffer import TelemetryBuffer
+from app.services.telemetry_hub import TelemetryHub
+from app.services.telemetry_partitions import TelemetryPartitions
+from app.services.telemetry_rollups import TelemetryRollups
 from app.services.telemetry_service import TelemetryService
 from app.services.users_service import UsersService
 
@@ -16,7 +40,78 @@ _files_repo = FilesRepository()
 _s3 = S3Client()
 _cookie = CookieService()
 _devices_repo = DevicesRepository()
+_connectivity_repo = DeviceConnectivityRepository()
 _telemetry_repo = TelemetryRepository()
+_telemetry_rollups_repo = TelemetryRollupsRepository()
+_alert_rules_repo = AlertRulesRepository()
+_device_token_cache = DeviceTokenCache(
+    cache_storage=cache_storage,
+    max_size=settings.telemetry.token_cache_size,
+    local_ttl=settings.telemetry.token_cache_local_ttl,
+    ttl=settings.telemetry.token_cache_ttl,
+)
+
+telemetry_buffer = TelemetryBuffer(
+    repository=_telemetry_repo,
+    session_factory=db_manager.session_factory,
+    max_size=settings.telemetry.buffer_max_size,
+    max_age=settings.telemetry.buffer_max_age,
+)
+device_events = DeviceEvents(cache_storage=cache_storage)
+telemetry_hub = TelemetryHub(
+    cache_storage=cache_storage,
+    queue_size=settings.telemetry.live_queue_size,
+    publish_queue_size=settings.telemetry.live_publish_queue_size,
+)
+telemetry_partitions = TelemetryPartitions(
+    repository=_telemetry_repo,
+    session_factory=db_manager.session_factory,
+    partition_days=settings.telemetry.partition_days,
+    ahead=settings.telemetry.partitions_ahead,
+    retention_days=settings.telemetry.retention_days,
+    check_interval=settings.telemetry.partition_check_interval,
+)
+telemetry_rollups = TelemetryRollups(
+    repository=_telemetry_rollups_repo,
+    session_factory=db_manager.session_factory,
+    interval=settings.telemetry.rollup_interval,
+    batch_size=settings.telemetry.rollup_batch_size,
+    minute_retention_days=settings.telemetry.rollup_minute_retention_days,
+)
+latest_telemetry = LatestTelemetry(
+    cache_storage=cache_storage,
+    flush_interval=settings.telemetry.latest_flush_interval,
+    local_ttl=settings.telemetry.latest_local_ttl,
+    max_size=settings.telemetry.latest_cache_size,
+    ttl=settings.telemetry.latest_ttl,
+)
+derived_metrics = DerivedMetrics(
+    cache_storage=cache_storage,
+    half_life=settings.telemetry.derived_ewma_half_life,
+    window=settings.telemetry.derived_trend_window,
+    buckets=settings.telemetry.derived_trend_buckets,
+    flush_interval=settings.telemetry.derived_flush_interval,
+    max_size=settings.telemetry.derived_cache_size,
+    ttl=settings.telemetry.derived_ttl,
+)
+alert_engine = AlertEngine(
+    repository=_alert_rules_repo,
+    session_factory=db_manager.session_factory,
+    cache_storage=cache_storage,
+    publisher=alerts_publisher,
+    refresh_interval=settings.alerts.rules_refresh_interval,
+    publish_queue_size=settings.alerts.publish_queue_size,
+    flush_interval=settings.alerts.state_flush_interval,
+    state_ttl=settings.alerts.state_ttl,
+)
+presence_tracker = PresenceTracker(
+    repository=_devices_repo,
+    connectivity_repository=_connectivity_repo,
+    session_factory=db_manager.session_factory,
+    cache_storage=cache_storage,
+    flush_interval=settings.telemetry.presence_flush_interval,
+    ttl=settings.telemetry.presence_ttl,
+)
 
 
 def get_user_serivce() -> UsersService:
@@ -56,12 +151,37 @@ def get_devices_service() -> DevicesService:
     return DevicesService(
         repository=_devices_repo,
         cache_storage=cache_storage,
+        token_cache=_device_token_cache,
+        device_events=device_events,
+        latest=latest_telemetry,
+        derived=derived_metrics,
+        presence=presence_tracker,
+        connectivity_repository=_connectivity_repo,
     )
 
 
 def get_telemetry_service() -> TelemetryService:
     return TelemetryService(
         telemetry_repository=_telemetry_repo,
+        rollups_repository=_telemetry_rollups_repo,
         cache_storage=cache_storage,
         devices_repository=_devices_repo,
+        buffer=telemetry_buffer,
+        presence=presence_tracker,
+        session_factory=db_manager.session_factory,
+        token_cache=_device_token_cache,
+        device_events=device_events,
+        hub=telemetry_hub,
+        partitions=telemetry_partitions,
+        latest=latest_telemetry,
+        derived=derived_metrics,
+        alerts=alert_engine,
+    )
+
+
+def get_alerts_service() -> AlertsService:
+    return AlertsService(
+        repository=_alert_rules_repo,
+        devices_repository=_devices_repo,
+        engine=alert_engine,
     )
@@ -0,0 +1,325 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from faststream.rabbit.publisher import RabbitPublisher
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.redis_manager import RedisStorage
+from app.repositories.alert_rules_repository import AlertRulesRepository
+from app.schemas.alert import (
+    ALERT_OPERATORS,
+    AlertEvent,
+    AlertRuleResponse,
+    AlertState,
+)
+from app.schemas.device import DeviceIdentity
+from app.schemas.telemetry import TelemetryUpload
+
+logger = logging.getLogger(__name__)
+
+RULES_CHANGED_CHANNEL = "alerts:rules"
+
+# метрика -> правила с уже разобранными секцией, полем и оператором
+_MetricRules = dict[
+    tuple[str, str],
+    list[tuple[AlertRuleResponse, Callable[[float, float], bool], timedelta]],
+]
+
+# Состояние пары (правило, устройство) общее для воркеров: устройство может
+# переподключиться к другому посреди нарушения. Хэш: since - начало нарушения,
+# ts - последний учтенный образец, firing - fired уже отправлен. Старые образцы
+# не учитываются. Возвращает {состояние, since} при переходе, иначе nil
+_TRANSITION = """
+local last = redis.call('HGET', KEYS[1], 'ts')
+if last and tonumber(last) >= tonumber(ARGV[4]) then
+    return false
+end
+if ARGV[2] == '0' then
+    local state = redis.call('HMGET', KEYS[1], 'since', 'firing')
+    redis.call('DEL', KEYS[1])
+    if state[2] then
+        return {'resolved', state[1]}
+    end
+    return false
+end
+local since = redis.call('HGET', KEYS[1], 'since') or ARGV[3]
+local firing = redis.call('HGET', KEYS[1], 'firing')
+redis.call('HSET', KEYS[1], 'since', since, 'ts', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if firing or tonumber(ARGV[4]) - tonumber(since) < tonumber(ARGV[5]) then
+    return false
+end
+redis.call('HSET', KEYS[1], 'firing', 1)
+return {'fired', since}
+"""
+
+
+def _utc(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+class AlertEngine:
+    """Проверяет пороговые правила на каждом принятом образце. Правила лежат
+    в индексе по устройству/владельцу и метрике, поэтому образец стоит O(правил метрики).
+    Исходы копятся сериями и раз в flush_interval сверяются с состоянием пары
+    (правило, устройство) в Redis. События fired/resolved уходят в очередь брокера"""
+
+    def __init__(
+        self,
+        repository: AlertRulesRepository,
+        session_factory: async_sessionmaker[AsyncSession],
+        cache_storage: RedisStorage,
+        publisher: RabbitPublisher,
+        refresh_interval: float = 60.0,
+        publish_queue_size: int = 10000,
+        flush_interval: float = 1.0,
+        state_ttl: int = 7 * 24 * 60 * 60,
+    ):
+        self.repository = repository
+        self.session_factory = session_factory
+        self.cache_storage = cache_storage
+        self.publisher = publisher
+        self.refresh_interval = refresh_interval
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+
+        self._by_device: dict[int, _MetricRules] = {}
+        self._by_owner: dict[int, _MetricRules] = {}  # правила без device_id
+        self._script = cache_storage.register_script(_TRANSITION)
+        # (правило, устройство) -> правило, duration (сек) и серии образцов
+        # с одинаковым исходом: [нарушение, ts первого, ts последнего, значение]
+        self._pending: dict[
+            tuple[int, int], tuple[AlertRuleResponse, float, list[list]]
+        ] = {}
+        self._flush_lock = asyncio.Lock()
+
+        self._outbox: asyncio.Queue[AlertEvent] = asyncio.Queue(
+            maxsize=publish_queue_size
+        )
+        self._reload = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        await self.load()
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._publish_loop()),
+            asyncio.create_task(self._reload_loop()),
+            asyncio.create_task(self._listen()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # события, которые не успели уйти, дописываем
+        await self.flush()
+        while not self._outbox.empty():
+            await self._publish(self._outbox.get_nowait())
+
+    async def load(self) -> None:
+        async with self.session_factory() as session:
+            rules = await self.repository.get_enabled(session=session)
+
+        by_device: dict[int, _MetricRules] = {}
+        by_owner: dict[int, _MetricRules] = {}
+        for rule in rules:
+            if rule.device_id is not None:
+                index = by_device.setdefault(rule.device_id, {})
+            else:
+                index = by_owner.setdefault(rule.owner_id, {})
+            section, field = rule.metric.split(".", 1)
+            index.setdefault((section, field), []).append(
+                (
+                    rule,
+                    ALERT_OPERATORS[rule.operator],
+                    timedelta(seconds=rule.duration_sec),
+                )
+            )
+        # состояние удаленных и выключенных правил истечет в Redis само
+        self._by_device, self._by_owner = by_device, by_owner
+
+    async def rules_changed(self) -> None:
+        """Правила изменились: перечитать их на всех воркерах"""
+        await self.cache_storage.publish(channel=RULES_CHANGED_CHANNEL, message={})
+        self._reload.set()
+
+    def evaluate(self, device: DeviceIdentity, telemetry: TelemetryUpload) -> None:
+        ts = telemetry.ts
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+
+        for index in (
+            self._by_device.get(device.id),
+            self._by_owner.get(device.owner_id),
+        ):
+            if not index:
+                continue
+
+            for (section, field), rules in index.items():
+                value = getattr(telemetry, section).get(field)
+                if value is None:
+                    # нет данных - не нарушение и не восстановление
+                    continue
+
+                for rule, compare, duration in rules:
+                    self._check(
+                        rule=rule,
+                        breached=compare(value, rule.threshold),
+                        duration=duration,
+                        device_id=device.id,
+                        value=value,
+                        ts=ts,
+                    )
+
+    def _check(
+        self,
+        rule: AlertRuleResponse,
+        breached: bool,
+        duration: timedelta,
+        device_id: int,
+        value: float,
+        ts: datetime,
+    ) -> None:
+        t = ts.timestamp()
+        _, _, runs = self._pending.setdefault(
+            (rule.id, device_id), (rule, duration.total_seconds(), [])
+        )
+        if runs and runs[-1][0] == breached:
+            # в серии нарушений важны ее начало и последний образец,
+            # восстановление случается на первом
+            if breached:
+                runs[-1][2:] = [t, value]
+            return
+        runs.append([breached, t, t, value])
+
+    @staticmethod
+    def _state_key(rule_id: int, device_id: int) -> str:
+        return f"alerts:state:{rule_id}:{device_id}"
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            calls, steps = [], []
+            for (rule_id, device_id), (rule, duration, runs) in pending.items():
+                for breached, first, last, value in runs:
+                    calls.append(
+                        (
+                            [self._state_key(rule_id, device_id)],
+                            [self.state_ttl, int(breached), first, last, duration],
+                        )
+                    )
+                    steps.append((rule, device_id, value, last))
+
+            try:
+                results = await self.cache_storage.run_script_many(
+                    script=self._script, calls=calls
+                )
+            except Exception as e:
+                logger.warning(f"Alert state flush failed ({len(pending)} pairs): {e}")
+                # серии, пришедшие во время неудачной записи, идут после старых
+                for key, (rule, duration, runs) in pending.items():
+                    newer = self._pending.get(key)
+                    self._pending[key] = (
+                        rule,
+                        duration,
+                        runs + (newer[2] if newer else []),
+                    )
+                return
+
+            for (rule, device_id, value, ts), result in zip(steps, results):
+                if result:
+                    state, since = result
+                    self._emit(
+                        AlertState(state),
+                        rule,
+                        device_id,
+                        value,
+                        _utc(float(since)),
+                        _utc(ts),
+                    )
+
+    def _emit(
+        self,
+        state: AlertState,
+        rule: AlertRuleResponse,
+        device_id: int,
+        value: float,
+        since: datetime,
+        ts: datetime,
+    ) -> None:
+        event = AlertEvent(
+            state=state,
+            rule_id=rule.id,
+            owner_id=rule.owner_id,
+            device_id=device_id,
+            rule_name=rule.name,
+            expression=rule.expression,
+            metric=rule.metric,
+            value=value,
+            since=since,
+            ts=ts,
+            notify_email=rule.notify_email,
+            webhook_url=rule.webhook_url,
+        )
+        # прием телеметрии не ждет брокер
+        if self._outbox.full():
+            dropped = self._outbox.get_nowait()
+            logger.warning(
+                f"Alert outbox is full, dropped {dropped.state} of rule {dropped.rule_id}"
+            )
+        self._outbox.put_nowait(event)
+
+    async def _publish(self, event: AlertEvent) -> None:
+        try:
+            await self.publisher.publish(message=event.model_dump(mode="json"))
+        except Exception as e:
+            logger.error(f"Alert publish failed: {e}")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _publish_loop(self) -> None:
+        while True:
+            await self._publish(await self._outbox.get())
+
+    async def _reload_loop(self) -> None:
+        # кроме уведомлений, раз в refresh_interval - на случай потерянного сообщения
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._reload.wait(), timeout=self.refresh_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._reload.clear()
+
+            try:
+                await self.load()
+            except Exception as e:
+                logger.warning(f"Alert rules reload failed: {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = await self.cache_storage.subscribe(RULES_CHANGED_CHANNEL)
+                async for _ in pubsub.listen():
+                    self._reload.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Alert rules listener failed: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
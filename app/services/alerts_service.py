@@ -0,0 +1,113 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import (
+    ObjectNotFoundException,
+    AlertRuleNotFoundException,
+    DeviceNotFoundException,
+    NotAuthorizedException,
+)
+from app.repositories.alert_rules_repository import AlertRulesRepository
+from app.repositories.devices_repository import DevicesRepository
+from app.schemas.alert import (
+    AlertRuleCreate,
+    AlertRuleDB,
+    AlertRuleDBUpdate,
+    AlertRuleResponse,
+    AlertRuleUpdate,
+)
+from app.services.alert_engine import AlertEngine
+
+
+class AlertsService:
+    def __init__(
+        self,
+        repository: AlertRulesRepository,
+        devices_repository: DevicesRepository,
+        engine: AlertEngine,
+    ):
+        self.repository = repository
+        self.devices = devices_repository
+        self.engine = engine
+
+    async def _get_owned(
+        self, user_id: int, rule_id: int, session: AsyncSession
+    ) -> AlertRuleResponse:
+        try:
+            rule = await self.repository.get_one(session=session, id=rule_id)
+        except ObjectNotFoundException:
+            raise AlertRuleNotFoundException
+
+        if rule.owner_id != user_id:
+            raise NotAuthorizedException
+        return rule
+
+    async def get_rules(
+        self, user_id: int, session: AsyncSession
+    ) -> list[AlertRuleResponse]:
+        return await self.repository.get_all(session=session, owner_id=user_id)
+
+    async def get_rule(
+        self, user_id: int, rule_id: int, session: AsyncSession
+    ) -> AlertRuleResponse:
+        return await self._get_owned(user_id=user_id, rule_id=rule_id, session=session)
+
+    async def add_rule(
+        self, user_id: int, rule_create: AlertRuleCreate, session: AsyncSession
+    ) -> AlertRuleResponse:
+        if rule_create.device_id is not None:
+            try:
+                device = await self.devices.get_one(
+                    session=session, id=rule_create.device_id
+                )
+            except ObjectNotFoundException:
+                raise DeviceNotFoundException
+
+            if device.owner_id != user_id:
+                raise NotAuthorizedException
+
+        rule = AlertRuleDB(
+            owner_id=user_id,
+            device_id=rule_create.device_id,
+            name=rule_create.name,
+            metric=rule_create.metric,
+            operator=rule_create.operator.value,
+            threshold=rule_create.threshold,
+            duration_sec=int(rule_create.duration.total_seconds()),
+            enabled=rule_create.enabled,
+            notify_email=rule_create.notify_email,
+            webhook_url=rule_create.webhook_url and str(rule_create.webhook_url),
+        )
+        result = await self.repository.add(session=session, schema=rule)
+        await self.engine.rules_changed()
+        return AlertRuleResponse.model_validate(result)
+
+    async def update_rule(
+        self,
+        user_id: int,
+        rule_id: int,
+        rule_update: AlertRuleUpdate,
+        session: AsyncSession,
+    ) -> AlertRuleResponse:
+        await self._get_owned(user_id=user_id, rule_id=rule_id, session=session)
+
+        values = AlertRuleDBUpdate(
+            name=rule_update.name,
+            operator=rule_update.operator.value if rule_update.operator else None,
+            threshold=rule_update.threshold,
+            duration_sec=(
+                int(rule_update.duration.total_seconds())
+                if rule_update.duration is not None
+                else None
+            ),
+            enabled=rule_update.enabled,
+            notify_email=rule_update.notify_email,
+            webhook_url=rule_update.webhook_url and str(rule_update.webhook_url),
+        )
+        await self.repository.update(session=session, schema=values, id=rule_id)
+        await self.engine.rules_changed()
+        return await self.repository.get_one(session=session, id=rule_id)
+
+    async def delete_rule(self, user_id: int, rule_id: int, session: AsyncSession):
+        await self._get_owned(user_id=user_id, rule_id=rule_id, session=session)
+        await self.repository.delete(session=session, id=rule_id)
+        await self.engine.rules_changed()
@@ -0,0 +1,362 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from app.core.redis_manager import RedisStorage
+from app.schemas.telemetry import TelemetryDerived, TelemetryUpload
+
+logger = logging.getLogger(__name__)
+
+# Метрики со сглаживанием, трендом и счетчики, из которых считается скорость
+EWMA_METRICS: tuple[str, ...] = ("cpu.pct", "memory.pct")
+TREND_METRICS: tuple[str, ...] = ("memory.pct", "disk.used_pct")
+COUNTER_METRICS: tuple[str, ...] = (
+    "network.bytes_sent_total",
+    "network.bytes_recv_total",
+)
+
+# Сохраняем состояние, только если оно новее записанного: другой воркер мог
+# принять более свежие образцы устройства и уже сохранить их
+_SET_IF_NEWER = """
+local current = redis.call('HGET', KEYS[1], 'ts')
+if current and tonumber(current) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'ts', ARGV[2], 'state', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def _metric(telemetry: TelemetryUpload, metric: str) -> float | None:
+    section, field = metric.split(".", 1)
+    value = getattr(telemetry, section).get(field)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+class _Trend:
+    """Онлайн линейная регрессия по скользящему окну. Окно разбито на корзины
+    с суммами n, Σx, Σy, Σx², Σxy, x - секунды от начала корзины, так что память
+    постоянна, а окно сдвигается целыми корзинами"""
+
+    def __init__(self, buckets: list[list[float]] | None = None):
+        self.buckets = buckets or []  # [начало, n, Σx, Σy, Σx², Σxy]
+
+    def add(self, t: float, y: float, window: float, bucket: float) -> None:
+        if not self.buckets or t - self.buckets[-1][0] >= bucket:
+            self.buckets.append([t, 0.0, 0.0, 0.0, 0.0, 0.0])
+        while self.buckets[0][0] <= t - window:
+            self.buckets.pop(0)
+
+        current = self.buckets[-1]
+        x = t - current[0]
+        current[1] += 1
+        current[2] += x
+        current[3] += y
+        current[4] += x * x
+        current[5] += x * y
+
+    def fit(self, t: float, min_span: float) -> tuple[float, float] | None:
+        """(наклон в секунду, значение прямой в момент t) или None, если данных мало"""
+        if not self.buckets or t - self.buckets[0][0] < min_span:
+            return None
+
+        # суммы корзин переносим к началу последней: сдвиг x на c
+        ref = self.buckets[-1][0]
+        n = sx = sy = sxx = sxy = 0.0
+        for start, bn, bx, by, bxx, bxy in self.buckets:
+            c = start - ref
+            n += bn
+            sx += bx + bn * c
+            sy += by
+            sxx += bxx + 2 * c * bx + bn * c * c
+            sxy += bxy + c * by
+
+        denominator = n * sxx - sx * sx
+        if n < 2 or denominator <= 0:
+            return None
+        slope = (n * sxy - sx * sy) / denominator
+        intercept = (sy - slope * sx) / n
+        return slope, intercept + slope * (t - ref)
+
+
+class DeviceDerived:
+    """Состояние производных метрик одного устройства, размер не зависит от истории"""
+
+    def __init__(
+        self,
+        ts: float = 0.0,
+        ewma: dict[str, float] | None = None,
+        trends: dict[str, _Trend] | None = None,
+        counters: dict[str, list[float]] | None = None,
+    ):
+        self.ts = ts
+        self.ewma = ewma or {}
+        self.trends = trends or {}
+        # -> [последнее значение, его время, скорость в секунду]
+        self.counters = counters or {}
+
+    def update(
+        self,
+        telemetry: TelemetryUpload,
+        half_life: float,
+        window: float,
+        buckets: int,
+    ) -> bool:
+        ts = telemetry.ts
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        t = ts.timestamp()
+        if t <= self.ts:
+            # история старше состояния: порядок образцов важен для всех метрик
+            return False
+        dt = t - self.ts if self.ts else None
+
+        for metric in EWMA_METRICS:
+            value = _metric(telemetry, metric)
+            if value is None:
+                continue
+            previous = self.ewma.get(metric)
+            if previous is None or dt is None:
+                self.ewma[metric] = value
+            else:
+                # вес по времени: неравномерные интервалы не смещают среднее
+                alpha = 1 - 2 ** (-dt / half_life)
+                self.ewma[metric] = previous + alpha * (value - previous)
+
+        for metric in TREND_METRICS:
+            value = _metric(telemetry, metric)
+            if value is not None:
+                self.trends.setdefault(metric, _Trend()).add(
+                    t=t, y=value, window=window, bucket=window / buckets
+                )
+
+        for metric in COUNTER_METRICS:
+            value = _metric(telemetry, metric)
+            if value is None:
+                continue
+            rate = None
+            counter = self.counters.get(metric)
+            if counter is not None:
+                # счетчик уменьшился - агент перезапустился и считает с нуля
+                delta = value - counter[0] if value >= counter[0] else value
+                rate = delta / (t - counter[1])
+            self.counters[metric] = [value, t, rate]
+
+        self.ts = t
+        return True
+
+    def values(self, window: float, buckets: int) -> TelemetryDerived:
+        hour = 60 * 60
+        # тренд по части корзины слишком шумный
+        min_span = window / buckets
+        memory = self.trends.get("memory.pct")
+        memory = memory and memory.fit(t=self.ts, min_span=min_span)
+        disk = self.trends.get("disk.used_pct")
+        disk = disk and disk.fit(t=self.ts, min_span=min_span)
+
+        full_in = None
+        if disk and disk[0] > 0:
+            full_in = max(0.0, (100 - disk[1]) / disk[0] / hour)
+
+        return TelemetryDerived(
+            ts=datetime.fromtimestamp(self.ts, tz=timezone.utc),
+            cpu_pct_ewma=self.ewma.get("cpu.pct"),
+            memory_pct_ewma=self.ewma.get("memory.pct"),
+            memory_pct_per_hour=memory[0] * hour if memory else None,
+            disk_used_pct_per_hour=disk[0] * hour if disk else None,
+            disk_full_in_hours=full_in,
+            net_sent_bytes_per_sec=self._rate("network.bytes_sent_total"),
+            net_recv_bytes_per_sec=self._rate("network.bytes_recv_total"),
+        )
+
+    def _rate(self, metric: str) -> float | None:
+        counter = self.counters.get(metric)
+        return counter[2] if counter else None
+
+    def dumps(self) -> str:
+        return json.dumps(
+            {
+                "ewma": self.ewma,
+                "trends": {
+                    metric: trend.buckets for metric, trend in self.trends.items()
+                },
+                "counters": self.counters,
+            }
+        )
+
+    @classmethod
+    def loads(cls, ts: str, state: str) -> "DeviceDerived":
+        data = json.loads(state)
+        return cls(
+            ts=float(ts),
+            ewma=data["ewma"],
+            trends={
+                metric: _Trend(buckets) for metric, buckets in data["trends"].items()
+            },
+            counters=data["counters"],
+        )
+
+
+class DerivedMetrics:
+    """Производные метрики телеметрии: EWMA, тренды регрессией по окну и скорости
+    счетчиков. Считаются по каждому принятому образцу из состояния постоянного
+    размера, поэтому для ответа не нужна история. Состояние живет на воркере,
+    принимающем устройство, и раз в flush_interval сохраняется в Redis - оттуда
+    его читают остальные воркеры и восстанавливают после перезапуска"""
+
+    def __init__(
+        self,
+        cache_storage: RedisStorage,
+        half_life: float = 300.0,
+        window: float = 6 * 60 * 60,
+        buckets: int = 12,
+        flush_interval: float = 30.0,
+        max_size: int = 10000,
+        ttl: int = 7 * 24 * 60 * 60,
+    ):
+        self.cache_storage = cache_storage
+        self.half_life = half_life
+        self.window = window
+        self.buckets = buckets
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._script = cache_storage.register_script(_SET_IF_NEWER)
+        self._states: OrderedDict[int, DeviceDerived] = OrderedDict()
+        self._dirty: dict[int, DeviceDerived] = {}
+        # устройство -> образцы, пришедшие, пока состояние читается из Redis
+        self._restoring: dict[int, list[TelemetryUpload]] = {}
+        self._restores: set[asyncio.Task] = set()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _redis_key(device_id: int) -> str:
+        return f"telemetry:derived:{device_id}"
+
+    def update(self, telemetry: TelemetryUpload) -> None:
+        device_id = telemetry.device_id
+        state = self._states.get(device_id)
+        if state is None:
+            # первый образец устройства на воркере: сначала продолжаем сохраненное
+            waiting = self._restoring.get(device_id)
+            if waiting is None:
+                self._restoring[device_id] = [telemetry]
+                task = asyncio.create_task(self._restore(device_id))
+                self._restores.add(task)
+                task.add_done_callback(self._restores.discard)
+            else:
+                waiting.append(telemetry)
+            return
+
+        self._apply(device_id=device_id, state=state, telemetry=telemetry)
+
+    def _apply(
+        self, device_id: int, state: DeviceDerived, telemetry: TelemetryUpload
+    ) -> None:
+        if state.update(
+            telemetry=telemetry,
+            half_life=self.half_life,
+            window=self.window,
+            buckets=self.buckets,
+        ):
+            self._dirty[device_id] = state
+        self._states.move_to_end(device_id)
+
+    async def _restore(self, device_id: int) -> None:
+        # вытесненное, но еще не сохраненное состояние новее того, что в Redis
+        state = self._dirty.get(device_id)
+        if state is None:
+            try:
+                (data,) = await self.cache_storage.hgetall_many(
+                    [self._redis_key(device_id)]
+                )
+                state = DeviceDerived.loads(**data) if data else DeviceDerived()
+            except Exception as e:
+                logger.warning(f"Derived metrics restore of {device_id} failed: {e}")
+                state = DeviceDerived()
+
+        self._states[device_id] = state
+        for telemetry in sorted(
+            self._restoring.pop(device_id, []), key=lambda sample: sample.ts
+        ):
+            self._apply(device_id=device_id, state=state, telemetry=telemetry)
+
+        # вытесненные состояния остаются в _dirty до ближайшего сохранения
+        while len(self._states) > self.max_size:
+            self._states.popitem(last=False)
+
+    async def get_many(self, device_ids: list[int]) -> dict[int, TelemetryDerived]:
+        try:
+            hashes = await self.cache_storage.hgetall_many(
+                [self._redis_key(device_id) for device_id in device_ids]
+            )
+        except Exception as e:
+            logger.warning(f"Derived metrics read failed: {e}")
+            hashes = [{}] * len(device_ids)
+
+        result: dict[int, TelemetryDerived] = {}
+        for device_id, data in zip(device_ids, hashes):
+            # устройство могло переехать на другой воркер: берем более новое
+            state = self._states.get(device_id)
+            if data and (state is None or float(data["ts"]) > state.ts):
+                state = DeviceDerived.loads(**data)
+            if state is not None and state.ts:
+                result[device_id] = state.values(
+                    window=self.window, buckets=self.buckets
+                )
+        return result
+
+    async def forget(self, device_id: int) -> None:
+        self._states.pop(device_id, None)
+        self._dirty.pop(device_id, None)
+        await self.cache_storage.delete(key=self._redis_key(device_id))
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._restores:
+            await asyncio.gather(*self._restores, return_exceptions=True)
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+
+            try:
+                await self.cache_storage.run_script_many(
+                    script=self._script,
+                    calls=[
+                        (
+                            [self._redis_key(device_id)],
+                            [self.ttl, repr(state.ts), state.dumps()],
+                        )
+                        for device_id, state in dirty.items()
+                    ],
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Derived metrics flush failed ({len(dirty)} devices): {e}"
+                )
+                for device_id, state in dirty.items():
+                    self._dirty.setdefault(device_id, state)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
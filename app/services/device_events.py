@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.core.redis_manager import RedisStorage
+from app.schemas.device import DeviceIdentity
+
+logger = logging.getLogger(__name__)
+
+CLAIMED_CHANNEL = "devices:claimed"
+
+
+class DeviceEvents:
+    """Будит сокеты, ожидающие привязки устройства, через Redis pub/sub (между воркерами)"""
+
+    def __init__(self, cache_storage: RedisStorage):
+        self.cache_storage = cache_storage
+
+        self._waiters: dict[str, set[asyncio.Future]] = {}
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish_claimed(self, token: str, device: DeviceIdentity) -> None:
+        await self.cache_storage.publish(
+            channel=CLAIMED_CHANNEL,
+            message={"token": token, "device": device.model_dump()},
+        )
+
+    @asynccontextmanager
+    async def wait_claimed(self, token: str) -> AsyncIterator[asyncio.Future]:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(token, set()).add(future)
+        try:
+            yield future
+        finally:
+            waiters = self._waiters.get(token)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[token]
+            future.cancel()
+
+    def _dispatch(self, data: dict) -> None:
+        waiters = self._waiters.get(data["token"])
+        if not waiters:
+            return
+
+        device = DeviceIdentity.model_validate(data["device"])
+        for future in waiters:
+            if not future.done():
+                future.set_result(device)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = await self.cache_storage.subscribe(CLAIMED_CHANNEL)
+                async for message in pubsub.listen():
+                    self._dispatch(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Device events listener failed: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
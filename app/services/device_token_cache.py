@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+
+from app.core.redis_manager import RedisStorage
+from app.schemas.device import DeviceIdentity
+
+
+class DeviceTokenCache:
+    """Двухуровневый кэш token -> устройство: локальный LRU с TTL перед Redis"""
+
+    def __init__(
+        self,
+        cache_storage: RedisStorage,
+        max_size: int = 10000,
+        local_ttl: int = 60,
+        ttl: int = 24 * 60 * 60,
+    ):
+        self.cache_storage = cache_storage
+        self.max_size = max_size
+        # другие воркеры про инвалидацию не узнают, поэтому локальный TTL короткий
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+
+        self._local: OrderedDict[str, tuple[float, DeviceIdentity]] = OrderedDict()
+
+    @staticmethod
+    def _redis_key(token: str) -> str:
+        return f"device_token:{token}"
+
+    def _remember(self, token: str, device: DeviceIdentity) -> None:
+        self._local[token] = (time.monotonic() + self.local_ttl, device)
+        self._local.move_to_end(token)
+
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    async def get(self, token: str) -> DeviceIdentity | None:
+        entry = self._local.get(token)
+        if entry:
+            expires_at, device = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(token)
+                return device
+            del self._local[token]
+
+        data = await self.cache_storage.get(key=self._redis_key(token))
+        if not data:
+            return None
+
+        device = DeviceIdentity.model_validate(data)
+        self._remember(token=token, device=device)
+        return device
+
+    async def set(self, token: str, device: DeviceIdentity) -> None:
+        self._remember(token=token, device=device)
+        await self.cache_storage.set(
+            key=self._redis_key(token),
+            value=device.model_dump(),
+            expire=self.ttl,
+        )
+
+    async def invalidate(self, token: str) -> None:
+        self._local.pop(token, None)
+        await self.cache_storage.delete(key=self._redis_key(token))
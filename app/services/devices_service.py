@@ -1,3 +1,7 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.exceptions import (
@@ -6,12 +10,34 @@ from app.core.exceptions import (
     DeviceNotFoundException,
     ObjectAlreadyExistsException,
     DeviceAlreadyExistsException,
+    InvalidPeriodException,
     NotAuthorizedException,
 )
 from app.core.redis_manager import RedisStorage
 from app.core.security import generate_uuid
+from app.repositories.device_connectivity_repository import (
+    DeviceConnectivityRepository,
+)
 from app.repositories.devices_repository import DevicesRepository
-from app.schemas.device import DeviceCreate, DeviceDB, DeviceResponse
+from app.schemas.device import (
+    DeviceCreate,
+    DeviceDB,
+    DeviceResponse,
+    DeviceIdentity,
+    DeviceOutage,
+    DeviceRank,
+    DevicesOverview,
+    DeviceUptime,
+)
+from app.services.device_events import DeviceEvents
+from app.services.device_token_cache import DeviceTokenCache
+from app.services.derived_metrics import DerivedMetrics
+from app.services.latest_telemetry import LatestTelemetry
+from app.services.presence_tracker import PresenceTracker
+
+logger = logging.getLogger(__name__)
+
+UPTIME_DEFAULT_RANGE = timedelta(days=30)  # период доступности, если from не указан
 
 
 class DevicesService:
@@ -19,9 +45,21 @@ class DevicesService:
         self,
         repository: DevicesRepository,
         cache_storage: RedisStorage,
+        token_cache: DeviceTokenCache,
+        device_events: DeviceEvents,
+        latest: LatestTelemetry,
+        derived: DerivedMetrics,
+        presence: PresenceTracker,
+        connectivity_repository: DeviceConnectivityRepository,
     ):
         self.cache_storage = cache_storage
         self.repository = repository
+        self.token_cache = token_cache
+        self.device_events = device_events
+        self.latest = latest
+        self.derived = derived
+        self.presence = presence
+        self.connectivity = connectivity_repository
 
     async def get_token(self, device_create: DeviceCreate):
         token = generate_uuid()
@@ -30,16 +68,165 @@ class DevicesService:
 
     async def get_device(self, user_id: int, device_id: int, session: AsyncSession):
         try:
-            return await self.repository.get_owned(
+            device = await self.repository.get_owned(
                 user_id=user_id, id=device_id, session=session
             )
         except ObjectNotFoundException:
             raise DeviceNotFoundException
 
+        if device:
+            await self._with_latest([device])
+        return device
+
     async def get_devices(
         self, user_id: int, session: AsyncSession
     ) -> list[DeviceResponse]:
-        return await self.repository.get_filtered(owner_id=user_id, session=session)
+        devices = await self.repository.get_filtered(owner_id=user_id, session=session)
+        return await self._with_latest(devices)
+
+    async def get_overview(
+        self, user_id: int, top: int, session: AsyncSession
+    ) -> DevicesOverview:
+        # online и метрики парка - из индекса в Redis, который ведут прием телеметрии
+        # и переходы присутствия: status в бд отстает на интервал записи
+        total = await self.repository.count(session=session, owner_id=user_id)
+        online, averages, leaders = await self.latest.get_fleet(
+            owner_id=user_id, top=top
+        )
+
+        ids = {device_id for rank in leaders.values() for device_id, _ in rank}
+        names = await self.repository.get_names(session=session, ids=list(ids))
+
+        return DevicesOverview(
+            total=total,
+            online=online,
+            offline=max(total - online, 0),
+            averages=averages,
+            top={
+                metric: [
+                    DeviceRank(id=device_id, name=names[device_id], value=value)
+                    for device_id, value in rank
+                    if device_id in names
+                ]
+                for metric, rank in leaders.items()
+            },
+        )
+
+    async def _with_latest(self, devices: list[DeviceResponse]) -> list[DeviceResponse]:
+        # текущие метрики берем из кэша последних образцов, таблицу телеметрии не читаем
+        device_ids = [device.id for device in devices]
+        latest, derived, online = await asyncio.gather(
+            self.latest.get_many(device_ids),
+            self.derived.get_many(device_ids),
+            self._online(device_ids),
+        )
+        for device in devices:
+            device.latest = latest.get(device.id)
+            device.derived = derived.get(device.id)
+            if online is None:
+                continue
+            # status в бд отстает от Redis на интервал записи
+            last_seen = online.get(device.id)
+            device.status = "online" if last_seen else "offline"
+            if last_seen and (
+                device.last_seen_at is None or last_seen > device.last_seen_at
+            ):
+                device.last_seen_at = last_seen
+        return devices
+
+    async def get_uptime(
+        self,
+        user_id: int,
+        device_id: int,
+        session: AsyncSession,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> DeviceUptime:
+        now = datetime.now(timezone.utc)
+        end = end or now
+        start = start or end - UPTIME_DEFAULT_RANGE
+        # без пояса время считаем UTC, как и в телеметрии
+        start, end = (
+            ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc) for ts in (start, end)
+        )
+        if start >= end:
+            raise InvalidPeriodException
+
+        try:
+            device = await self.repository.get_one(session=session, id=device_id)
+        except ObjectNotFoundException:
+            raise DeviceNotFoundException
+
+        if device.owner_id != user_id:
+            raise NotAuthorizedException
+
+        # закрытые сессии из бд плюс открытая из Redis - считаные строки на период
+        intervals = [
+            (interval.online_from, interval.online_to)
+            for interval in await self.connectivity.get_intervals(
+                session=session, device_id=device_id, start=start, end=end
+            )
+        ]
+        since = await self.presence.get_since(device_id=device_id)
+        if since is not None:
+            intervals.append((since, now))
+
+        # до привязки устройства и после текущего момента простоя не было
+        observed_start, observed_end = max(start, device.created_at), min(end, now)
+        online_sec, outages = self._availability(
+            intervals=intervals, start=observed_start, end=observed_end
+        )
+        observed_sec = (observed_end - observed_start).total_seconds()
+        return DeviceUptime(
+            device_id=device_id,
+            start=start,
+            end=end,
+            online_sec=online_sec,
+            availability=online_sec / observed_sec if observed_sec > 0 else 0.0,
+            online=since is not None,
+            outages=outages,
+        )
+
+    @staticmethod
+    def _availability(
+        intervals: list[tuple[datetime, datetime]], start: datetime, end: datetime
+    ) -> tuple[float, list[DeviceOutage]]:
+        """Время online в [start, end) и промежутки между сессиями"""
+        online_sec = 0.0
+        outages: list[DeviceOutage] = []
+        cursor = start
+        for online_from, online_to in sorted(intervals):
+            online_from, online_to = max(online_from, cursor), min(online_to, end)
+            if online_to <= online_from:
+                continue
+            if online_from > cursor:
+                outages.append(
+                    DeviceOutage(
+                        start=cursor,
+                        end=online_from,
+                        duration_sec=(online_from - cursor).total_seconds(),
+                    )
+                )
+            online_sec += (online_to - online_from).total_seconds()
+            cursor = online_to
+
+        if cursor < end:
+            outages.append(
+                DeviceOutage(
+                    start=cursor,
+                    end=end,
+                    duration_sec=(end - cursor).total_seconds(),
+                )
+            )
+        return online_sec, outages
+
+    async def _online(self, device_ids: list[int]) -> dict[int, datetime] | None:
+        try:
+            return await self.presence.get_many(device_ids)
+        except Exception as e:
+            # без Redis отдаем status и last_seen_at из бд
+            logger.warning(f"Presence read failed: {e}")
+            return None
 
     async def add_device(self, user_id: int, token: str, session: AsyncSession):
 
@@ -62,6 +249,10 @@ class DevicesService:
             raise DeviceAlreadyExistsException
 
         await self.cache_storage.delete(key=token)
+
+        identity = DeviceIdentity.model_validate(result)
+        await self.token_cache.set(token=token, device=identity)
+        await self.device_events.publish_claimed(token=token, device=identity)
         return [DeviceResponse.model_validate(result)]
 
     async def delete_device(self, user_id: int, device_id: int, session: AsyncSession):
@@ -75,3 +266,7 @@ class DevicesService:
             raise NotAuthorizedException
 
         await self.repository.delete(session=session, id=device_id)
+        await self.token_cache.invalidate(token=device.token)
+        await self.latest.forget(owner_id=device.owner_id, device_id=device_id)
+        await self.derived.forget(device_id=device_id)
+        await self.presence.forget(device_id=device_id)
@@ -0,0 +1,49 @@
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: индексы n точек ряда, сохраняющих его форму.
+    Первая и последняя точки остаются, из каждой корзины между ними берется точка,
+    образующая наибольший треугольник с выбранной слева и средним корзины справа"""
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+
+    # границы n - 2 корзин внутренних точек [1, size - 1)
+    edges = np.linspace(1, size - 1, n - 1).astype(np.intp)
+    # средние корзин считаем разом, в цикле остается только выбор точки
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n, dtype=np.intp)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        # удвоенная площадь треугольника (a, точка корзины, среднее следующей)
+        area = np.abs(
+            (x[a] - mean_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (mean_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(low: np.ndarray, high: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Min/max на пиксель: ряд делится на n // 2 групп, из каждой - индекс минимума
+    low и индекс максимума high. Пики и провалы не усредняются"""
+    size = len(low)
+    groups = n // 2
+    if groups >= size or groups < 1:
+        return np.arange(size), np.arange(size)
+
+    group = np.arange(size) * groups // size
+    starts = np.searchsorted(group, np.arange(groups))
+    # внутри группы сортируем по значению, первый элемент группы - экстремум
+    lowest = np.lexsort((low, group))[starts]
+    highest = np.lexsort((-high, group))[starts]
+    return lowest, highest
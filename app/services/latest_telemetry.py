@@ -0,0 +1,295 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from app.core.redis_manager import RedisStorage
+from app.models.telemetry import TELEMETRY_SECTIONS
+from app.schemas.telemetry import TelemetryLatest, TelemetryUpload
+
+logger = logging.getLogger(__name__)
+
+# Метрики, по которым ведется индекс парка: sorted set "значение -> устройство"
+# на владельца, обновляется вместе с последним образцом
+FLEET_METRICS: tuple[str, ...] = (
+    "cpu.pct",
+    "memory.pct",
+    "disk.used_pct",
+    "cpu.temperature_c",
+)
+
+LATEST_KEY = "telemetry:latest"
+FLEET_KEY = "fleet"
+
+# Индекс парка ведется инкрементально: на владельца - множество устройств на связи,
+# sorted set на метрику и суммы/счетчики для средних. В индексе только устройства
+# на связи: presence добавляет устройство с последним образцом при переходе
+# в online и убирает при переходе в offline
+FLEET_SCRIPT = (
+    "local FLEET_METRICS = {"
+    + ", ".join(f"'{metric}'" for metric in FLEET_METRICS)
+    + "}"
+    + """
+local function fleet_set(prefix, device, metric, value)
+    local index = prefix .. ':' .. metric
+    local totals = prefix .. ':totals'
+    local old = redis.call('ZSCORE', index, device)
+    if old then
+        redis.call('ZREM', index, device)
+        if redis.call('HINCRBY', totals, metric .. ':count', -1) <= 0 then
+            -- пустая сумма обнуляется, ошибка округления не копится
+            redis.call('HDEL', totals, metric .. ':count', metric .. ':sum')
+        else
+            redis.call('HINCRBYFLOAT', totals, metric .. ':sum', -tonumber(old))
+        end
+    end
+    if value then
+        redis.call('ZADD', index, value, device)
+        redis.call('HINCRBY', totals, metric .. ':count', 1)
+        redis.call('HINCRBYFLOAT', totals, metric .. ':sum', value)
+    end
+end
+
+local function fleet_join(prefix, device, latest)
+    redis.call('SADD', prefix .. ':online', device)
+    for _, metric in ipairs(FLEET_METRICS) do
+        local value = redis.call('HGET', latest, metric)
+        fleet_set(prefix, device, metric, value and tonumber(value))
+    end
+end
+
+local function fleet_leave(prefix, device)
+    redis.call('SREM', prefix .. ':online', device)
+    for _, metric in ipairs(FLEET_METRICS) do
+        fleet_set(prefix, device, metric, nil)
+    end
+end
+"""
+)
+
+# Пишем образец, только если он новее сохраненного: история, догружаемая
+# через /bulk на другом воркере, не должна затирать текущее состояние
+_SET_IF_NEWER = (
+    FLEET_SCRIPT
+    + """
+local current = redis.call('HGET', KEYS[1], 'ts')
+if current and tonumber(current) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'ts', ARGV[2], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if redis.call('SISMEMBER', KEYS[2] .. ':online', ARGV[3]) == 1 then
+    fleet_join(KEYS[2], ARGV[3], KEYS[1])
+end
+return 1
+"""
+)
+
+_FORGET = (
+    FLEET_SCRIPT
+    + """
+redis.call('DEL', KEYS[1])
+fleet_leave(KEYS[2], ARGV[1])
+return 1
+"""
+)
+
+
+def latest_key(device_id: int) -> str:
+    return f"{LATEST_KEY}:{device_id}"
+
+
+def fleet_key(owner_id: int) -> str:
+    return f"{FLEET_KEY}:{owner_id}"
+
+
+def _timestamp(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class LatestTelemetry:
+    """Последний образец каждого устройства: Redis-хэш "секция.поле" -> значение
+    и локальное зеркало на воркере, плюс индекс парка владельца по FLEET_METRICS.
+    Запись в Redis схлопывается до одной на устройство за интервал"""
+
+    def __init__(
+        self,
+        cache_storage: RedisStorage,
+        flush_interval: float = 1.0,
+        local_ttl: float = 2.0,
+        max_size: int = 10000,
+        ttl: int = 7 * 24 * 60 * 60,
+    ):
+        self.cache_storage = cache_storage
+        self.flush_interval = flush_interval
+        # зеркало не знает о записях других воркеров, поэтому живет недолго
+        self.local_ttl = local_ttl
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._script = cache_storage.register_script(_SET_IF_NEWER)
+        self._forget_script = cache_storage.register_script(_FORGET)
+        self._local: OrderedDict[int, tuple[float, TelemetryLatest]] = OrderedDict()
+        # устройство -> (владелец, образец)
+        self._pending: dict[int, tuple[int, TelemetryLatest]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def _remember(self, device_id: int, sample: TelemetryLatest) -> None:
+        self._local[device_id] = (time.monotonic() + self.local_ttl, sample)
+        self._local.move_to_end(device_id)
+
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    def update(self, owner_id: int, telemetry: TelemetryUpload) -> None:
+        device_id = telemetry.device_id
+        known = self._pending.get(device_id, self._local.get(device_id, (0, None)))[1]
+        if known is not None and _timestamp(known.ts) >= _timestamp(telemetry.ts):
+            return
+
+        sample = TelemetryLatest.model_validate(telemetry, from_attributes=True)
+        self._pending[device_id] = (owner_id, sample)
+        self._remember(device_id=device_id, sample=sample)
+
+    async def get_many(self, device_ids: list[int]) -> dict[int, TelemetryLatest]:
+        now = time.monotonic()
+        result: dict[int, TelemetryLatest] = {}
+        missing = []
+        for device_id in device_ids:
+            entry = self._local.get(device_id)
+            if entry and entry[0] > now:
+                result[device_id] = entry[1]
+            else:
+                missing.append(device_id)
+
+        if not missing:
+            return result
+
+        try:
+            hashes = await self.cache_storage.hgetall_many(
+                [latest_key(device_id) for device_id in missing]
+            )
+        except Exception as e:
+            # текущие метрики - дополнение к ответу, без Redis просто не отдаем их
+            logger.warning(f"Latest telemetry read failed: {e}")
+            return result
+
+        for device_id, data in zip(missing, hashes):
+            if not data:
+                continue
+            sample = self._decode(data)
+            self._remember(device_id=device_id, sample=sample)
+            result[device_id] = sample
+        return result
+
+    async def get_fleet(
+        self, owner_id: int, top: int
+    ) -> tuple[int, dict[str, float | None], dict[str, list[tuple[int, float]]]]:
+        """Число устройств на связи, средние по ним и первые top устройств
+        по каждой метрике FLEET_METRICS. Стоит O(top), а не O(парка)"""
+        key = fleet_key(owner_id)
+        online, totals, leaders = await asyncio.gather(
+            self.cache_storage.scard(f"{key}:online"),
+            self.cache_storage.hgetall(f"{key}:totals"),
+            self.cache_storage.zrevrange_many(
+                [f"{key}:{metric}" for metric in FLEET_METRICS], count=top
+            ),
+        )
+
+        averages: dict[str, float | None] = {}
+        for metric in FLEET_METRICS:
+            count = int(totals.get(f"{metric}:count", 0))
+            averages[metric] = (
+                float(totals[f"{metric}:sum"]) / count if count > 0 else None
+            )
+        return (
+            online,
+            averages,
+            {
+                metric: [(int(device_id), value) for device_id, value in rank]
+                for metric, rank in zip(FLEET_METRICS, leaders)
+            },
+        )
+
+    async def forget(self, owner_id: int, device_id: int) -> None:
+        self._local.pop(device_id, None)
+        self._pending.pop(device_id, None)
+        await self.cache_storage.run_script_many(
+            script=self._forget_script,
+            calls=[
+                (
+                    [latest_key(device_id), fleet_key(owner_id)],
+                    [device_id],
+                )
+            ],
+        )
+
+    @staticmethod
+    def _encode(device_id: int, sample: TelemetryLatest) -> list:
+        args = [_timestamp(sample.ts), device_id]
+        for section in TELEMETRY_SECTIONS:
+            for field, value in getattr(sample, section).items():
+                args += [f"{section}.{field}", json.dumps(value)]
+        return args
+
+    @staticmethod
+    def _decode(data: dict[str, str]) -> TelemetryLatest:
+        sections: dict[str, dict] = {}
+        for name, value in data.items():
+            if name == "ts":
+                continue
+            section, _, field = name.partition(".")
+            sections.setdefault(section, {})[field] = json.loads(value)
+        return TelemetryLatest(
+            ts=datetime.fromtimestamp(float(data["ts"]), tz=timezone.utc), **sections
+        )
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            try:
+                await self.cache_storage.run_script_many(
+                    script=self._script,
+                    calls=[
+                        (
+                            [latest_key(device_id), fleet_key(owner_id)],
+                            [self.ttl, *self._encode(device_id, sample)],
+                        )
+                        for device_id, (owner_id, sample) in pending.items()
+                    ],
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Latest telemetry flush failed ({len(pending)} devices): {e}"
+                )
+                # образцы, пришедшие во время неудачной записи, новее - их не трогаем
+                for device_id, entry in pending.items():
+                    self._pending.setdefault(device_id, entry)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
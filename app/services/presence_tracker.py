@@ -0,0 +1,362 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.redis_manager import RedisStorage
+from app.repositories.device_connectivity_repository import (
+    DeviceConnectivityRepository,
+)
+from app.repositories.devices_repository import DevicesRepository
+from app.schemas.device import DeviceInterval
+from app.services.latest_telemetry import FLEET_KEY, FLEET_SCRIPT, latest_key
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_CHANNEL = "devices:presence"
+DEADLINES_KEY = "presence:deadlines"
+SINCE_KEY = "presence:since"  # устройство -> начало текущей сессии
+OWNERS_KEY = "presence:owners"  # устройство на связи -> владелец
+SWEEP_BATCH = 1000
+
+# Продлеваем пульс: ключ устройства живет ttl, срок в общем sorted set - для
+# уборщика. ZADD вернет 1, если устройства там не было - это переход в online,
+# тогда устройство с последним образцом попадает в индекс парка владельца
+_HEARTBEAT = (
+    FLEET_SCRIPT
+    + """
+redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[1])
+local added = redis.call('ZADD', KEYS[2], ARGV[2], ARGV[4])
+if added == 1 then
+    redis.call('HSET', KEYS[3], ARGV[4], ARGV[5])
+end
+if added == 1 or redis.call('HEXISTS', KEYS[4], ARGV[4]) == 0 then
+    redis.call('HSET', KEYS[4], ARGV[4], ARGV[6])
+    fleet_join(KEYS[5] .. ':' .. ARGV[6], ARGV[4], KEYS[6])
+end
+return added
+"""
+)
+
+# Закрываем сессию: начало отдает только тот, чей ZREM удалил срок
+_OFFLINE = (
+    FLEET_SCRIPT
+    + """
+redis.call('DEL', KEYS[3])
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 0 then
+    return false
+end
+local since = redis.call('HGET', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[1], ARGV[1])
+local owner = redis.call('HGET', KEYS[4], ARGV[1])
+if owner then
+    redis.call('HDEL', KEYS[4], ARGV[1])
+    fleet_leave(KEYS[5] .. ':' .. owner, ARGV[1])
+end
+return since or ''
+"""
+)
+
+
+class PresenceTracker:
+    """Присутствие устройств в Redis, общее для всех воркеров: каждый кадр продлевает
+    ключ с TTL, пульсы копятся в памяти и уходят пачкой раз в flush_interval.
+    Уборщик на каждом воркере снимает просроченные сроки через ZREM - переход
+    в offline отдает тот, чей ZREM удалил элемент, поэтому упавший воркер
+    или полуоткрытое соединение не оставляют устройство online.
+    last_seen_at и status в бд - копия, которая пишется пачкой на переходах,
+    там же по строке на каждую закрытую сессию связи"""
+
+    def __init__(
+        self,
+        repository: DevicesRepository,
+        connectivity_repository: DeviceConnectivityRepository,
+        session_factory: async_sessionmaker[AsyncSession],
+        cache_storage: RedisStorage,
+        flush_interval: float = 5.0,
+        ttl: int = 60,
+        max_pending_intervals: int = 10000,
+    ):
+        self.repository = repository
+        self.connectivity = connectivity_repository
+        self.session_factory = session_factory
+        self.cache_storage = cache_storage
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        # сколько незаписанных сессий держать, пока бд недоступна
+        self.max_pending_intervals = max_pending_intervals
+
+        self._script = cache_storage.register_script(_HEARTBEAT)
+        self._offline_script = cache_storage.register_script(_OFFLINE)
+        # еще не отправленные в Redis пульсы (владелец, время) и отключения
+        self._beats: dict[int, tuple[int, datetime]] = {}
+        self._gone: set[int] = set()
+        # еще не записанное в бд
+        self._last_seen: dict[int, datetime] = {}
+        self._status: dict[int, str] = {}
+        self._intervals: list[DeviceInterval] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _redis_key(device_id: int) -> str:
+        return f"presence:{device_id}"
+
+    def touch(self, device_id: int, owner_id: int, ts: datetime | None = None) -> None:
+        self._beats[device_id] = (owner_id, ts or datetime.now(timezone.utc))
+        self._gone.discard(device_id)
+
+    def disconnect(self, device_id: int) -> None:
+        # сокет закрылся штатно: не ждем истечения TTL
+        self._beats.pop(device_id, None)
+        self._gone.add(device_id)
+
+    async def get_many(self, device_ids: list[int]) -> dict[int, datetime]:
+        """last_seen устройств, которые сейчас online"""
+        if not device_ids:
+            return {}
+
+        values = await self.cache_storage.get_many(
+            [self._redis_key(device_id) for device_id in device_ids]
+        )
+        return {
+            device_id: datetime.fromisoformat(value)
+            for device_id, value in zip(device_ids, values)
+            if value
+        }
+
+    async def get_since(self, device_id: int) -> datetime | None:
+        """Начало открытой сессии связи или None, если устройство offline"""
+        since = await self.cache_storage.hget(key=SINCE_KEY, attr=str(device_id))
+        return datetime.fromtimestamp(float(since), tz=timezone.utc) if since else None
+
+    async def forget(self, device_id: int) -> None:
+        self._beats.pop(device_id, None)
+        self._gone.discard(device_id)
+        await self._close([device_id])
+
+    async def _close(self, device_ids: list[int]) -> list[datetime | None | bool]:
+        """Снимает сроки устройств: начало сессии, если закрыл ее этот вызов,
+        None - сессия закрыта без известного начала, False - ее уже закрыли"""
+        if not device_ids:
+            return []
+
+        results = await self.cache_storage.run_script_many(
+            script=self._offline_script,
+            calls=[
+                (
+                    [
+                        SINCE_KEY,
+                        DEADLINES_KEY,
+                        self._redis_key(device_id),
+                        OWNERS_KEY,
+                        FLEET_KEY,
+                    ],
+                    [device_id],
+                )
+                for device_id in device_ids
+            ],
+        )
+        closed: list[datetime | None | bool] = []
+        for since in results:
+            if since is None:
+                closed.append(False)
+            else:
+                closed.append(
+                    datetime.fromtimestamp(float(since), tz=timezone.utc)
+                    if since
+                    else None
+                )
+        return closed
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            try:
+                await self._heartbeat()
+                await self._sweep()
+            except Exception as e:
+                logger.error(f"Presence update in Redis failed: {e}")
+
+            await self._write()
+
+    async def _heartbeat(self) -> None:
+        beats, self._beats = self._beats, {}
+        gone, self._gone = list(self._gone), set()
+        if not beats and not gone:
+            return
+
+        try:
+            now = time.time()
+            added = await self.cache_storage.run_script_many(
+                script=self._script,
+                calls=[
+                    (
+                        [
+                            self._redis_key(device_id),
+                            DEADLINES_KEY,
+                            SINCE_KEY,
+                            OWNERS_KEY,
+                            FLEET_KEY,
+                            latest_key(device_id),
+                        ],
+                        [
+                            self.ttl,
+                            now + self.ttl,
+                            json.dumps(ts.isoformat()),
+                            device_id,
+                            now,
+                            owner_id,
+                        ],
+                    )
+                    for device_id, (owner_id, ts) in beats.items()
+                ],
+            )
+            closed = await self._close(gone)
+        except Exception:
+            # пульсы и отключения, пришедшие во время записи, новее - их не трогаем
+            for device_id, beat in beats.items():
+                if device_id not in self._gone:
+                    self._beats.setdefault(device_id, beat)
+            self._gone.update(set(gone) - self._beats.keys())
+            raise
+
+        self._last_seen.update((device_id, ts) for device_id, (_, ts) in beats.items())
+        end = datetime.fromtimestamp(now, tz=timezone.utc)
+        await self._transitions(
+            online=[device_id for device_id, new in zip(beats, added) if new],
+            offline=[
+                (device_id, since, end)
+                for device_id, since in zip(gone, closed)
+                if since is not False
+            ],
+        )
+
+    async def _sweep(self) -> None:
+        while True:
+            expired = await self.cache_storage.zrangebyscore(
+                key=DEADLINES_KEY, max=time.time(), count=SWEEP_BATCH
+            )
+            if not expired:
+                return
+
+            # просроченное видят все воркеры, переход отдает только закрывший
+            device_ids = [int(device_id) for device_id, _ in expired]
+            closed = await self._close(device_ids)
+            await self._transitions(
+                online=[],
+                offline=[
+                    # связь пропала после последнего пульса, а не по истечении TTL
+                    (
+                        device_id,
+                        since,
+                        datetime.fromtimestamp(deadline - self.ttl, tz=timezone.utc),
+                    )
+                    for device_id, (_, deadline), since in zip(
+                        device_ids, expired, closed
+                    )
+                    if since is not False
+                ],
+            )
+            if len(expired) < SWEEP_BATCH:
+                return
+
+    async def _transitions(
+        self,
+        online: list[int],
+        offline: list[tuple[int, datetime | None, datetime]],
+    ) -> None:
+        """offline - (устройство, начало сессии, конец сессии)"""
+        if not online and not offline:
+            return
+
+        for device_id in online:
+            self._status[device_id] = "online"
+        for device_id, since, end in offline:
+            self._status[device_id] = "offline"
+            if since is not None and since < end:
+                self._intervals.append(
+                    DeviceInterval(
+                        device_id=device_id, online_from=since, online_to=end
+                    )
+                )
+
+        ts = datetime.now(timezone.utc).isoformat()
+        await self.cache_storage.publish_many(
+            [
+                (PRESENCE_CHANNEL, {"device_id": device_id, "status": status, "ts": ts})
+                for status, devices in (
+                    ("online", online),
+                    ("offline", [device_id for device_id, _, _ in offline]),
+                )
+                for device_id in devices
+            ]
+        )
+
+    async def _write(self) -> None:
+        last_seen, self._last_seen = self._last_seen, {}
+        status, self._status = self._status, {}
+        intervals, self._intervals = self._intervals, []
+
+        if not last_seen and not status and not intervals:
+            return
+
+        # каждая запись коммитится сама, поэтому после ошибки возвращаем
+        # в очередь только то, что записать не удалось
+        try:
+            async with self.session_factory() as session:
+                await self.repository.patch_many(
+                    session=session, column_name="last_seen_at", data=last_seen
+                )
+                last_seen = {}
+                await self.repository.patch_many(
+                    session=session, column_name="status", data=status
+                )
+                status = {}
+                await self.connectivity.add_many(session=session, schemas=intervals)
+                intervals = []
+        except Exception as e:
+            logger.error(
+                f"Presence flush failed ({len(last_seen)} devices, "
+                f"{len(status)} statuses, {len(intervals)} sessions): {e}"
+            )
+            self._restore(last_seen=last_seen, status=status, intervals=intervals)
+
+    def _restore(
+        self,
+        last_seen: dict[int, datetime],
+        status: dict[int, str],
+        intervals: list[DeviceInterval],
+    ):
+        # значения, пришедшие во время неудачной записи, новее - их не трогаем
+        for device_id, ts in last_seen.items():
+            self._last_seen.setdefault(device_id, ts)
+        for device_id, value in status.items():
+            self._status.setdefault(device_id, value)
+        # закрытые сессии не повторяются, их возвращаем все, но не бесконечно
+        self._intervals[:0] = intervals
+        overflow = len(self._intervals) - self.max_pending_intervals
+        if overflow > 0:
+            logger.warning(f"Presence sessions overflow, dropped {overflow} oldest")
+            del self._intervals[:overflow]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,84 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable
+
+from app.core.exceptions import TelemetryDroppedException
+
+
+class AckWindow:
+    """Копит номера принятых кадров и отправляет агенту кумулятивные подтверждения окнами"""
+
+    def __init__(
+        self,
+        send: Callable[[dict], Awaitable[None]],
+        window: int = 32,
+        interval: float = 0.5,
+    ):
+        self.send = send
+        self.window = window
+        self.interval = interval
+
+        self._pending: deque[tuple[int, asyncio.Future | None]] = deque()
+        self._ready: int | None = None  # все кадры до этого номера можно подтвердить
+        self._unacked = 0  # сколько готовых кадров еще не подтверждено
+        self._nacks: list[dict] = []  # отказы, которые надо отправить до ack
+        self._wakeup = asyncio.Event()
+
+    def add(self, seq: int, done: asyncio.Future | None = None) -> None:
+        """done - future записи в бд, без него кадр готов к подтверждению сразу"""
+        self._pending.append((seq, done))
+        if done is not None and not done.done():
+            done.add_done_callback(lambda _: self._wakeup.set())
+
+        if self._unacked + len(self._pending) >= self.window:
+            self._wakeup.set()
+
+    def reject(self, seq: int, error: Exception) -> None:
+        """Кадр не будет сохранен: вместо подтверждения агент получит nack"""
+        done = asyncio.get_running_loop().create_future()
+        done.set_exception(error)
+        self.add(seq=seq, done=done)
+
+    def _advance(self) -> None:
+        while self._pending:
+            seq, done = self._pending[0]
+            if done is not None and not done.done():
+                break
+
+            self._pending.popleft()
+            error = done.exception() if done is not None else None
+            if error is not None:
+                # кумулятивный ack накроет и этот номер, поэтому отказ уходит раньше
+                self._nacks.append(
+                    {
+                        "type": "nack",
+                        "seq": seq,
+                        "reason": getattr(error, "detail", "Telemetry not stored"),
+                        # строку отбросили из-за перегрузки - кадр стоит повторить
+                        "retry": isinstance(error, TelemetryDroppedException),
+                    }
+                )
+            self._ready = seq if self._ready is None else max(self._ready, seq)
+            self._unacked += 1
+
+    async def flush(self) -> None:
+        self._advance()
+        nacks, self._nacks = self._nacks, []
+        for message in nacks:
+            await self.send(message)
+        if self._unacked:
+            self._unacked = 0
+            await self.send({"type": "ack", "seq": self._ready})
+
+    async def run(self) -> None:
+        while True:
+            timed_out = False
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                timed_out = True
+            self._wakeup.clear()
+
+            self._advance()
+            if self._unacked >= self.window or (timed_out and self._unacked):
+                await self.flush()
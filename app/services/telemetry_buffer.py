@@ -0,0 +1,163 @@
+import asyncio
+import logging
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.exceptions import (
+    TelemetryDroppedException,
+    TelemetryRejectedException,
+)
+from app.repositories.telemetry_repository import TelemetryRepository
+from app.schemas.telemetry import TelemetryUpload
+
+logger = logging.getLogger(__name__)
+
+
+def _fail(done: list[asyncio.Future], error: Exception) -> None:
+    for future in done:
+        if not future.done():
+            future.set_exception(error)
+            # в режимах без ожидания записи future никто не читает
+            future.exception()
+
+
+class TelemetryBuffer:
+    """Копит телеметрию со всех сокетов воркера и пишет ее в бд пачками"""
+
+    def __init__(
+        self,
+        repository: TelemetryRepository,
+        session_factory: async_sessionmaker[AsyncSession],
+        max_size: int = 1000,
+        max_age: float = 1.0,
+    ):
+        self.repository = repository
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.max_age = max_age
+        # если бд недоступна, не даем буферу расти бесконечно
+        self.max_pending = max_size * 10
+
+        self._rows: list[TelemetryUpload] = []
+        # по future на строку: завершается, когда строка записана в бд,
+        # и падает, если строка отброшена
+        self._done: list[asyncio.Future] = []
+        self._first_at: float | None = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def put(self, row: TelemetryUpload) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if not self._rows:
+            self._first_at = loop.time()
+            self._wakeup.set()
+        done = loop.create_future()
+        self._rows.append(row)
+        self._done.append(done)
+
+        if len(self._rows) >= self.max_size:
+            self._wakeup.set()
+        return done
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+
+    async def flush(self) -> bool:
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            done, self._done = self._done, []
+            self._first_at = None
+
+            if not rows:
+                return True
+
+            offset = 0
+            try:
+                async with self.session_factory() as session:
+                    while offset < len(rows):
+                        end = offset + self.max_size
+                        await self._write(
+                            session=session,
+                            rows=rows[offset:end],
+                            done=done[offset:end],
+                        )
+                        offset = end
+            except Exception as e:
+                logger.error(f"Telemetry flush failed ({len(rows) - offset} rows): {e}")
+                self._requeue(rows=rows[offset:], done=done[offset:])
+                return False
+
+            return True
+
+    async def _write(
+        self,
+        session: AsyncSession,
+        rows: list[TelemetryUpload],
+        done: list[asyncio.Future],
+    ):
+        try:
+            await self.repository.add_many(session=session, schemas=rows)
+        except IntegrityError:
+            # например, устройство удалили, пока сокет был открыт:
+            # делим пачку пополам, чтобы отбросить только битые строки
+            await session.rollback()
+            if len(rows) == 1:
+                logger.warning(f"Dropped telemetry row of device {rows[0].device_id}")
+                _fail(done, TelemetryRejectedException())
+                return
+
+            middle = len(rows) // 2
+            await self._write(session=session, rows=rows[:middle], done=done[:middle])
+            await self._write(session=session, rows=rows[middle:], done=done[middle:])
+            return
+
+        for future in done:
+            if not future.done():
+                future.set_result(None)
+
+    def _requeue(self, rows: list[TelemetryUpload], done: list[asyncio.Future]):
+        rows.extend(self._rows)
+        done.extend(self._done)
+        if len(rows) > self.max_pending:
+            dropped = len(rows) - self.max_pending
+            logger.warning(f"Telemetry buffer overflow, dropped {dropped} rows")
+            # агент получит отказ с повтором и пришлет эти кадры еще раз
+            _fail(done[:dropped], TelemetryDroppedException())
+            rows, done = rows[dropped:], done[dropped:]
+
+        self._rows, self._done = rows, done
+        self._first_at = asyncio.get_running_loop().time()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            timeout = None
+            if self._first_at is not None:
+                timeout = max(0.0, self._first_at + self.max_age - loop.time())
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if not self._rows:
+                continue
+
+            age = loop.time() - self._first_at
+            if len(self._rows) >= self.max_size or age >= self.max_age:
+                if not await self.flush():
+                    await asyncio.sleep(self.max_age)
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.core.redis_manager import RedisStorage
+
+logger = logging.getLogger(__name__)
+
+
+def _channel(owner_id: int) -> str:
+    return f"telemetry:live:{owner_id}"
+
+
+class HubSubscription:
+    """Ограниченная очередь одного подписчика: при переполнении выкидываем самое старое"""
+
+    def __init__(self, device_id: int | None, maxsize: int):
+        self.device_id = device_id
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, sample: dict) -> None:
+        if self.device_id is not None and sample["device_id"] != self.device_id:
+            return
+
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(sample)
+
+
+class TelemetryHub:
+    """Раздает принятую телеметрию открытым дашбордам владельца на всех воркерах"""
+
+    def __init__(
+        self,
+        cache_storage: RedisStorage,
+        queue_size: int = 100,
+        publish_queue_size: int = 10000,
+    ):
+        self.cache_storage = cache_storage
+        self.queue_size = queue_size
+
+        self._outbox: asyncio.Queue[tuple[str, dict]] = asyncio.Queue(
+            maxsize=publish_queue_size
+        )
+        self._subscribers: dict[int, set[HubSubscription]] = {}
+        self._subscribed = asyncio.Event()
+        self._pubsub = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._pubsub = self.cache_storage.pubsub()
+        self._tasks = [
+            asyncio.create_task(self._publish_loop()),
+            asyncio.create_task(self._listen_loop()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    def publish(self, owner_id: int, sample: dict) -> None:
+        # прием телеметрии не должен ждать Redis, поэтому только кладем в очередь
+        if self._outbox.full():
+            self._outbox.get_nowait()
+        self._outbox.put_nowait((_channel(owner_id), sample))
+
+    @asynccontextmanager
+    async def subscribe(
+        self, owner_id: int, device_id: int | None = None
+    ) -> AsyncIterator[HubSubscription]:
+        subscription = HubSubscription(device_id=device_id, maxsize=self.queue_size)
+
+        subscribers = self._subscribers.setdefault(owner_id, set())
+        subscribers.add(subscription)
+        if len(subscribers) == 1:
+            await self._pubsub.subscribe(
+                self.cache_storage.channel_name(_channel(owner_id))
+            )
+            self._subscribed.set()
+
+        try:
+            yield subscription
+        finally:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[owner_id]
+                await self._pubsub.unsubscribe(
+                    self.cache_storage.channel_name(_channel(owner_id))
+                )
+                if not self._subscribers:
+                    self._subscribed.clear()
+
+    def _dispatch(self, channel: str, sample: dict) -> None:
+        owner_id = int(channel.rsplit(":", 1)[1])
+        for subscription in self._subscribers.get(owner_id, ()):
+            subscription.offer(sample)
+
+    async def _publish_loop(self) -> None:
+        while True:
+            messages = [await self._outbox.get()]
+            while not self._outbox.empty():
+                messages.append(self._outbox.get_nowait())
+
+            try:
+                await self.cache_storage.publish_many(messages)
+            except Exception as e:
+                logger.warning(f"Live telemetry publish failed: {e}")
+
+    async def _listen_loop(self) -> None:
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await self._subscribed.wait()
+
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message:
+                    self._dispatch(
+                        channel=message["channel"], sample=json.loads(message["data"])
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Live telemetry listener failed: {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.repositories.telemetry_repository import TelemetryRepository
+from app.schemas.telemetry import TelemetryPartition
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_LOCK_ID = 7_345_002  # ключ pg_advisory_xact_lock обслуживания секций
+REFRESH_MIN_INTERVAL_SEC = 5.0  # как часто можно перечитывать границы из каталога
+
+# от понедельника: недельные секции начинаются с начала недели
+_ORIGIN = datetime(2000, 1, 3, tzinfo=timezone.utc)
+
+
+class TelemetryPartitions:
+    """Создает секции телеметрии наперед и удаляет устаревшие целиком"""
+
+    def __init__(
+        self,
+        repository: TelemetryRepository,
+        session_factory: async_sessionmaker[AsyncSession],
+        partition_days: int = 1,
+        ahead: int = 3,
+        retention_days: int = 30,
+        check_interval: float = 3600.0,
+    ):
+        self.repository = repository
+        self.session_factory = session_factory
+        self.step = timedelta(days=partition_days)
+        self.ahead = ahead
+        self.retention = timedelta(days=retention_days)
+        self.check_interval = check_interval
+
+        self._end: datetime | None = None  # верхняя граница последней секции
+        self._refreshed_at: float | None = None
+        self._refresh_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        # без секций вставка невозможна, поэтому первый раз - до приема телеметрии
+        await self.maintain()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def accepts(self, ts: datetime) -> bool:
+        """Попадает ли образец в окно хранения, для которого есть секция"""
+        if self._end is None:
+            return True
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - self.retention <= ts < self._end
+
+    async def check(self, ts: datetime) -> bool:
+        """accepts, но образец новее последней известной секции сверяем с каталогом:
+        секции создает один воркер, и границы остальных могли устареть"""
+        if self.accepts(ts):
+            return True
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        if ts < self._end:
+            return False
+
+        await self.refresh()
+        return self.accepts(ts)
+
+    async def refresh(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._refresh_lock:
+            # пачка образцов из будущего не должна стать пачкой запросов к каталогу
+            if (
+                self._refreshed_at is not None
+                and loop.time() - self._refreshed_at < REFRESH_MIN_INTERVAL_SEC
+            ):
+                return
+
+            async with self.session_factory() as session:
+                partitions = await self.repository.get_partitions(session=session)
+            self._set_bounds(partitions)
+
+    def _set_bounds(self, partitions: list[TelemetryPartition]) -> None:
+        self._end = max((p.end for p in partitions), default=None)
+        self._refreshed_at = asyncio.get_running_loop().time()
+
+    def _bucket(self, ts: datetime) -> datetime:
+        return _ORIGIN + (ts - _ORIGIN) // self.step * self.step
+
+    def _missing(
+        self, partitions: list[TelemetryPartition], now: datetime
+    ) -> list[tuple[datetime, datetime]]:
+        """Диапазоны будущих секций, не пересекающиеся с уже существующими"""
+        ranges = []
+        for i in range(self.ahead + 1):
+            start = self._bucket(now) + i * self.step
+            end = start + self.step
+            # старые секции могли быть другой ширины - заполняем только промежутки
+            for partition in partitions:
+                if partition.end <= start or (
+                    partition.start is not None and partition.start >= end
+                ):
+                    continue
+                if partition.start is not None and partition.start > start:
+                    ranges.append((start, partition.start))
+                start = max(start, partition.end)
+            if start < end:
+                ranges.append((start, end))
+        return ranges
+
+    async def maintain(self) -> None:
+        now = datetime.now(timezone.utc)
+
+        async with self.session_factory() as session:
+            locked = await session.scalar(
+                text(f"SELECT pg_try_advisory_xact_lock({PARTITIONS_LOCK_ID})")
+            )
+            partitions = await self.repository.get_partitions(session=session)
+
+            # секциями занимается один воркер, остальные только читают границы
+            if locked:
+                expired = [p for p in partitions if p.end <= now - self.retention]
+                for partition in expired:
+                    await self.repository.drop_partition(
+                        session=session, name=partition.name
+                    )
+                    logger.info(f"Dropped telemetry partition {partition.name}")
+                partitions = [p for p in partitions if p not in expired]
+
+                for start, end in self._missing(partitions=partitions, now=now):
+                    name = f"telemetry_p{start:%Y%m%d}"
+                    await self.repository.create_partition(
+                        session=session, name=name, start=start, end=end
+                    )
+                    partitions.append(
+                        TelemetryPartition(name=name, start=start, end=end)
+                    )
+                    partitions.sort(key=lambda p: p.end)
+                    logger.info(f"Created telemetry partition {name}")
+
+            await session.commit()
+
+        self._set_bounds(partitions)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.error(f"Telemetry partition maintenance failed: {e}")
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import Telemetry
+from app.models.telemetry_rollup import ROLLUP_TIERS, bucket_start
+from app.repositories.telemetry_rollups_repository import TelemetryRollupsRepository
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_LOCK_ID = 7_345_003  # ключ pg_advisory_xact_lock пересчета агрегатов
+
+CLEANUP_INTERVAL_SEC = 3600
+
+
+class TelemetryRollups:
+    """Поддерживает агрегаты 1m/1h/1d: пересчитывает только корзины, в которые
+    пришли новые (в том числе опоздавшие) строки, каскадом от минут к суткам"""
+
+    def __init__(
+        self,
+        repository: TelemetryRollupsRepository,
+        session_factory: async_sessionmaker[AsyncSession],
+        interval: float = 10.0,
+        batch_size: int = 10000,
+        minute_retention_days: int = 90,
+    ):
+        self.repository = repository
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.minute_retention = timedelta(days=minute_retention_days)
+
+        self._cleaned_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh(self) -> int:
+        """Один проход по очереди, возвращает число пересчитанных минутных корзин"""
+        async with self.session_factory() as session:
+            locked = await session.scalar(
+                text(f"SELECT pg_try_advisory_xact_lock({ROLLUPS_LOCK_ID})")
+            )
+            if not locked:  # пересчетом уже занят другой воркер
+                return 0
+
+            queued = await self.repository.take_queued(
+                session=session, limit=self.batch_size
+            )
+
+            keys, source = queued, Telemetry
+            for model, size in ROLLUP_TIERS:
+                keys = sorted(
+                    {
+                        (device_id, bucket_start(bucket, size))
+                        for device_id, bucket in keys
+                    }
+                )
+                await self.repository.refresh(
+                    session=session, target=model, source=source, size=size, keys=keys
+                )
+                source = model
+
+            await session.commit()
+        return len(queued)
+
+    async def cleanup(self) -> None:
+        # часовые и суточные агрегаты храним всегда, минутные - ограниченно
+        minute_model = ROLLUP_TIERS[0][0]
+        async with self.session_factory() as session:
+            await self.repository.delete_before(
+                session=session,
+                model=minute_model,
+                before=datetime.now(timezone.utc) - self.minute_retention,
+            )
+            await session.commit()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                processed = await self.refresh()
+
+                if (
+                    self._cleaned_at is None
+                    or loop.time() - self._cleaned_at >= CLEANUP_INTERVAL_SEC
+                ):
+                    await self.cleanup()
+                    self._cleaned_at = loop.time()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Telemetry rollup failed: {e}")
+                processed = 0
+
+            # пока очередь не разобрана (например, после загрузки истории) - без пауз
+            if processed < self.batch_size:
+                await asyncio.sleep(self.interval)
@@ -1,24 +1,72 @@
 import asyncio
+import json
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterable, AsyncIterator, Sequence
 
+import numpy as np
 from fastapi import WebSocket, WebSocketDisconnect
-from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.core.config import settings
 from app.core.exceptions import (
     ObjectNotFoundException,
     DeviceNotFoundException,
     NotAuthorizedException,
+    InvalidTokenException,
+    InvalidTelemetryException,
+    TelemetryRejectedException,
+    InvalidAggregationException,
+    InvalidCursorException,
+    InvalidFieldsException,
+    InvalidPeriodException,
+    ExportUnavailableException,
 )
 from app.core.redis_manager import RedisStorage
 from app.repositories.devices_repository import DevicesRepository
 from app.repositories.telemetry_repository import TelemetryRepository
-from app.schemas.telemetry import TelemetryUpload, TelemetryPagination
+from app.schemas.device import DeviceIdentity
+from app.models.telemetry_rollup import ROLLUP_TIERS
+from app.repositories.telemetry_rollups_repository import TelemetryRollupsRepository
+from app.schemas.telemetry import (
+    AckMode,
+    TelemetryUpload,
+    TelemetryPagination,
+    TelemetryAggregate,
+    TelemetryAggregateQuery,
+    TelemetryResponse,
+    TelemetrySeries,
+    MetricSeries,
+    encode_cursor,
+    fields_metrics,
+    decode_cursor,
+    parse_fields,
+)
+from app.schemas.telemetry_export import ExportFormat, ExportWriter, make_writer
+from app.schemas.telemetry_codec import (
+    TelemetryCodec,
+    negotiate_codec,
+    iter_ndjson,
+    iter_json_array,
+)
+from app.services.alert_engine import AlertEngine
+from app.services.device_events import DeviceEvents
+from app.services.downsampling import lttb, minmax
+from app.services.device_token_cache import DeviceTokenCache
+from app.services.derived_metrics import DerivedMetrics
+from app.services.latest_telemetry import LatestTelemetry
+from app.services.presence_tracker import PresenceTracker
+from app.services.telemetry_acks import AckWindow
+from app.services.telemetry_buffer import TelemetryBuffer
+from app.services.telemetry_hub import TelemetryHub
+from app.services.telemetry_partitions import TelemetryPartitions
 
 logger = logging.getLogger(__name__)
 
-RECONNECT_INTERVAL_SEC = 5
 RECONNECT_TIMEOUT_SEC = 120
+LIVE_HEARTBEAT_SEC = 15
+SERIES_DEFAULT_RANGE = timedelta(days=1)  # период графика, если from не указан
 
 
 class TelemetryService:
@@ -26,11 +74,34 @@ class TelemetryService:
         self,
         devices_repository: DevicesRepository,
         telemetry_repository: TelemetryRepository,
+        rollups_repository: TelemetryRollupsRepository,
         cache_storage: RedisStorage,
+        buffer: TelemetryBuffer,
+        presence: PresenceTracker,
+        session_factory: async_sessionmaker[AsyncSession],
+        token_cache: DeviceTokenCache,
+        device_events: DeviceEvents,
+        hub: TelemetryHub,
+        partitions: TelemetryPartitions,
+        latest: LatestTelemetry,
+        derived: DerivedMetrics,
+        alerts: AlertEngine,
     ):
         self.devices = devices_repository
         self.telemetry = telemetry_repository
+        self.rollups = rollups_repository
         self.cache_storage = cache_storage
+        self.buffer = buffer
+        self.presence = presence
+        # сокеты живут долго, поэтому соединение из пула берем только на время запроса
+        self.session_factory = session_factory
+        self.token_cache = token_cache
+        self.device_events = device_events
+        self.hub = hub
+        self.partitions = partitions
+        self.latest = latest
+        self.derived = derived
+        self.alerts = alerts
 
     async def get_telemetry(
         self,
@@ -38,7 +109,77 @@ class TelemetryService:
         device_id: int,
         pagination: TelemetryPagination,
         session: AsyncSession,
-    ):
+        start: datetime | None = None,
+        end: datetime | None = None,
+        fields: str | None = None,
+    ) -> tuple[list[TelemetryResponse] | list[dict], str | None]:
+        if pagination.cursor is not None:
+            try:
+                decode_cursor(pagination.cursor)
+            except ValueError:
+                raise InvalidCursorException
+
+        projection = None
+        if fields is not None:
+            try:
+                projection = parse_fields(fields)
+            except ValueError:
+                raise InvalidFieldsException
+
+        try:
+            device = await self.devices.get_one(session=session, id=device_id)
+        except ObjectNotFoundException:
+            raise DeviceNotFoundException
+
+        if device.owner_id != user_id:
+            raise NotAuthorizedException
+
+        if projection is not None:
+            data = await self.telemetry.get_projected(
+                session=session,
+                device_id=device_id,
+                pagination=pagination,
+                fields=projection,
+                start=start,
+                end=end,
+            )
+            last = (data[-1]["ts"], data[-1]["id"]) if data else None
+        else:
+            data = await self.telemetry.get_filtered(
+                session=session,
+                device_id=device_id,
+                pagination=pagination,
+                start=start,
+                end=end,
+            )
+            last = (data[-1].ts, data[-1].id) if data else None
+
+        next_cursor = None
+        if last and len(data) == pagination.limit:
+            next_cursor = encode_cursor(ts=last[0], id=last[1])
+        return data, next_cursor
+
+    async def get_aggregate(
+        self,
+        user_id: int,
+        device_id: int,
+        start: datetime,
+        end: datetime | None,
+        bucket: str,
+        metrics: str | None,
+        p95: bool,
+        session: AsyncSession,
+    ) -> TelemetryAggregate:
+        try:
+            query = TelemetryAggregateQuery(
+                start=start,
+                end=end or datetime.now(timezone.utc),
+                bucket=bucket,
+                metrics=metrics,
+            )
+        except ValidationError:
+            raise InvalidAggregationException
+
         try:
             device = await self.devices.get_one(session=session, id=device_id)
         except ObjectNotFoundException:
@@ -47,100 +188,504 @@ class TelemetryService:
         if device.owner_id != user_id:
             raise NotAuthorizedException
 
-        return await self.telemetry.get_filtered(
-            session=session, device_id=device_id, pagination=pagination
+        # p95 не складывается из корзин, поэтому для него читаем сырые строки;
+        # уровень подходит, если корзины запроса складываются из его корзин целиком,
+        # а период не короче одной из них - края периода досчитываются по сырым
+        if not p95:
+            for model, size in reversed(ROLLUP_TIERS):
+                if (
+                    query.bucket % size == timedelta(0)
+                    and query.end - query.start >= size
+                ):
+                    buckets = await self.rollups.get_aggregate(
+                        session=session,
+                        model=model,
+                        size=size,
+                        device_id=device_id,
+                        query=query,
+                    )
+                    return TelemetryAggregate(
+                        device_id=device_id,
+                        source=model.__tablename__,
+                        buckets=buckets,
+                    )
+
+        buckets = await self.telemetry.get_aggregate(
+            session=session, device_id=device_id, query=query
+        )
+        return TelemetryAggregate(
+            device_id=device_id,
+            source=self.telemetry.model.__tablename__,
+            buckets=buckets,
+        )
+
+    async def get_series(
+        self,
+        user_id: int,
+        device_id: int,
+        max_points: int,
+        session: AsyncSession,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        fields: str | None = None,
+    ) -> TelemetrySeries:
+        try:
+            metrics = fields_metrics(parse_fields(fields or ""))
+        except ValueError:
+            raise InvalidFieldsException
+
+        end = end or datetime.now(timezone.utc)
+        start = start or end - SERIES_DEFAULT_RANGE
+        # без пояса время считаем UTC, как и в агрегатах
+        start, end = (
+            ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc) for ts in (start, end)
+        )
+        if start >= end:
+            raise InvalidPeriodException
+
+        try:
+            device = await self.devices.get_one(session=session, id=device_id)
+        except ObjectNotFoundException:
+            raise DeviceNotFoundException
+
+        if device.owner_id != user_id:
+            raise NotAuthorizedException
+
+        # самый крупный уровень агрегатов, у которого min и max корзин еще дают
+        # не меньше max_points точек; на коротком периоде - сырые строки
+        for model, size in reversed(ROLLUP_TIERS):
+            if 2 * ((end - start) / size) >= max_points:
+                rows = await self.rollups.get_series(
+                    session=session,
+                    model=model,
+                    device_id=device_id,
+                    metrics=metrics,
+                    start=start,
+                    end=end,
+                )
+                return TelemetrySeries(
+                    device_id=device_id,
+                    source=model.__tablename__,
+                    series=self._minmax_series(rows, metrics, max_points),
+                )
+
+        rows = await self.telemetry.get_series(
+            session=session, device_id=device_id, metrics=metrics, start=start, end=end
+        )
+        return TelemetrySeries(
+            device_id=device_id,
+            source=self.telemetry.model.__tablename__,
+            series=self._lttb_series(rows, metrics, max_points),
+        )
+
+    @staticmethod
+    def _lttb_series(
+        rows: Sequence[Sequence], metrics: list[str], max_points: int
+    ) -> dict[str, MetricSeries]:
+        times = [row[0] for row in rows]
+        x = np.array([ts.timestamp() for ts in times], dtype=float)
+
+        series = {}
+        for i, name in enumerate(metrics, start=1):
+            y = np.array([row[i] for row in rows], dtype=float)  # None -> nan
+            present = np.flatnonzero(~np.isnan(y))
+            picked = present[lttb(x[present], y[present], max_points)]
+            series[name] = MetricSeries(
+                ts=[times[j] for j in picked], values=y[picked].tolist()
+            )
+        return series
+
+    @staticmethod
+    def _minmax_series(
+        rows: Sequence[Sequence], metrics: list[str], max_points: int
+    ) -> dict[str, MetricSeries]:
+        times = [row[0] for row in rows]
+
+        series = {}
+        for i, name in enumerate(metrics):
+            low = np.array([row[1 + 2 * i] for row in rows], dtype=float)
+            high = np.array([row[2 + 2 * i] for row in rows], dtype=float)
+            present = np.flatnonzero(~np.isnan(low))
+            lowest, highest = minmax(low[present], high[present], max_points)
+            lowest, highest = present[lowest], present[highest]
+
+            # минимум и максимум группы - две точки, по порядку корзин
+            picked = np.concatenate((lowest, highest))
+            values = np.concatenate((low[lowest], high[highest]))
+            order = np.argsort(picked, kind="stable")
+            series[name] = MetricSeries(
+                ts=[times[j] for j in picked[order]], values=values[order].tolist()
+            )
+        return series
+
+    async def export(
+        self,
+        user_id: int,
+        device_id: int,
+        format: ExportFormat,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> tuple[ExportWriter, AsyncIterator[bytes]]:
+        try:
+            writer = make_writer(
+                format=format, row_group_size=settings.telemetry.export_row_group_size
+            )
+        except ValueError:
+            raise ExportUnavailableException
+
+        async with self.session_factory() as session:
+            try:
+                device = await self.devices.get_one(session=session, id=device_id)
+            except ObjectNotFoundException:
+                raise DeviceNotFoundException
+
+        if device.owner_id != user_id:
+            raise NotAuthorizedException
+
+        return writer, self._export_stream(
+            writer=writer, device_id=device_id, start=start, end=end
+        )
+
+    async def _export_stream(
+        self,
+        writer: ExportWriter,
+        device_id: int,
+        start: datetime | None,
+        end: datetime | None,
+    ) -> AsyncIterator[bytes]:
+        # ответ живет дольше запроса, поэтому сессия своя, на время выгрузки
+        yield writer.open()
+        async with self.session_factory() as session:
+            async for rows in self.telemetry.stream_rows(
+                session=session,
+                device_id=device_id,
+                chunk_size=settings.telemetry.export_chunk_size,
+                start=start,
+                end=end,
+            ):
+                data = writer.write(rows)
+                if data:
+                    yield data
+        yield writer.close()
+
+    async def get_live_stream(
+        self, user_id: int, device_id: int | None = None
+    ) -> AsyncIterator[str]:
+        if device_id is not None:
+            async with self.session_factory() as session:
+                try:
+                    device = await self.devices.get_one(session=session, id=device_id)
+                except ObjectNotFoundException:
+                    raise DeviceNotFoundException
+
+            if device.owner_id != user_id:
+                raise NotAuthorizedException
+
+        return self._live_stream(user_id=user_id, device_id=device_id)
+
+    async def _live_stream(
+        self, user_id: int, device_id: int | None
+    ) -> AsyncIterator[str]:
+        async with self.hub.subscribe(
+            owner_id=user_id, device_id=device_id
+        ) as subscription:
+            while True:
+                try:
+                    sample = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=LIVE_HEARTBEAT_SEC
+                    )
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+
+                yield f"event: telemetry\ndata: {json.dumps(sample)}\n\n"
+
+    async def _accept(
+        self, device: DeviceIdentity, telemetry: TelemetryUpload
+    ) -> asyncio.Future:
+        if not await self.partitions.check(telemetry.ts):
+            # вне окна хранения строку некуда записать: агент получит отказ,
+            # а устройство не считается ответившим
+            raise TelemetryRejectedException
+
+        self.presence.touch(device_id=device.id, owner_id=device.owner_id)
+        stored = self.buffer.put(telemetry)
+        self.latest.update(owner_id=device.owner_id, telemetry=telemetry)
+        self.derived.update(telemetry=telemetry)
+        self.alerts.evaluate(device=device, telemetry=telemetry)
+        self.hub.publish(
+            owner_id=device.owner_id, sample=telemetry.model_dump(mode="json")
+        )
+        return stored
+
+    @staticmethod
+    async def _send(ws: WebSocket, codec: TelemetryCodec, message: dict) -> None:
+        data = codec.encode(message)
+        if codec.binary:
+            await ws.send_bytes(data)
+        else:
+            await ws.send_text(data)
+
+    @staticmethod
+    async def _receive(ws: WebSocket, codec: TelemetryCodec) -> dict:
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(code=message.get("code", 1000))
+
+        data = message.get("bytes")
+        if data is None:
+            data = message.get("text")
+        return codec.decode(data)
+
+    @staticmethod
+    def _parse(device_id: int, payload: dict) -> TelemetryUpload:
+        try:
+            return TelemetryUpload(
+                device_id=device_id,
+                ts=payload["ts"],
+                cpu=payload["cpu"],
+                memory=payload["memory"],
+                disk=payload["disk"],
+                sensors=payload["sensors"],
+                network=payload["network"],
+            )
+        except (KeyError, TypeError, ValidationError) as e:
+            raise InvalidTelemetryException from e
+
+    async def _reject(
+        self,
+        ws: WebSocket,
+        codec: TelemetryCodec,
+        acks: AckWindow,
+        seq: int | None,
+        payload: dict,
+        error: InvalidTelemetryException | TelemetryRejectedException,
+    ) -> None:
+        if seq is not None:
+            acks.reject(seq=seq, error=error)
+            return
+
+        await self._send(
+            ws=ws,
+            codec=codec,
+            message={
+                "type": "nack",
+                "ts": payload.get("ts") if isinstance(payload, dict) else None,
+                "reason": error.detail,
+            },
         )
 
     async def _handle_telemetry(
-        self, device_id: int, ws: WebSocket, token: str, session: AsyncSession
+        self,
+        device: DeviceIdentity,
+        ws: WebSocket,
+        codec: TelemetryCodec,
+        ack_mode: AckMode,
     ):
+        device_id = device.id
 
-        await self.devices.patch(
-            session=session, token=token, column="status", value="online"
+        self.presence.touch(device_id=device_id, owner_id=device.owner_id)
+
+        acks = AckWindow(
+            send=lambda message: self._send(ws=ws, codec=codec, message=message),
+            window=settings.telemetry.ack_window,
+            interval=settings.telemetry.ack_interval,
         )
+        acker = asyncio.create_task(acks.run())
 
         try:
-            await ws.send_json(
-                {"type": "telemetry", "ts": datetime.now(timezone.utc).isoformat()}
+            await self._send(
+                ws=ws,
+                codec=codec,
+                message={
+                    "type": "telemetry",
+                    "ts": datetime.now(timezone.utc).isoformat(),
+                },
             )
 
             while True:
-                msg = await ws.receive_json()
+                msg = await self._receive(ws=ws, codec=codec)
                 if msg["type"] == "telemetry":
-                    payload = msg["payload"]
+                    payload = msg.get("payload")
+                    seq = msg.get("seq")
 
-                    telemetry = TelemetryUpload(
-                        device_id=device_id,
-                        ts=payload["ts"],
-                        cpu=payload["cpu"],
-                        memory=payload["memory"],
-                        disk=payload["disk"],
-                        sensors=payload["sensors"],
-                        network=payload["network"],
-                    )
+                    # receipt подтверждает разобранный кадр, не дожидаясь приема
+                    receipt = seq is not None and ack_mode == AckMode.RECEIPT
 
-                    await self.telemetry.add(session=session, schema=telemetry)
+                    try:
+                        telemetry = self._parse(device_id=device_id, payload=payload)
+                        if receipt:
+                            acks.add(seq=seq)
+                        stored = await self._accept(device=device, telemetry=telemetry)
+                    except (
+                        InvalidTelemetryException,
+                        TelemetryRejectedException,
+                    ) as e:
+                        # отклоняем только кадр, соединение остается открытым;
+                        # в режиме receipt кадр уже подтвержден и не повторяется
+                        if not receipt or isinstance(e, InvalidTelemetryException):
+                            await self._reject(
+                                ws=ws,
+                                codec=codec,
+                                acks=acks,
+                                seq=seq,
+                                payload=payload,
+                                error=e,
+                            )
+                        continue
 
-                    await self.devices.patch(
-                        session=session,
-                        token=token,
-                        column="last_seen_at",
-                        value=datetime.now(timezone.utc),
-                    )
-
-                    await ws.send_json({"type": "ack", "ts": msg["payload"]["ts"]})
+                    if seq is None:
+                        # старые агенты без номеров кадров: ack на каждый кадр
+                        await self._send(
+                            ws=ws,
+                            codec=codec,
+                            message={"type": "ack", "ts": payload["ts"]},
+                        )
+                    elif ack_mode == AckMode.DURABLE:
+                        acks.add(seq=seq, done=stored)
+                    elif ack_mode == AckMode.BUFFERED:
+                        acks.add(seq=seq)
         except WebSocketDisconnect:
-            await self.devices.patch(
-                session=session, token=token, column="status", value="offline"
-            )
+            self.presence.disconnect(device_id=device_id)
         except Exception as e:
             logger.warning(e)
             try:
                 await ws.close(code=1008, reason="Protocol error")
             except RuntimeError:
                 pass
+        finally:
+            acker.cancel()
 
-    async def open_ws(self, ws: WebSocket, token: str, session: AsyncSession):
-        async def find_device():
+    async def _find_device(self, token: str) -> DeviceIdentity | None:
+        device = await self.token_cache.get(token=token)
+        if device:
+            return device
+
+        async with self.session_factory() as session:
             try:
-                return await self.devices.get_one(session=session, token=token)
+                device = await self.devices.get_one(session=session, token=token)
             except ObjectNotFoundException:
                 return None
 
-        device = await find_device()
+        device = DeviceIdentity.model_validate(device)
+        await self.token_cache.set(token=token, device=device)
+        return device
+
+    async def bulk_upload(
+        self, token: str, chunks: AsyncIterable[bytes], ndjson: bool
+    ) -> dict:
+        device = await self._find_device(token=token)
+        if not device:
+            raise InvalidTokenException
+
+        samples = iter_ndjson(chunks) if ndjson else iter_json_array(chunks)
+        batch_size = settings.telemetry.bulk_batch_size
+        batch: list[TelemetryUpload] = []
+        accepted = rejected = 0
+
+        try:
+            async for item in samples:
+                if not isinstance(item, dict):
+                    rejected += 1
+                    continue
+
+                try:
+                    # принимаем как сами образцы, так и кадры websocket целиком
+                    telemetry = TelemetryUpload(
+                        device_id=device.id, **item.get("payload", item)
+                    )
+                except (ValidationError, TypeError):
+                    rejected += 1
+                    continue
+
+                if not await self.partitions.check(telemetry.ts):
+                    rejected += 1
+                    continue
+                batch.append(telemetry)
+
+                if len(batch) >= batch_size:
+                    accepted += await self._store(device=device, rows=batch)
+                    batch = []
+        except ValueError:
+            raise InvalidTelemetryException
+
+        if batch:
+            accepted += await self._store(device=device, rows=batch)
+
+        return {"accepted": accepted, "rejected": rejected}
+
+    async def _store(self, device: DeviceIdentity, rows: list[TelemetryUpload]) -> int:
+        async with self.session_factory() as session:
+            await self.telemetry.add_many(session=session, schemas=rows)
+        # история обычно старше текущего образца - update это проверит
+        rows = sorted(rows, key=lambda row: row.ts)
+        self.latest.update(owner_id=device.owner_id, telemetry=rows[-1])
+        for row in rows:
+            self.derived.update(telemetry=row)
+        return len(rows)
+
+    async def open_ws(
+        self, ws: WebSocket, token: str, ack_mode: AckMode = AckMode.BUFFERED
+    ):
+        codec, subprotocol = negotiate_codec(ws.scope.get("subprotocols", []))
+        device = await self._find_device(token=token)
 
         if device:
-            await ws.accept()
+            await ws.accept(subprotocol=subprotocol)
             return await self._handle_telemetry(
-                ws=ws,
-                token=token,
-                device_id=device.id,
-                session=session,
+                ws=ws, device=device, codec=codec, ack_mode=ack_mode
             )
 
         exists = await self.cache_storage.exists(key=token)
 
         if exists:
-            await ws.accept()
-            start = asyncio.get_event_loop().time()
-            while True:
-                await ws.send_json(
-                    {"type": "reconnect", "ts": datetime.now(timezone.utc).isoformat()}
-                )
-                device = await find_device()
+            await ws.accept(subprotocol=subprotocol)
+            async with self.device_events.wait_claimed(token=token) as claimed:
+                # устройство могли привязать между первой проверкой и подпиской
+                device = await self._find_device(token=token)
 
-                if device:
-                    return await self._handle_telemetry(
+                if not device:
+                    await self._send(
                         ws=ws,
-                        token=token,
-                        device_id=device.id,
-                        session=session,
+                        codec=codec,
+                        message={
+                            "type": "reconnect",
+                            "ts": datetime.now(timezone.utc).isoformat(),
+                        },
                     )
+                    device = await self._wait_claimed(ws=ws, claimed=claimed)
 
-                elapsed = asyncio.get_event_loop().time() - start
-                if elapsed >= RECONNECT_TIMEOUT_SEC:
-                    return await ws.close(code=1008, reason="Provision timeout")
-
-                await asyncio.sleep(RECONNECT_INTERVAL_SEC)
+            if device:
+                return await self._handle_telemetry(
+                    ws=ws, device=device, codec=codec, ack_mode=ack_mode
+                )
+            return
 
         await ws.close(code=1008, reason="Invalid token")
+
+    @staticmethod
+    async def _wait_claimed(
+        ws: WebSocket, claimed: asyncio.Future
+    ) -> DeviceIdentity | None:
+        async def wait_disconnect():
+            while True:
+                message = await ws.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+
+        disconnect = asyncio.create_task(wait_disconnect())
+        try:
+            done, _ = await asyncio.wait(
+                {claimed, disconnect},
+                timeout=RECONNECT_TIMEOUT_SEC,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            disconnect.cancel()
+
+        if claimed in done:
+            return claimed.result()
+
+        if not done:
+            await ws.close(code=1008, reason="Provision timeout")
+        return None
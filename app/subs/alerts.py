@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import random
+from collections import OrderedDict
+
+import httpx
+from faststream.rabbit import RabbitRouter
+from faststream.rabbit.publisher import RabbitPublisher
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import db_manager, emails_publisher, settings
+from app.repositories.users_repository import UsersRepository
+from app.schemas.alert import AlertEvent, AlertState
+
+logger = logging.getLogger(__name__)
+
+router = RabbitRouter()
+
+
+class _Digest:
+    """Окно правила: после первого события остальные копятся до closes_at"""
+
+    def __init__(self, closes_at: float):
+        self.closes_at = closes_at
+        self.events: list[AlertEvent] = []
+
+
+class AlertDispatcher:
+    """Доставляет события алертов письмом (через очередь emails) и на webhook.
+    Повтор события одного нарушения отбрасывается, а события правила,
+    пришедшие в течение digest_interval после отправленного, уходят одной сводкой"""
+
+    def __init__(
+        self,
+        email_publisher: RabbitPublisher,
+        users_repository: UsersRepository,
+        session_factory: async_sessionmaker[AsyncSession],
+        digest_interval: float = 300.0,
+        timeout: float = 10.0,
+        max_connections: int = 100,
+        attempts: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        dedup_size: int = 100_000,
+        dedup_ttl: float = 24 * 60 * 60,
+    ):
+        self.email_publisher = email_publisher
+        self.users = users_repository
+        self.session_factory = session_factory
+        self.digest_interval = digest_interval
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.dedup_size = dedup_size
+        self.dedup_ttl = dedup_ttl
+
+        # (правило, устройство, начало нарушения, состояние) -> когда забыть.
+        # Ключ - само нарушение, а не последнее состояние пары: потерянный resolved
+        # не должен глушить fired следующего нарушения
+        self._seen: OrderedDict[tuple, float] = OrderedDict()
+        self._digests: dict[int, _Digest] = {}
+        self._emails: dict[int, str] = {}
+        self._deliveries: set[asyncio.Task] = set()
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        # один пул соединений на все webhook: keep-alive к одним и тем же хостам
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # накопленные сводки отправляем сразу, не дожидаясь конца окна
+        self.flush(now=float("inf"))
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _is_duplicate(self, event: AlertEvent, now: float) -> bool:
+        # срок у всех записей одинаковый, поэтому истекшие - в начале
+        while self._seen and next(iter(self._seen.values())) <= now:
+            self._seen.popitem(last=False)
+
+        key = (event.rule_id, event.device_id, event.since, event.state)
+        if key in self._seen:
+            return True
+
+        self._seen[key] = now + self.dedup_ttl
+        while len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def handle(self, event: AlertEvent) -> None:
+        now = asyncio.get_running_loop().time()
+        if self._is_duplicate(event, now=now):
+            return
+
+        digest = self._digests.get(event.rule_id)
+        if digest is not None and digest.closes_at > now:
+            digest.events.append(event)
+            return
+
+        # первое событие после тишины уходит сразу и открывает окно сводки
+        self._digests[event.rule_id] = _Digest(closes_at=now + self.digest_interval)
+        self._deliver([event])
+
+    def flush(self, now: float) -> None:
+        for rule_id, digest in list(self._digests.items()):
+            if digest.closes_at > now:
+                continue
+
+            if digest.events:
+                # правило продолжает срабатывать: следующая сводка - через окно
+                self._digests[rule_id] = _Digest(closes_at=now + self.digest_interval)
+                self._deliver(digest.events)
+            else:
+                del self._digests[rule_id]
+
+    def _deliver(self, events: list[AlertEvent]) -> None:
+        task = asyncio.create_task(self._send(events))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    @staticmethod
+    def _summary(events: list[AlertEvent]) -> str:
+        first = events[0]
+        title = first.rule_name or first.expression
+        if len(events) == 1:
+            return f"[{first.state.value}] {title} on device {first.device_id}"
+
+        fired = sum(event.state == AlertState.FIRED for event in events)
+        return f"{title}: {fired} fired, {len(events) - fired} resolved"
+
+    async def _send(self, events: list[AlertEvent]) -> None:
+        first = events[0]
+        summary = self._summary(events)
+
+        try:
+            if first.webhook_url:
+                await self._post(
+                    url=first.webhook_url,
+                    payload={
+                        "summary": summary,
+                        "digest": len(events) > 1,
+                        "events": [event.model_dump(mode="json") for event in events],
+                    },
+                )
+            if first.notify_email:
+                await self._email(
+                    owner_id=first.owner_id, summary=summary, events=events
+                )
+        except Exception as e:
+            logger.error(f"Alert delivery for rule {first.rule_id} failed: {e}")
+
+    async def _post(self, url: str, payload: dict) -> None:
+        for attempt in range(self.attempts):
+            try:
+                response = await self._client.post(url, json=payload)
+                if response.status_code < 400:
+                    return
+                # ошибки запроса не исправятся повтором, кроме 408 и 429
+                status = response.status_code
+                if status < 500 and status not in (408, 429):
+                    logger.warning(f"Webhook {url} rejected alert: {status}")
+                    return
+                error = f"HTTP {status}"
+            except httpx.TransportError as e:
+                error = repr(e)
+
+            if attempt + 1 < self.attempts:
+                delay = min(self.max_backoff, self.backoff * 2**attempt)
+                # разброс, чтобы воркеры не били в упавший webhook одновременно
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+        logger.warning(f"Webhook {url} failed after {self.attempts} attempts: {error}")
+
+    async def _email(
+        self, owner_id: int, summary: str, events: list[AlertEvent]
+    ) -> None:
+        email = self._emails.get(owner_id)
+        if email is None:
+            async with self.session_factory() as session:
+                user = await self.users.get_one_or_none(session=session, id=owner_id)
+            if user is None:
+                return
+            email = self._emails[owner_id] = user.email
+
+        await self.email_publisher.publish(
+            message={
+                "email": email,
+                "payload": summary,
+                "template": "alert.html",
+                "subject": f"IMS: {summary}",
+                "context": {
+                    "events": [event.model_dump(mode="json") for event in events]
+                },
+            },
+        )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(1.0, self.digest_interval))
+            self.flush(now=loop.time())
+
+
+alert_dispatcher = AlertDispatcher(
+    email_publisher=emails_publisher,
+    users_repository=UsersRepository(),
+    session_factory=db_manager.session_factory,
+    digest_interval=settings.alerts.digest_interval,
+    timeout=settings.alerts.webhook_timeout,
+    max_connections=settings.alerts.webhook_max_connections,
+    attempts=settings.alerts.delivery_attempts,
+    backoff=settings.alerts.delivery_backoff,
+    max_backoff=settings.alerts.delivery_max_backoff,
+)
+
+
+@router.subscriber("alerts")
+async def dispatch_alert(event: AlertEvent):
+    alert_dispatcher.handle(event)
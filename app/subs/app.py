@@ -3,11 +3,13 @@ import logging
 from faststream import FastStream
 
 from app.core import settings, broker
+from app.subs.alerts import alert_dispatcher, router as alerts_router
 from app.subs.emails import router as emails_router
 
 app = FastStream(broker)
 
 broker.include_router(emails_router)
+broker.include_router(alerts_router)
 
 
 @app.after_startup
@@ -17,3 +19,13 @@ async def configure_logging() -> None:
         format=settings.logging.log_format,
         datefmt=settings.logging.date_format,
     )
+
+
+@app.after_startup
+async def start_alert_dispatcher() -> None:
+    await alert_dispatcher.start()
+
+
+@app.on_shutdown
+async def stop_alert_dispatcher() -> None:
+    await alert_dispatcher.stop()
@@ -1,3 +1,5 @@
+from typing import Any, Optional
+
 from jinja2 import Environment, FileSystemLoader
 from pydantic import EmailStr
 from faststream.rabbit import RabbitRouter
@@ -11,19 +13,23 @@ router = RabbitRouter()
 async def send_email(
     email: EmailStr,
     payload: str,
+    template: str = "confirmation.html",
+    subject: str = "Cowork: space for students",
+    context: Optional[dict[str, Any]] = None,
 ):
 
     env = Environment(
         loader=FileSystemLoader("/app/templates"),  # обязателно / в начале
         autoescape=True,  # Автоматическое экранирование HTML
     )
-    template = env.get_template("confirmation.html")
+    template = env.get_template(template)
     html_content = template.render(
         code=payload,
+        **(context or {}),
     )
 
     email_backend.send_email(
         recipient=email,
-        subject="Cowork: space for students",
+        subject=subject,
         html_content=html_content,
     )
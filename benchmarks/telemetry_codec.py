@@ -0,0 +1,121 @@
+"""
+Сравнение форматов телеметрии по websocket: байты на проводе и CPU сервера на 10k кадров.
+
+    PYTHONPATH=. python benchmarks/telemetry_codec.py
+"""
+
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from app.schemas.telemetry import TelemetryUpload
+from app.schemas.telemetry_codec import (
+    JsonCodec,
+    MsgpackCodec,
+    msgpack,
+    pack_telemetry,
+)
+
+FRAMES = 10_000
+
+
+def make_payloads(count: int) -> list[dict]:
+    rnd = random.Random(42)
+    ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    sent = recv = 0
+    payloads = []
+    for _ in range(count):
+        ts += timedelta(seconds=5)
+        sent += rnd.randint(10_000, 1_000_000)
+        recv += rnd.randint(10_000, 5_000_000)
+        payloads.append(
+            {
+                "ts": ts.isoformat(),
+                "cpu": {
+                    "temperature_c": round(rnd.uniform(35, 90), 1),
+                    "pct": round(rnd.uniform(0, 100), 1),
+                    "freq_mhz": float(rnd.choice((2400, 3200, 4100))),
+                },
+                "memory": {
+                    "total_mb": 16384.0,
+                    "used_mb": round(rnd.uniform(2000, 15000), 1),
+                    "pct": round(rnd.uniform(10, 95), 1),
+                },
+                "disk": {
+                    "mount": "/",
+                    "total_mb": 512000.0,
+                    "used_mb": round(rnd.uniform(100000, 500000), 1),
+                    "free_mb": round(rnd.uniform(10000, 400000), 1),
+                    "used_pct": round(rnd.uniform(20, 99), 1),
+                },
+                "sensors": {"fan_rpm": rnd.randint(800, 3000)},
+                "network": {
+                    "bytes_sent_total": sent,
+                    "bytes_recv_total": recv,
+                    "down_mbps": round(rnd.uniform(0, 100), 3),
+                    "up_mbps": round(rnd.uniform(0, 20), 3),
+                },
+            }
+        )
+    return payloads
+
+
+def deflated_size(frames: list[bytes]) -> int:
+    # permessage-deflate с context takeover: один поток, sync flush на каждый кадр
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    total = 0
+    for frame in frames:
+        total += (
+            len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+        )
+    return total
+
+
+def server_cpu(codec, frames: list) -> float:
+    start = time.process_time()
+    for frame in frames:
+        msg = codec.decode(frame)
+        payload = msg["payload"]
+        TelemetryUpload(
+            device_id=1,
+            ts=payload["ts"],
+            cpu=payload["cpu"],
+            memory=payload["memory"],
+            disk=payload["disk"],
+            sensors=payload["sensors"],
+            network=payload["network"],
+        )
+        codec.encode({"type": "ack", "ts": payload["ts"]})
+    return time.process_time() - start
+
+
+def main() -> None:
+    payloads = make_payloads(FRAMES)
+
+    formats = {
+        "json": (
+            JsonCodec(),
+            [
+                json.dumps({"type": "telemetry", "payload": p}).encode()
+                for p in payloads
+            ],
+        ),
+    }
+    if msgpack is not None:
+        formats["msgpack"] = (
+            MsgpackCodec(),
+            [msgpack.packb(pack_telemetry(p)) for p in payloads],
+        )
+
+    print(f"{FRAMES} frames")
+    print(f"{'format':<10}{'bytes':>12}{'deflate':>12}{'cpu, ms':>10}")
+    for name, (codec, frames) in formats.items():
+        size = sum(len(frame) for frame in frames)
+        cpu = server_cpu(codec, frames) * 1000
+        print(f"{name:<10}{size:>12}{deflated_size(frames):>12}{cpu:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Выгрузка телеметрии: строк в секунду и пиковый RSS для каждого формата.
+Строки генерируются пачками, как их отдает серверный курсор, так что измеряется
+кодирование и то, что память не растет с числом строк. Каждый формат - в отдельном
+процессе, чтобы пиковый RSS не смешивался.
+
+    PYTHONPATH=. python benchmarks/telemetry_export.py [строк]
+"""
+
+import multiprocessing
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.schemas.telemetry_export import ExportFormat, make_writer, pyarrow
+
+ROWS = 1_000_000
+
+
+def make_chunks(count: int, chunk_size: int):
+    rnd = random.Random(42)
+    ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    sent = recv = 0
+    for first in range(0, count, chunk_size):
+        chunk = []
+        for id in range(first, min(first + chunk_size, count)):
+            ts += timedelta(seconds=5)
+            sent += rnd.randint(10_000, 1_000_000)
+            recv += rnd.randint(10_000, 5_000_000)
+            chunk.append(
+                (
+                    id,
+                    1,
+                    ts,
+                    round(rnd.uniform(0, 100), 1),
+                    3200.0,
+                    round(rnd.uniform(35, 90), 1),
+                    16384.0,
+                    round(rnd.uniform(2000, 15000), 1),
+                    round(rnd.uniform(10, 95), 1),
+                    512000.0,
+                    round(rnd.uniform(100000, 500000), 1),
+                    round(rnd.uniform(10000, 400000), 1),
+                    round(rnd.uniform(20, 99), 1),
+                    rnd.randint(800, 3000),
+                    sent,
+                    recv,
+                    round(rnd.uniform(0, 100), 3),
+                    round(rnd.uniform(0, 20), 3),
+                    {"disk": {"mount": "/"}},
+                )
+            )
+        yield chunk
+
+
+def run(format: ExportFormat, rows: int, results) -> None:
+    chunk_size = settings.telemetry.export_chunk_size
+    # генерация строк не входит в замер - это работа бд
+    chunks = make_chunks(rows, chunk_size)
+    writer = make_writer(
+        format=format, row_group_size=settings.telemetry.export_row_group_size
+    )
+
+    elapsed = 0.0
+    size = len(writer.open())
+    for chunk in chunks:
+        start = time.perf_counter()
+        size += len(writer.write(chunk))
+        elapsed += time.perf_counter() - start
+
+    start = time.perf_counter()
+    size += len(writer.close())
+    elapsed += time.perf_counter() - start
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB в Linux
+    results.put((format.value, rows / elapsed, size / 2**20, rss))
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    formats = [ExportFormat.CSV, ExportFormat.NDJSON]
+    if pyarrow is not None:
+        formats.append(ExportFormat.PARQUET)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+
+    print(f"{rows} rows")
+    print(f"{'format':<10}{'rows/s':>12}{'size, MB':>12}{'peak RSS, MB':>15}")
+    for format in formats:
+        process = context.Process(target=run, args=(format, rows, results))
+        process.start()
+        name, speed, size, rss = results.get()
+        process.join()
+        print(f"{name:<10}{speed:>12.0f}{size:>12.1f}{rss:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import asyncio
+import itertools
 import json
+from collections import deque
 import os
 import socket
 from datetime import datetime, timezone
@@ -12,7 +14,13 @@ import glob
 import sys
 from typing import Optional
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 BACKEND = os.getenv("BACKEND", "localhost:8000/api/v1")
+ACK_MODE = os.getenv("ACK_MODE", "buffered")  # receipt | buffered | durable
 
 # корректная база для exe/скрипта
 if getattr(sys, "frozen", False):
@@ -299,6 +307,52 @@ def read_network():
     }
 
 
+JSON_PROTOCOL = "ims.json.v1"
+MSGPACK_PROTOCOL = "ims.msgpack.v1"
+
+TELEMETRY_FRAME = 0
+
+# должна совпадать с TELEMETRY_SCHEMA на сервере (app/schemas/telemetry_codec.py)
+TELEMETRY_SCHEMA = (
+    ("cpu", ("pct", "freq_mhz", "temperature_c")),
+    ("memory", ("total_mb", "used_mb", "pct")),
+    ("disk", ("mount", "total_mb", "used_mb", "free_mb", "used_pct")),
+    ("sensors", ("fan_rpm",)),
+    ("network", ("bytes_sent_total", "bytes_recv_total", "down_mbps", "up_mbps")),
+)
+
+
+def encode(msg, protocol):
+    if protocol != MSGPACK_PROTOCOL:
+        return json.dumps(msg)
+
+    if msg.get("type") != "telemetry":
+        return msgpack.packb(msg)
+
+    data = msg["payload"]
+    frame = [TELEMETRY_FRAME, datetime.fromisoformat(data["ts"]).timestamp()]
+    for section, fields in TELEMETRY_SCHEMA:
+        values = data.get(section)
+        if values is None:
+            frame.append(None)
+            continue
+        packed = [values.get(f) for f in fields]
+        # поля вне схемы - словарем в конце секции, сервер положит их в extra
+        unknown = {k: v for k, v in values.items() if k not in fields}
+        if unknown:
+            packed.append(unknown)
+        frame.append(packed)
+    if "seq" in msg:
+        frame.append(msg["seq"])
+    return msgpack.packb(frame)
+
+
+def decode(data, protocol):
+    if protocol == MSGPACK_PROTOCOL:
+        return msgpack.unpackb(data)
+    return json.loads(data)
+
+
 def payload():
     return {
         "type": "telemetry",
@@ -313,26 +367,96 @@ def payload():
     }
 
 
+SAMPLE_INTERVAL_SEC = 5
+WINDOW = 256  # сколько кадров можно отправить, не дожидаясь подтверждения
+# неподтвержденные кадры переживают переподключение (сутки при интервале 5 с)
+BACKLOG = deque(maxlen=24 * 60 * 60 // SAMPLE_INTERVAL_SEC)
+SEQ = itertools.count(1)
+
+
+async def collect(changed: asyncio.Event):
+    while True:
+        msg = await asyncio.to_thread(payload)
+        msg["seq"] = next(SEQ)
+        BACKLOG.append(msg)
+        changed.set()
+        await asyncio.sleep(SAMPLE_INTERVAL_SEC)
+
+
+async def stream(ws, protocol, changed: asyncio.Event):
+    # после переподключения заново отправляем все, что не было подтверждено
+    sent = BACKLOG[0]["seq"] - 1 if BACKLOG else 0
+
+    async def receive_acks():
+        while True:
+            msg = decode(await ws.recv(), protocol)
+            if msg.get("type") == "ack" and "seq" in msg:
+                print("ACK:", msg["seq"])
+                while BACKLOG and BACKLOG[0]["seq"] <= msg["seq"]:
+                    BACKLOG.popleft()
+                changed.set()
+            elif msg.get("type") == "nack" and "seq" in msg:
+                print("NACK:", msg["seq"], msg.get("reason"))
+                for i, frame in enumerate(BACKLOG):
+                    if frame["seq"] == msg["seq"]:
+                        del BACKLOG[i]
+                        # без retry сервер не сохранит кадр никогда, иначе
+                        # отправляем его заново под новым номером: следующий
+                        # кумулятивный ack накроет и старый
+                        if msg.get("retry"):
+                            frame["seq"] = next(SEQ)
+                            BACKLOG.append(frame)
+                        break
+                changed.set()
+
+    receiver = asyncio.create_task(receive_acks())
+    try:
+        while not receiver.done():
+            changed.clear()
+            for msg in list(BACKLOG):
+                if msg["seq"] <= sent:
+                    continue
+                if sent - BACKLOG[0]["seq"] + 1 >= WINDOW:
+                    break
+                await ws.send(encode(msg, protocol))
+                sent = msg["seq"]
+
+            waiter = asyncio.create_task(changed.wait())
+            await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+        receiver.result()
+    finally:
+        receiver.cancel()
+
+
 async def run(uri: str):
+    changed = asyncio.Event()
+    collector = asyncio.create_task(collect(changed))
+
     attempts = 5
     while True:
         if attempts == 0:
+            collector.cancel()
             raise Exception("Attempts exceeded")
         try:
             async with websockets.connect(
-                uri, ping_interval=20, ping_timeout=20, close_timeout=20
+                uri,
+                ping_interval=20,
+                ping_timeout=20,
+                close_timeout=20,
+                subprotocols=(
+                    [MSGPACK_PROTOCOL, JSON_PROTOCOL] if msgpack else [JSON_PROTOCOL]
+                ),
             ) as ws:
                 TOKEN_PATH.write_text(SAVED_TOKEN, encoding="utf-8")
+                protocol = ws.subprotocol
                 while True:
                     data = await ws.recv()
-                    print(data)
-                    msg = json.loads(data)
+                    msg = decode(data, protocol)
+                    print(msg)
                     if msg.get("type") == "telemetry":
-                        while True:
-                            await ws.send(json.dumps(payload()))
-                            ack = await ws.recv()
-                            print("ACK:", ack)
-                            await asyncio.sleep(5)
+                        attempts = 5
+                        await stream(ws, protocol, changed)
         except Exception:
             pass
         await asyncio.sleep(10)
@@ -349,5 +473,5 @@ if not SAVED_TOKEN:
         SAVED_TOKEN = response.json()["token"]
         print(f"Claim token: {SAVED_TOKEN}")
 
-uri = f"ws://{BACKEND}/telemetry/?token={SAVED_TOKEN}"
+uri = f"ws://{BACKEND}/telemetry/?token={SAVED_TOKEN}&ack={ACK_MODE}"
 asyncio.run(run(uri))
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from app.schemas.alert import AlertEvent, AlertRuleResponse, AlertState
+from app.schemas.device import DeviceIdentity
+from app.schemas.telemetry import TelemetryUpload
+from app.services.alert_engine import AlertEngine
+from app.subs.alerts import AlertDispatcher
+
+
+class WebhookStub(ThreadingHTTPServer):
+    """Локальный webhook: отвечает статусами из statuses по очереди, потом 200"""
+
+    def __init__(self, statuses: list[int]):
+        self.statuses = list(statuses)
+        self.received: list[dict] = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(handler):
+                body = handler.rfile.read(int(handler.headers["Content-Length"]))
+                self.received.append(json.loads(body))
+                code = self.statuses.pop(0) if self.statuses else 200
+                handler.send_response(code)
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/hook"
+
+
+@pytest.fixture
+def webhook():
+    servers = []
+
+    def start(statuses: list[int] = ()) -> WebhookStub:
+        server = WebhookStub(statuses)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class EmailPublisher:
+    def __init__(self):
+        self.messages: list[dict] = []
+
+    async def publish(self, message: dict):
+        self.messages.append(message)
+
+
+class UsersRepository:
+    async def get_one_or_none(self, session, id: int):
+        return SimpleNamespace(id=id, email=f"user{id}@example.com")
+
+
+class Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+def make_dispatcher(**kwargs) -> tuple[AlertDispatcher, EmailPublisher]:
+    publisher = EmailPublisher()
+    kwargs = {
+        "digest_interval": 0.2,
+        "timeout": 2.0,
+        "attempts": 3,
+        "backoff": 0.01,
+        "max_backoff": 0.05,
+    } | kwargs
+    dispatcher = AlertDispatcher(
+        email_publisher=publisher,
+        users_repository=UsersRepository(),
+        session_factory=Session,
+        **kwargs,
+    )
+    return dispatcher, publisher
+
+
+def make_event(
+    state: AlertState = AlertState.FIRED,
+    device_id: int = 1,
+    webhook_url: str | None = None,
+    notify_email: bool = True,
+    since: datetime | None = None,
+) -> AlertEvent:
+    ts = datetime.now(timezone.utc)
+    return AlertEvent(
+        state=state,
+        rule_id=1,
+        owner_id=7,
+        device_id=device_id,
+        rule_name="hot cpu",
+        expression="cpu.pct > 90",
+        metric="cpu.pct",
+        value=95.0,
+        since=since or ts,
+        ts=ts,
+        notify_email=notify_email,
+        webhook_url=webhook_url,
+    )
+
+
+@pytest.mark.anyio
+async def test_webhook_is_retried_until_delivered(webhook):
+    server = webhook([500, 503])
+    dispatcher, publisher = make_dispatcher()
+    await dispatcher.start()
+
+    dispatcher.handle(make_event(webhook_url=server.url, notify_email=False))
+    await dispatcher.stop()
+
+    assert len(server.received) == 3
+    assert server.received[-1]["digest"] is False
+    assert server.received[-1]["events"][0]["rule_id"] == 1
+    assert publisher.messages == []
+
+
+@pytest.mark.anyio
+async def test_webhook_client_error_is_not_retried(webhook):
+    server = webhook([404])
+    dispatcher, _ = make_dispatcher()
+    await dispatcher.start()
+
+    dispatcher.handle(make_event(webhook_url=server.url, notify_email=False))
+    await dispatcher.stop()
+
+    assert len(server.received) == 1
+
+
+@pytest.mark.anyio
+async def test_repeated_state_is_delivered_once():
+    dispatcher, publisher = make_dispatcher()
+    await dispatcher.start()
+
+    # повтор события брокером и повтор после переподключения движка
+    event = make_event()
+    dispatcher.handle(event)
+    dispatcher.handle(event.model_copy())
+    await dispatcher.stop()
+
+    assert len(publisher.messages) == 1
+    message = publisher.messages[0]
+    assert message["email"] == "user7@example.com"
+    assert message["template"] == "alert.html"
+
+
+@pytest.mark.anyio
+async def test_next_breach_fires_after_lost_resolved():
+    dispatcher, publisher = make_dispatcher()
+    await dispatcher.start()
+
+    # resolved первого нарушения потерялся, второе нарушение - новое событие
+    start = datetime.now(timezone.utc)
+    dispatcher.handle(make_event(since=start))
+    dispatcher.handle(make_event(since=start + timedelta(minutes=5)))
+    await dispatcher.stop()
+
+    assert len(publisher.messages) == 2
+
+
+@pytest.mark.anyio
+async def test_events_within_window_are_sent_as_digest(webhook):
+    server = webhook()
+    dispatcher, publisher = make_dispatcher()
+    await dispatcher.start()
+
+    dispatcher.handle(make_event(device_id=1, webhook_url=server.url))
+    for device_id in (2, 3):
+        dispatcher.handle(make_event(device_id=device_id, webhook_url=server.url))
+    dispatcher.handle(
+        make_event(state=AlertState.RESOLVED, device_id=1, webhook_url=server.url)
+    )
+    # окно закрывается flush-циклом, не остановкой
+    await asyncio.sleep(1.5)
+
+    assert [len(hook["events"]) for hook in server.received] == [1, 3]
+    digest = server.received[1]
+    assert digest["digest"] is True
+    assert digest["summary"] == "hot cpu: 2 fired, 1 resolved"
+    assert len(publisher.messages) == 2
+
+    await dispatcher.stop()
+    assert len(server.received) == 2
+
+
+class StateStorage:
+    """Общий для движков Redis в памяти: переход из скрипта _TRANSITION"""
+
+    def __init__(self):
+        self.hashes: dict[str, dict] = {}
+
+    def register_script(self, script: str):
+        return script
+
+    async def run_script_many(self, script, calls) -> list:
+        return [self._transition(*call) for call in calls]
+
+    def _transition(self, keys: list, args: list):
+        (key,) = keys
+        _, breached, first, last, duration = args
+        state = self.hashes.get(key, {})
+        if "ts" in state and state["ts"] >= last:
+            return None
+        if not breached:
+            self.hashes.pop(key, None)
+            return ["resolved", str(state["since"])] if "firing" in state else None
+
+        state = self.hashes.setdefault(key, {"since": first})
+        state["ts"] = last
+        if "firing" in state or last - state["since"] < duration:
+            return None
+        state["firing"] = 1
+        return ["fired", str(state["since"])]
+
+
+class RulesRepository:
+    async def get_enabled(self, session) -> list[AlertRuleResponse]:
+        return [
+            AlertRuleResponse(
+                id=1,
+                owner_id=7,
+                device_id=None,
+                name="hot cpu",
+                metric="cpu.pct",
+                operator=">",
+                threshold=90,
+                duration_sec=60,
+                enabled=True,
+                notify_email=True,
+                webhook_url=None,
+                created_at=datetime.now(timezone.utc),
+            )
+        ]
+
+
+def cpu_sample(ts: datetime, value: float) -> TelemetryUpload:
+    return TelemetryUpload(
+        device_id=1,
+        ts=ts,
+        cpu={"pct": value},
+        memory={},
+        disk={},
+        sensors={},
+        network={},
+    )
+
+
+def drain(engine: AlertEngine) -> list[AlertEvent]:
+    events = []
+    while not engine._outbox.empty():
+        events.append(engine._outbox.get_nowait())
+    return events
+
+
+@pytest.mark.anyio
+async def test_alert_follows_device_to_another_worker():
+    storage = StateStorage()
+    engines = [
+        AlertEngine(
+            repository=RulesRepository(),
+            session_factory=Session,
+            cache_storage=storage,
+            publisher=EmailPublisher(),
+        )
+        for _ in range(2)
+    ]
+    for engine in engines:
+        await engine.load()
+    device = DeviceIdentity(id=1, owner_id=7)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    # нарушение началось на первом воркере
+    engines[0].evaluate(device, cpu_sample(start, 95))
+    await engines[0].flush()
+    # устройство переподключилось ко второму, нарушение продолжилось
+    for minutes in (1, 2):
+        engines[1].evaluate(device, cpu_sample(start + timedelta(minutes=minutes), 97))
+    await engines[1].flush()
+    assert drain(engines[0]) == []
+    assert [event.state for event in drain(engines[1])] == [AlertState.FIRED]
+
+    # и вернулось на первый уже восстановившимся
+    engines[0].evaluate(device, cpu_sample(start + timedelta(minutes=3), 20))
+    await engines[0].flush()
+    (event,) = drain(engines[0])
+    assert event.state == AlertState.RESOLVED
+    assert event.since == start
+    assert storage.hashes == {}
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.schemas.telemetry import TelemetryUpload
+from app.services.derived_metrics import DerivedMetrics, DeviceDerived
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = 300.0
+WINDOW = 3600.0
+BUCKETS = 12
+
+
+def sample(seconds: float, device_id: int = 1, **sections) -> TelemetryUpload:
+    return TelemetryUpload(
+        device_id=device_id,
+        ts=START + timedelta(seconds=seconds),
+        cpu=sections.get("cpu", {}),
+        memory=sections.get("memory", {}),
+        disk=sections.get("disk", {}),
+        sensors={},
+        network=sections.get("network", {}),
+    )
+
+
+def feed(state: DeviceDerived, samples: list[TelemetryUpload]) -> None:
+    for telemetry in samples:
+        state.update(
+            telemetry=telemetry, half_life=HALF_LIFE, window=WINDOW, buckets=BUCKETS
+        )
+
+
+def test_ewma_weights_by_time():
+    state = DeviceDerived()
+    feed(state, [sample(0, cpu={"pct": 0}), sample(HALF_LIFE, cpu={"pct": 100})])
+
+    # через период полураспада до нового значения остается половина пути
+    assert state.values(window=WINDOW, buckets=BUCKETS).cpu_pct_ewma == 50
+
+
+def test_disk_trend_and_full_eta():
+    state = DeviceDerived()
+    # 1% в час, с 50% - заполнится через 50 часов от последнего образца
+    feed(
+        state,
+        [sample(t, disk={"used_pct": 50 + t / 3600}) for t in range(0, 7200, 60)],
+    )
+    values = state.values(window=WINDOW, buckets=BUCKETS)
+
+    assert values.disk_used_pct_per_hour == pytest.approx(1.0)
+    last = 50 + 7140 / 3600
+    assert values.disk_full_in_hours == pytest.approx(100 - last)
+    assert values.memory_pct_per_hour is None
+
+
+def test_trend_needs_data_for_a_bucket():
+    state = DeviceDerived()
+    feed(state, [sample(0, disk={"used_pct": 50}), sample(60, disk={"used_pct": 51})])
+
+    assert state.values(window=WINDOW, buckets=BUCKETS).disk_full_in_hours is None
+
+
+def test_counter_rate_survives_reset():
+    state = DeviceDerived()
+    feed(
+        state,
+        [
+            sample(0, network={"bytes_sent_total": 1000}),
+            sample(10, network={"bytes_sent_total": 6000}),
+        ],
+    )
+    assert state.values(window=WINDOW, buckets=BUCKETS).net_sent_bytes_per_sec == 500
+
+    # агент перезапустился: счетчик начался заново
+    feed(state, [sample(20, network={"bytes_sent_total": 2000})])
+    assert state.values(window=WINDOW, buckets=BUCKETS).net_sent_bytes_per_sec == 200
+
+
+def test_older_samples_are_ignored():
+    state = DeviceDerived()
+    feed(state, [sample(100, cpu={"pct": 10}), sample(50, cpu={"pct": 90})])
+
+    assert state.values(window=WINDOW, buckets=BUCKETS).cpu_pct_ewma == 10
+
+
+class CacheStorage:
+    """Хэши в памяти вместо Redis"""
+
+    def __init__(self):
+        self.hashes: dict[str, dict] = {}
+
+    def register_script(self, script: str):
+        return script
+
+    async def hgetall_many(self, keys: list[str]) -> list[dict]:
+        return [dict(self.hashes.get(key, {})) for key in keys]
+
+    async def run_script_many(self, script, calls) -> list:
+        for (key,), (ttl, ts, state) in calls:
+            current = self.hashes.get(key)
+            if not current or float(current["ts"]) < float(ts):
+                self.hashes[key] = {"ts": ts, "state": state}
+        return [1] * len(calls)
+
+
+@pytest.mark.anyio
+async def test_state_is_restored_after_restart():
+    storage = CacheStorage()
+    options = dict(half_life=HALF_LIFE, window=WINDOW, buckets=BUCKETS)
+
+    first = DerivedMetrics(cache_storage=storage, **options)
+    first.update(sample(0, network={"bytes_recv_total": 0}))
+    await first.stop()
+
+    second = DerivedMetrics(cache_storage=storage, **options)
+    second.update(sample(10, network={"bytes_recv_total": 100}))
+    await second.stop()
+
+    (values,) = (await second.get_many([1])).values()
+    assert values.net_recv_bytes_per_sec == 10
@@ -0,0 +1,373 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.schemas.telemetry import TelemetryUpload
+from app.services.devices_service import DevicesService
+from app.services.latest_telemetry import FLEET_METRICS, LatestTelemetry
+from app.services.presence_tracker import (
+    DEADLINES_KEY,
+    OWNERS_KEY,
+    PRESENCE_CHANNEL,
+    SINCE_KEY,
+    PresenceTracker,
+)
+
+TTL = 60
+
+
+class CacheStorage:
+    """Общий для "воркеров" Redis в памяти: ключи без TTL, сроки - в sorted set,
+    скрипты присутствия и последнего образца повторены по ключам вызова"""
+
+    def __init__(self):
+        self.values: dict[str, str] = {}
+        self.deadlines: dict[str, float] = {}
+        self.since: dict[str, str] = {}
+        self.owners: dict[str, str] = {}
+        self.published: list[tuple[str, dict]] = []
+        self.latest: dict[str, dict[str, str]] = {}
+        self.online: dict[str, set[str]] = {}
+        self.fleet: dict[str, dict[str, float]] = {}
+
+    def register_script(self, script: str):
+        return script
+
+    async def run_script_many(self, script, calls) -> list:
+        return [self._run(*call) for call in calls]
+
+    def _run(self, keys: list, args: list):
+        if keys[0] == SINCE_KEY:
+            return self._offline(keys, args)
+        if keys[1] == DEADLINES_KEY:
+            return self._heartbeat(keys, args)
+        return self._set_latest(keys, args)
+
+    def _heartbeat(self, keys: list, args: list) -> int:
+        key, _, since, owners, fleet, latest = keys
+        assert (since, owners) == (SINCE_KEY, OWNERS_KEY)
+        ttl, deadline, value, device_id, now, owner_id = args
+        device = str(device_id)
+        self.values[key] = value
+        added = int(device not in self.deadlines)
+        self.deadlines[device] = deadline
+        if added:
+            self.since[device] = str(now)
+        if added or device not in self.owners:
+            self.owners[device] = str(owner_id)
+            self._join(f"{fleet}:{owner_id}", device, latest)
+        return added
+
+    def _offline(self, keys: list, args: list) -> str | None:
+        _, _, key, _, fleet = keys
+        device = str(args[0])
+        self.values.pop(key, None)
+        if self.deadlines.pop(device, None) is None:
+            return None
+        owner_id = self.owners.pop(device, None)
+        if owner_id is not None:
+            self._leave(f"{fleet}:{owner_id}", device)
+        return self.since.pop(device, "")
+
+    def _set_latest(self, keys: list, args: list) -> int:
+        latest, fleet = keys
+        _, ts, device_id, *pairs = args
+        device = str(device_id)
+        self.latest[latest] = {"ts": str(ts), **dict(zip(pairs[::2], pairs[1::2]))}
+        if device in self.online.get(fleet, set()):
+            self._join(fleet, device, latest)
+        return 1
+
+    def _join(self, fleet: str, device: str, latest: str) -> None:
+        self.online.setdefault(fleet, set()).add(device)
+        sample = self.latest.get(latest, {})
+        for metric in FLEET_METRICS:
+            index = self.fleet.setdefault(f"{fleet}:{metric}", {})
+            index.pop(device, None)
+            if metric in sample:
+                index[device] = json.loads(sample[metric])
+
+    def _leave(self, fleet: str, device: str) -> None:
+        self.online.get(fleet, set()).discard(device)
+        for metric in FLEET_METRICS:
+            self.fleet.get(f"{fleet}:{metric}", {}).pop(device, None)
+
+    async def hget(self, key: str, attr: str) -> str | None:
+        assert key == SINCE_KEY
+        return self.since.get(attr)
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        fleet = key.removesuffix(":totals")
+        totals = {}
+        for metric in FLEET_METRICS:
+            values = self.fleet.get(f"{fleet}:{metric}", {}).values()
+            if values:
+                totals[f"{metric}:count"] = str(len(values))
+                totals[f"{metric}:sum"] = str(sum(values))
+        return totals
+
+    async def scard(self, key: str) -> int:
+        return len(self.online.get(key.removesuffix(":online"), set()))
+
+    async def zrevrange_many(self, keys: list[str], count: int) -> list:
+        return [
+            sorted(self.fleet.get(key, {}).items(), key=lambda m: m[1], reverse=True)[
+                :count
+            ]
+            for key in keys
+        ]
+
+    async def zrangebyscore(
+        self, key: str, max: float, count: int
+    ) -> list[tuple[str, float]]:
+        assert key == DEADLINES_KEY
+        expired = [(m, d) for m, d in self.deadlines.items() if d <= max]
+        return expired[:count]
+
+    async def get_many(self, keys: list[str]) -> list:
+        return [json.loads(self.values[k]) if k in self.values else None for k in keys]
+
+    async def publish_many(self, messages):
+        self.published.extend(messages)
+
+    def expire(self, device_id: int, online: float = 0) -> None:
+        # TTL ключа и срок в sorted set истекли: последний пульс был ttl назад,
+        # а сессия до него длилась online секунд
+        member = str(device_id)
+        self.values.pop(f"presence:{device_id}", None)
+        self.deadlines[member] = time.time()
+        self.since[member] = str(self.deadlines[member] - TTL - online)
+
+
+class DevicesRepository:
+    def __init__(self):
+        self.columns: dict[str, dict] = {"last_seen_at": {}, "status": {}}
+        self.patches = 0
+        self.intervals: list = []
+        self.deleted: set[int] = set()
+        self.down = False
+
+    async def patch_many(self, session, column_name: str, data: dict):
+        self.patches += bool(data)
+        self.columns[column_name].update(data)
+
+    async def add_many(self, session, schemas: list):
+        # как и вставка в бд, пропускает сессии удаленных устройств
+        if self.down:
+            raise ConnectionError("database is down")
+        self.intervals.extend(s for s in schemas if s.device_id not in self.deleted)
+
+    async def count(self, session, owner_id: int) -> int:
+        return 3
+
+    async def get_names(self, session, ids: list[int]) -> dict[int, str]:
+        return {device_id: f"device{device_id}" for device_id in ids}
+
+
+class Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+def make_tracker(storage: CacheStorage, repository: DevicesRepository, **kwargs):
+    return PresenceTracker(
+        repository=repository,
+        connectivity_repository=repository,
+        session_factory=Session,
+        cache_storage=storage,
+        ttl=TTL,
+        **kwargs,
+    )
+
+
+@pytest.mark.anyio
+async def test_expired_device_goes_offline_once():
+    storage, repository = CacheStorage(), DevicesRepository()
+    workers = [make_tracker(storage, repository) for _ in range(2)]
+
+    workers[0].touch(device_id=1, owner_id=7)
+    await workers[0].flush()
+    assert repository.columns["status"] == {1: "online"}
+    assert 1 in await workers[1].get_many([1, 2])
+
+    # воркер с сокетом упал: пульсов больше нет, уборку делают все остальные
+    storage.expire(1)
+    for worker in workers:
+        await worker.flush()
+
+    assert repository.columns["status"] == {1: "offline"}
+    assert await workers[1].get_many([1]) == {}
+    offline = [m for c, m in storage.published if m["status"] == "offline"]
+    assert [m["device_id"] for m in offline] == [1]
+    assert {c for c, _ in storage.published} == {PRESENCE_CHANNEL}
+
+
+@pytest.mark.anyio
+async def test_heartbeat_is_not_a_transition():
+    storage, repository = CacheStorage(), DevicesRepository()
+    tracker = make_tracker(storage, repository)
+
+    for _ in range(3):
+        tracker.touch(device_id=1, owner_id=7)
+        await tracker.flush()
+
+    assert len(storage.published) == 1
+    assert 1 in repository.columns["last_seen_at"]
+
+
+@pytest.mark.anyio
+async def test_disconnect_does_not_wait_for_ttl():
+    storage, repository = CacheStorage(), DevicesRepository()
+    tracker = make_tracker(storage, repository)
+
+    tracker.touch(device_id=1, owner_id=7)
+    await tracker.flush()
+    tracker.disconnect(device_id=1)
+    await tracker.flush()
+
+    assert repository.columns["status"] == {1: "offline"}
+    assert await tracker.get_many([1]) == {}
+
+
+@pytest.mark.anyio
+async def test_closed_session_is_written_once():
+    storage, repository = CacheStorage(), DevicesRepository()
+    workers = [make_tracker(storage, repository) for _ in range(2)]
+
+    workers[0].touch(device_id=1, owner_id=7)
+    await workers[0].flush()
+    assert await workers[1].get_since(device_id=1) is not None
+    assert repository.intervals == []
+
+    # сессия закончилась, когда пришел последний пульс, а не когда истек TTL
+    storage.expire(1, online=3600)
+    for worker in workers:
+        await worker.flush()
+
+    (interval,) = repository.intervals
+    assert interval.device_id == 1
+    online = interval.online_to - interval.online_from
+    assert abs(online - timedelta(seconds=3600)) < timedelta(milliseconds=1)
+    assert await workers[1].get_since(device_id=1) is None
+
+
+@pytest.mark.anyio
+async def test_sessions_of_deleted_device_do_not_block_others():
+    storage, repository = CacheStorage(), DevicesRepository()
+    tracker = make_tracker(storage, repository)
+
+    for device_id in (1, 2):
+        tracker.touch(device_id=device_id, owner_id=7)
+    await tracker.flush()
+    for device_id in (1, 2):
+        tracker.disconnect(device_id=device_id)
+    # устройство удалили, пока его сессия ждала записи
+    repository.deleted.add(2)
+    await tracker.flush()
+
+    assert [interval.device_id for interval in repository.intervals] == [1]
+    assert tracker._intervals == []
+
+
+@pytest.mark.anyio
+async def test_failed_flush_requeues_only_unwritten_sessions():
+    storage, repository = CacheStorage(), DevicesRepository()
+    tracker = make_tracker(storage, repository, max_pending_intervals=2)
+
+    for device_id in (1, 2, 3):
+        tracker.touch(device_id=device_id, owner_id=7)
+    await tracker.flush()
+    repository.down = True
+    for device_id in (1, 2, 3):
+        tracker.disconnect(device_id=device_id)
+    await tracker.flush()
+
+    # статусы записаны, в очереди только самые свежие сессии
+    patches = repository.patches
+    assert [interval.device_id for interval in tracker._intervals] == [2, 3]
+
+    repository.down = False
+    await tracker.flush()
+
+    assert repository.patches == patches
+    assert [interval.device_id for interval in repository.intervals] == [2, 3]
+
+
+def cpu_sample(device_id: int, value: float) -> TelemetryUpload:
+    return TelemetryUpload(
+        device_id=device_id,
+        ts=datetime.now(timezone.utc),
+        cpu={"pct": value},
+        memory={},
+        disk={},
+        sensors={},
+        network={},
+    )
+
+
+@pytest.mark.anyio
+async def test_overview_counts_only_live_devices():
+    storage, repository = CacheStorage(), DevicesRepository()
+    tracker = make_tracker(storage, repository)
+    latest = LatestTelemetry(cache_storage=storage)
+    service = DevicesService(
+        repository=repository,
+        cache_storage=storage,
+        token_cache=None,
+        device_events=None,
+        latest=latest,
+        derived=None,
+        presence=tracker,
+        connectivity_repository=repository,
+    )
+    # образцы записаны раньше, чем устройства отметились на связи
+    for device_id, value in ((1, 20.0), (2, 40.0), (3, 99.0)):
+        latest.update(owner_id=7, telemetry=cpu_sample(device_id, value))
+    await latest.flush()
+    for device_id in (1, 2, 3):
+        tracker.touch(device_id=device_id, owner_id=7)
+    await tracker.flush()
+    # третье давно не на связи и уходит из индекса
+    storage.expire(3)
+    await tracker.flush()
+
+    overview = await service.get_overview(user_id=7, top=5, session=Session())
+
+    assert (overview.total, overview.online, overview.offline) == (3, 2, 1)
+    assert overview.averages["cpu.pct"] == 30.0
+    assert [rank.id for rank in overview.top["cpu.pct"]] == [2, 1]
+    assert overview.averages["memory.pct"] is None
+
+    # новый образец устройства на связи сразу меняет индекс
+    latest.update(owner_id=7, telemetry=cpu_sample(1, 60.0))
+    await latest.flush()
+
+    overview = await service.get_overview(user_id=7, top=1, session=Session())
+
+    assert overview.averages["cpu.pct"] == 50.0
+    assert [rank.id for rank in overview.top["cpu.pct"]] == [1]
+
+
+def test_availability_merges_sessions_and_lists_outages():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    hour = timedelta(hours=1)
+    online_sec, outages = DevicesService._availability(
+        intervals=[
+            (start + 5 * hour, start + 8 * hour),
+            (start - hour, start + 2 * hour),  # началась до периода
+            (start + 6 * hour, start + 7 * hour),  # внутри другой сессии
+        ],
+        start=start,
+        end=start + 10 * hour,
+    )
+
+    assert online_sec == (5 * hour).total_seconds()
+    assert [(o.start - start, o.end - start) for o in outages] == [
+        (2 * hour, 5 * hour),
+        (8 * hour, 10 * hour),
+    ]
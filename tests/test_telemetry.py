@@ -0,0 +1,104 @@
+import json
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import settings
+from app.core.db_manager import db_manager
+from app.main import app
+from app.repositories.telemetry_repository import TelemetryRepository
+from app.schemas.telemetry import TelemetryPagination, encode_cursor
+from app.services import telemetry_partitions
+
+API = f"{settings.api.prefix}/v1"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as client:
+        yield client
+
+
+def claim_device(client: TestClient) -> str:
+    payload = {
+        "email": f"{uuid.uuid4().hex[:12]}@example.com",
+        "password": "StrongPass123!",
+    }
+    resp = client.post(f"{API}/users/sign-up", json=payload)
+    assert resp.status_code == status.HTTP_200_OK
+
+    resp = client.post(f"{API}/devices/token", json={"name": "ipc-01"})
+    assert resp.status_code == status.HTTP_200_OK
+    token = resp.json()["token"]
+
+    resp = client.post(f"{API}/devices/", params={"token": token})
+    assert resp.status_code == status.HTTP_201_CREATED
+    return token
+
+
+def test_ws_does_not_pin_db_connections(client: TestClient):
+    token = claim_device(client)
+    sockets_count = settings.db.pool_size + settings.db.max_overflow + 5
+
+    with ExitStack() as stack:
+        sockets = [
+            stack.enter_context(
+                client.websocket_connect(f"{API}/telemetry/?token={token}")
+            )
+            for _ in range(sockets_count)
+        ]
+
+        for ws in sockets:
+            assert ws.receive_json()["type"] == "telemetry"
+
+        assert db_manager.engine.pool.checkedout() == 0
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.anyio
+async def test_telemetry_page_is_index_range_scan(db_session: AsyncSession):
+    await db_manager.init_database()
+    await telemetry_partitions.maintain()
+
+    now = datetime.now(timezone.utc)
+    stmt = TelemetryRepository().filtered_query(
+        pagination=TelemetryPagination(limit=20, cursor=encode_cursor(now, 1)),
+        start=now - timedelta(days=1),
+        end=now,
+        device_id=1,
+    )
+    sql = stmt.compile(
+        dialect=db_session.bind.dialect, compile_kwargs={"literal_binds": True}
+    )
+
+    connection = await db_session.connection()
+    # на почти пустой таблице seq scan дешевле - проверяем, что запрос обслуживается индексом
+    await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    await connection.exec_driver_sql("SET LOCAL enable_bitmapscan = off")
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")
+    explain = result.scalar()
+    if isinstance(explain, str):
+        explain = json.loads(explain)
+
+    nodes = list(plan_nodes(explain[0]["Plan"]))
+    scans = [node for node in nodes if "Index Name" in node]
+
+    assert scans
+    # диапазон в сутки затрагивает не больше двух секций
+    assert len(scans) <= 2
+    for scan in scans:
+        assert scan["Node Type"] in ("Index Scan", "Index Only Scan")
+        assert "device_id_ts_id" in scan["Index Name"]
+        assert "ts" in scan["Index Cond"]
+    # порядок (ts, id) дает индекс, без сортировки и полного просмотра
+    assert not any(node["Node Type"] in ("Sort", "Seq Scan") for node in nodes)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.exceptions import TelemetryRejectedException
+from app.schemas.device import DeviceIdentity
+from app.schemas.telemetry import AckMode
+from app.schemas.telemetry_codec import JsonCodec
+from app.services.telemetry_acks import AckWindow
+from app.services.telemetry_service import TelemetryService
+
+
+@pytest.mark.anyio
+async def test_rejected_frame_is_nacked_before_cumulative_ack():
+    sent: list[dict] = []
+
+    async def send(message: dict):
+        sent.append(message)
+
+    acks = AckWindow(send=send)
+    stored = asyncio.get_running_loop().create_future()
+    acks.add(seq=1, done=stored)
+    acks.reject(seq=2, error=TelemetryRejectedException())
+    acks.add(seq=3)
+
+    # пока первый кадр не записан, не подтверждаем и не отклоняем ничего
+    await acks.flush()
+    assert sent == []
+
+    stored.set_result(None)
+    await acks.flush()
+    assert sent == [
+        {"type": "nack", "seq": 2, "reason": "Telemetry rejected", "retry": False},
+        {"type": "ack", "seq": 3},
+    ]
+
+
+class WebSocket:
+    def __init__(self):
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent: list[dict] = []
+
+    def frame(self, message: dict) -> None:
+        self.incoming.put_nowait(
+            {"type": "websocket.receive", "text": json.dumps(message)}
+        )
+
+    async def receive(self) -> dict:
+        return await self.incoming.get()
+
+    async def send_text(self, data: str):
+        self.sent.append(json.loads(data))
+
+    async def close(self, code: int, reason: str):
+        pass
+
+
+class Presence:
+    def touch(self, device_id: int, owner_id: int):
+        pass
+
+    def disconnect(self, device_id: int):
+        pass
+
+
+def make_service(gate: asyncio.Event) -> TelemetryService:
+    service = TelemetryService(
+        **dict.fromkeys(
+            (
+                "devices_repository",
+                "telemetry_repository",
+                "rollups_repository",
+                "cache_storage",
+                "buffer",
+                "session_factory",
+                "token_cache",
+                "device_events",
+                "hub",
+                "partitions",
+                "latest",
+                "derived",
+                "alerts",
+            )
+        ),
+        presence=Presence(),
+    )
+
+    async def accept(device, telemetry) -> asyncio.Future:
+        # прием кадра (буфер, кэши, алерты) еще не закончился
+        await gate.wait()
+        stored = asyncio.get_running_loop().create_future()
+        stored.set_result(None)
+        return stored
+
+    service._accept = accept
+    return service
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "ack_mode, before_accept",
+    [(AckMode.RECEIPT, [1]), (AckMode.BUFFERED, [])],
+)
+async def test_receipt_acks_before_the_frame_is_accepted(
+    monkeypatch, ack_mode, before_accept
+):
+    monkeypatch.setattr(settings.telemetry, "ack_interval", 0.05)
+    gate, ws = asyncio.Event(), WebSocket()
+    service = make_service(gate)
+    handler = asyncio.create_task(
+        service._handle_telemetry(
+            device=DeviceIdentity(id=1, owner_id=7),
+            ws=ws,
+            codec=JsonCodec(),
+            ack_mode=ack_mode,
+        )
+    )
+
+    ws.frame(
+        {
+            "type": "telemetry",
+            "seq": 1,
+            "payload": {
+                "ts": "2025-01-01T00:00:00+00:00",
+                "cpu": {},
+                "memory": {},
+                "disk": {},
+                "sensors": {},
+                "network": {},
+            },
+        }
+    )
+    await asyncio.sleep(0.2)
+    acked = [m["seq"] for m in ws.sent if m["type"] == "ack"]
+    assert acked == before_accept
+
+    gate.set()
+    await asyncio.sleep(0.2)
+    acked = [m["seq"] for m in ws.sent if m["type"] == "ack"]
+    assert acked == [1]
+
+    ws.incoming.put_nowait({"type": "websocket.disconnect"})
+    await handler
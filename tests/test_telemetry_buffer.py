@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.core.exceptions import TelemetryRejectedException
+from app.schemas.telemetry import TelemetryUpload
+from app.services.telemetry_buffer import TelemetryBuffer
+
+
+class TelemetryRepository:
+    """Строки удаленного устройства нарушают внешний ключ"""
+
+    def __init__(self, deleted: int):
+        self.deleted = deleted
+        self.rows: list[TelemetryUpload] = []
+
+    async def add_many(self, session, schemas: list[TelemetryUpload]):
+        if any(row.device_id == self.deleted for row in schemas):
+            raise IntegrityError("INSERT", None, Exception("foreign key"))
+        self.rows.extend(schemas)
+
+
+class Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+def sample(device_id: int) -> TelemetryUpload:
+    return TelemetryUpload(
+        device_id=device_id,
+        ts=datetime.now(timezone.utc),
+        cpu={},
+        memory={},
+        disk={},
+        sensors={},
+        network={},
+    )
+
+
+@pytest.mark.anyio
+async def test_only_dropped_rows_fail():
+    repository = TelemetryRepository(deleted=2)
+    buffer = TelemetryBuffer(repository=repository, session_factory=Session)
+
+    done = [buffer.put(sample(device_id)) for device_id in (1, 2, 1, 1)]
+    assert await buffer.flush()
+
+    assert len(repository.rows) == 3
+    assert [future.exception() for future in done[::2]] == [None, None]
+    assert isinstance(done[1].exception(), TelemetryRejectedException)
@@ -0,0 +1,85 @@
+import pytest
+
+from app.schemas.telemetry import TelemetryUpload
+from app.schemas.telemetry_codec import (
+    JsonCodec,
+    MsgpackCodec,
+    iter_json_array,
+    pack_telemetry,
+)
+
+
+async def chunked(data: str, size: int = 3):
+    raw = data.encode()
+    for i in range(0, len(raw), size):
+        yield raw[i : i + size]
+
+
+async def parse(data: str) -> list[dict]:
+    return [item async for item in iter_json_array(chunked(data))]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        ("[]", []),
+        (' [ {"a": 1} ,\n {"b": "x,]"} ] ', [{"a": 1}, {"b": "x,]"}]),
+    ],
+)
+async def test_json_array_is_parsed_across_chunks(data, expected):
+    assert await parse(data) == expected
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "data",
+    [
+        '[{"a": 1} {"b": 2}]',  # нет запятой
+        '[{"a": 1},, {"b": 2}]',  # две запятые
+        '[, {"a": 1}]',
+        '[{"a": 1},]',
+        '[{"a": 1}',
+        '{"a": 1}',
+    ],
+)
+async def test_malformed_json_array_is_rejected(data):
+    with pytest.raises(ValueError):
+        await parse(data)
+
+
+def test_msgpack_and_json_store_the_same_row():
+    msgpack = pytest.importorskip("msgpack")
+    payload = {
+        "ts": "2025-01-01T00:00:00+00:00",
+        "cpu": {"pct": 12.5, "freq_mhz": 2400, "temperature_c": 55, "cores": 8},
+        "memory": {"total_mb": 8192, "used_mb": 4096, "pct": 50},
+        "disk": {
+            "mount": "/",
+            "total_mb": 1000,
+            "used_mb": 500,
+            "free_mb": 500,
+            "used_pct": 50,
+        },
+        "sensors": {"fan_rpm": 1200, "board": {"vrm_c": 60}},
+        "network": {
+            "bytes_sent_total": 1,
+            "bytes_recv_total": 2,
+            "down_mbps": 3,
+            "up_mbps": 4,
+        },
+    }
+    frame = {"type": "telemetry", "payload": payload, "seq": 7}
+    json_codec, msgpack_codec = JsonCodec(), MsgpackCodec()
+    decoded = [
+        json_codec.decode(json_codec.encode(frame)),
+        msgpack_codec.decode(msgpack.packb(pack_telemetry(payload, seq=7))),
+    ]
+
+    rows = [
+        TelemetryUpload(device_id=1, **message["payload"]).to_row()
+        for message in decoded
+    ]
+    assert rows[0] == rows[1]
+    assert rows[1]["extra"]["cpu"] == {"cores": 8}
+    assert decoded[1]["seq"] == 7